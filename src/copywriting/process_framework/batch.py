@@ -0,0 +1,100 @@
+"""
+Generate documentation for every product of a catalog.
+
+Runs `BATCH_CONCURRENCY` process instances at a time on one shared kernel, with
+at most `LLM_CONCURRENCY` chat completions in flight across all of them. Every
+published product is appended to `BATCH_OUTPUT` right away, and products already
+in it are skipped, so an interrupted run resumes where it stopped.
+
+    PRODUCT_CATALOG=catalog.jsonl uv run src/copywriting/process_framework/batch.py
+"""
+
+import asyncio
+import json
+import os
+import time
+
+from rich import print
+
+from catalog import open_catalog
+from main import create_kernel, generate_documentation
+
+PRODUCT_CATALOG = os.getenv("PRODUCT_CATALOG", "catalog.jsonl")
+BATCH_OUTPUT = os.getenv("BATCH_OUTPUT", "documentation.jsonl")
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# Products to generate in this run, 0 for the whole catalog
+BATCH_LIMIT = int(os.getenv("BATCH_LIMIT", "0"))
+
+
+def completed_products(output_path: str) -> set[str]:
+    """Products already published to the output, the run's checkpoint"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                completed.add(json.loads(line)["name"])
+            except (ValueError, KeyError):
+                # A line cut off by an interrupted run, the product is redone
+                continue
+    return completed
+
+
+async def run_batch(
+    catalog_path: str = PRODUCT_CATALOG,
+    output_path: str = BATCH_OUTPUT,
+    concurrency: int = BATCH_CONCURRENCY,
+    limit: int = BATCH_LIMIT,
+) -> dict:
+    catalog = open_catalog(catalog_path)
+    completed = completed_products(output_path)
+    pending = [name for name in catalog.names() if name not in completed]
+    if limit:
+        pending = pending[:limit]
+    print(
+        f"[bold]{len(catalog)} products, {len(completed)} already done, "
+        f"{len(pending)} to generate[/bold]"
+    )
+
+    kernel = create_kernel()
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for name in pending:
+        queue.put_nowait(name)
+    counts = {"published": 0, "failed": 0}
+    start_time = time.monotonic()
+
+    with open(output_path, "a", encoding="utf-8") as output:
+
+        async def worker():
+            while not queue.empty():
+                name = queue.get_nowait()
+                try:
+                    docs = await generate_documentation(kernel, name, catalog_path)
+                except Exception as e:
+                    docs = None
+                    print(f"[red]{name}: {e}[/red]")
+                if docs is None:
+                    counts["failed"] += 1
+                    continue
+                # Written and flushed per product, so a crash loses no finished work
+                output.write(json.dumps({"name": name, "documentation": docs}) + "\n")
+                output.flush()
+                counts["published"] += 1
+                done = counts["published"] + counts["failed"]
+                print(
+                    f"[bold green]{done}/{len(pending)} products "
+                    f"({done / (time.monotonic() - start_time):.2f}/s)[/bold green]"
+                )
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    print(
+        f"[bold]Published {counts['published']} products, {counts['failed']} failed "
+        f"(rerun to retry them) in {time.monotonic() - start_time:.1f}s[/bold]"
+    )
+    return counts
+
+
+if __name__ == "__main__":
+    asyncio.run(run_batch())
@@ -0,0 +1,118 @@
+"""
+Product catalog with an offset index, for random-access lookups in large
+JSONL or CSV files without loading them into memory.
+
+The index maps each product name to the byte offset and length of its record.
+It is saved next to the catalog as `<catalog>.idx.json` and rebuilt when the
+catalog's size or modification time changes.
+"""
+
+import csv
+import io
+import json
+import os
+from functools import lru_cache
+
+
+class ProductCatalog:
+    """Read-only access to the product records of a JSONL or CSV catalog"""
+
+    def __init__(self, path: str, key: str = "name"):
+        self.path = path
+        self.key = key
+        self.is_csv = path.lower().endswith(".csv")
+        self.header: list[str] = []
+        self.offsets: dict[str, tuple[int, int]] = {}
+        if not self._load_index():
+            self._build_index()
+            self._save_index()
+
+    @property
+    def index_path(self) -> str:
+        return f"{self.path}.idx.json"
+
+    def _signature(self) -> list:
+        stat = os.stat(self.path)
+        return [stat.st_size, stat.st_mtime_ns, self.key]
+
+    def _load_index(self) -> bool:
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if index.get("signature") != self._signature():
+            return False
+        self.header = index["header"]
+        self.offsets = {name: tuple(span) for name, span in index["offsets"].items()}
+        return True
+
+    def _save_index(self):
+        index = {
+            "signature": self._signature(),
+            "header": self.header,
+            "offsets": self.offsets,
+        }
+        with open(self.index_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+
+    def _records(self):
+        """Yield `(offset, length, raw)` per record, scanning the file once"""
+        with open(self.path, "rb") as f:
+            offset = f.tell()
+            raw = b""
+            for line in f:
+                raw += line
+                # A CSV record continues while a quoted field spans lines
+                if self.is_csv and raw.count(b'"') % 2:
+                    continue
+                if raw.strip():
+                    yield offset, len(raw), raw
+                offset += len(raw)
+                raw = b""
+
+    def _build_index(self):
+        records = self._records()
+        if self.is_csv:
+            _, _, raw = next(records)
+            self.header = next(csv.reader(io.StringIO(raw.decode("utf-8-sig"))))
+        for offset, length, raw in records:
+            self.offsets[str(self._parse(raw)[self.key])] = (offset, length)
+
+    def _parse(self, raw: bytes) -> dict:
+        text = raw.decode("utf-8")
+        if self.is_csv:
+            return dict(zip(self.header, next(csv.reader(io.StringIO(text)))))
+        return json.loads(text)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.offsets
+
+    def names(self) -> list[str]:
+        """Product names in catalog order"""
+        return list(self.offsets)
+
+    def get(self, name: str) -> dict:
+        """Read one product record, raises KeyError for unknown products"""
+        offset, length = self.offsets[name]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return self._parse(f.read(length))
+
+
+@lru_cache
+def open_catalog(path: str) -> ProductCatalog:
+    """One shared catalog per path, for all process instances"""
+    return ProductCatalog(path)
+
+
+def format_product_info(record: dict) -> str:
+    """Render a product record as the internal documentation the writer expects"""
+    return "\n\n".join(
+        f"{field.replace('_', ' ').title()}:\n{value}"
+        for field, value in record.items()
+        if value not in (None, "")
+    )
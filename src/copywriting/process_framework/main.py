@@ -1,5 +1,7 @@
 import asyncio
 import os
+import time
+import weakref
 from typing import ClassVar
 
 from dotenv import load_dotenv
@@ -17,6 +19,7 @@ from semantic_kernel.contents import ChatHistory
 from semantic_kernel.functions import kernel_function
 from semantic_kernel.processes import ProcessBuilder
 from semantic_kernel.processes.kernel_process import (
+    KernelProcess,
     KernelProcessEvent,
     KernelProcessStep,
     KernelProcessStepContext,
@@ -24,17 +27,57 @@ from semantic_kernel.processes.kernel_process import (
 )
 from semantic_kernel.processes.local_runtime.local_kernel_process import start
 
+from catalog import format_product_info, open_catalog
+
 load_dotenv()
 
+# Proofreading rounds before the last draft is published anyway
+PROOFREAD_MAX_ROUNDS = int(os.getenv("PROOFREAD_MAX_ROUNDS", "3"))
+# Seconds the proofreading loop may take before the last draft is published, 0 for no limit
+PROOFREAD_BUDGET_SECONDS = float(os.getenv("PROOFREAD_BUDGET_SECONDS", "0"))
+# Chat completions in flight across all process instances sharing this module
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+# Semaphores bind to an event loop, so there is one per loop
+_llm_semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+async def get_chat_message_content(
+    chat_service: ChatCompletionClientBase, chat_history: ChatHistory, settings
+):
+    """Get a chat completion once a slot of the global LLM limit is free"""
+    loop = asyncio.get_running_loop()
+    if loop not in _llm_semaphores:
+        _llm_semaphores[loop] = asyncio.Semaphore(LLM_CONCURRENCY)
+    async with _llm_semaphores[loop]:
+        return await chat_service.get_chat_message_content(
+            chat_history=chat_history, settings=settings
+        )
+
+
+class GatherProductInfoState(BaseModel):
+    """State for the GatherProductInfoStep."""
+
+    catalog_path: str | None = None  # JSONL or CSV catalog, None for the sample product
+
 
 # A process step to gather information about a product
-class GatherProductInfoStep(KernelProcessStep):
+class GatherProductInfoStep(KernelProcessStep[GatherProductInfoState]):
+    state: GatherProductInfoState = Field(default_factory=GatherProductInfoState)
+
+    async def activate(self, state: KernelProcessStepState[GatherProductInfoState]):
+        self.state = state.state
+
     @kernel_function
     def gather_product_information(self, product_name: str) -> str:
         print(
             f"[yellow]{GatherProductInfoStep.__name__}\n\tGathering product information for Product Name: {product_name}[/yellow]"
         )
 
+        if self.state.catalog_path:
+            # Random-access lookup through the catalog's offset index
+            record = open_catalog(self.state.catalog_path).get(product_name)
+            return format_product_info(record)
+
         return """
 Product Description:
 
@@ -61,6 +104,8 @@ class GeneratedDocumentationState(BaseModel):
     """State for the GenerateDocumentationStep."""
 
     chat_history: ChatHistory | None = None
+    product_info: str = ""
+    last_draft: str = ""
 
 
 # A process step to generate documentation for a product
@@ -94,6 +139,7 @@ sounds amazing.
             f"[blue]{GenerateDocumentationStep.__name__}\n\tGenerating documentation for provided product_info...[/blue]"
         )
 
+        self.state.product_info = product_info
         self.state.chat_history.add_user_message(
             f"Product Information:\n{product_info}"
         )
@@ -101,12 +147,13 @@ sounds amazing.
         chat_service, settings = kernel.select_ai_service(type=ChatCompletionClientBase)
         assert isinstance(chat_service, ChatCompletionClientBase)
 
-        response = await chat_service.get_chat_message_content(
-            chat_history=self.state.chat_history, settings=settings
+        response = await get_chat_message_content(
+            chat_service, self.state.chat_history, settings
         )
+        self.state.last_draft = str(response)
 
         await context.emit_event(
-            process_event="documentation_generated", data=str(response)
+            process_event="documentation_generated", data=self.state.last_draft
         )
 
     @kernel_function
@@ -122,6 +169,13 @@ sounds amazing.
 
         suggestions = rejected_docs_info.get("suggestions", [])
         suggestions_text = "\n\t\t".join(suggestions)
+
+        # Only the latest draft and its suggestions are sent, not every earlier round
+        self.state.chat_history = ChatHistory(system_message=self.system_prompt)
+        self.state.chat_history.add_user_message(
+            f"Product Information:\n{self.state.product_info}"
+        )
+        self.state.chat_history.add_assistant_message(self.state.last_draft)
         self.state.chat_history.add_user_message(
             f"Rewrite the documentation with the following suggestions:\n\n{suggestions_text}"
         )
@@ -129,13 +183,14 @@ sounds amazing.
         chat_service, settings = kernel.select_ai_service(type=ChatCompletionClientBase)
         assert isinstance(chat_service, ChatCompletionClientBase)
 
-        generated_documentation_response = await chat_service.get_chat_message_content(
-            chat_history=self.state.chat_history, settings=settings
+        generated_documentation_response = await get_chat_message_content(
+            chat_service, self.state.chat_history, settings
         )
+        self.state.last_draft = str(generated_documentation_response)
 
         await context.emit_event(
             process_event="documentation_generated",
-            data=str(generated_documentation_response),
+            data=self.state.last_draft,
         )
 
 
@@ -153,32 +208,49 @@ class ProofreadingResponse(BaseModel):
     )
 
 
-class ProofreadStep(KernelProcessStep):
+# The proofreading criteria, each one is checked by a separate LLM call
+PROOFREADING_CRITERIA = [
+    "Documentation must use a professional tone.",
+    "Documentation should be free of spelling or grammar mistakes.",
+    "Documentation should be free of any offensive or inappropriate language.",
+    "Documentation should be technically accurate.",
+    "Documentation must use emojis to enhance engagement.",
+]
+
+
+class ProofreadState(BaseModel):
+    """State for the ProofreadStep."""
+
+    rounds: int = 0
+    started_at: float | None = None  # time.monotonic() of the first round
+
+
+class ProofreadStep(KernelProcessStep[ProofreadState]):
     """A process step to proofread documentation before publishing."""
 
-    @kernel_function
-    async def proofread_documentation(
-        self, docs: str, context: KernelProcessStepContext, kernel: Kernel
-    ) -> None:
-        print(
-            f"[cyan]{ProofreadStep.__name__}\n\tProofreading product documentation...[/cyan]"
-        )
+    state: ProofreadState = Field(default_factory=ProofreadState)
 
-        system_prompt = """
+    system_prompt: ClassVar[
+        str
+    ] = """
         Your job is to proofread customer facing documentation for a new product from Contoso. You will be provided with 
         proposed documentation for a product and you must do the following things:
 
-        1. Determine if the documentation passes the following criteria:
-            1. Documentation must use a professional tone.
-            2. Documentation should be free of spelling or grammar mistakes.
-            3. Documentation should be free of any offensive or inappropriate language.
-            4. Documentation should be technically accurate.
-            5. Documentation must use emojis to enhance engagement.
+        1. Determine if the documentation passes the following criterion:
+            {criterion}
         2. If the documentation does not pass 1, you must write detailed feedback of the changes that are needed to 
             improve the documentation. 
         """
 
-        chat_history = ChatHistory(system_message=system_prompt)
+    async def activate(self, state: KernelProcessStepState[ProofreadState]):
+        self.state = state.state
+
+    async def check_criterion(
+        self, docs: str, criterion: str, kernel: Kernel
+    ) -> ProofreadingResponse:
+        chat_history = ChatHistory(
+            system_message=self.system_prompt.format(criterion=criterion)
+        )
         chat_history.add_user_message(docs)
 
         chat_service, settings = kernel.select_ai_service(type=ChatCompletionClientBase)
@@ -187,22 +259,77 @@ class ProofreadStep(KernelProcessStep):
 
         settings.response_format = ProofreadingResponse
 
-        response = await chat_service.get_chat_message_content(
-            chat_history=chat_history, settings=settings
+        response = await get_chat_message_content(chat_service, chat_history, settings)
+
+        return ProofreadingResponse.model_validate_json(response.content)
+
+    def out_of_rounds(self) -> str | None:
+        """The reason to stop the proofreading loop, if any"""
+        if self.state.rounds >= PROOFREAD_MAX_ROUNDS:
+            return f"{self.state.rounds} proofreading rounds"
+        elapsed = time.monotonic() - self.state.started_at
+        if PROOFREAD_BUDGET_SECONDS and elapsed >= PROOFREAD_BUDGET_SECONDS:
+            return f"{elapsed:.0f}s of proofreading"
+        return None
+
+    @kernel_function
+    async def proofread_documentation(
+        self, docs: str, context: KernelProcessStepContext, kernel: Kernel
+    ) -> None:
+        print(
+            f"[cyan]{ProofreadStep.__name__}\n\tProofreading product documentation...[/cyan]"
         )
 
-        formatted_response: ProofreadingResponse = (
-            ProofreadingResponse.model_validate_json(response.content)
+        if self.state.started_at is None:
+            self.state.started_at = time.monotonic()
+        self.state.rounds += 1
+
+        # The criteria are independent, so they are checked concurrently
+        responses = await asyncio.gather(
+            *(
+                self.check_criterion(docs, criterion, kernel)
+                for criterion in PROOFREADING_CRITERIA
+            )
+        )
+        failed = [
+            (criterion, response)
+            for criterion, response in zip(PROOFREADING_CRITERIA, responses)
+            if not response.meets_expectations
+        ]
+        formatted_response = ProofreadingResponse(
+            meets_expectations=not failed,
+            explanation=(
+                "\n\t\t".join(
+                    f"{criterion} {response.explanation}"
+                    for criterion, response in failed
+                )
+                or "The documentation meets all criteria."
+            ),
+            suggestions=[
+                suggestion
+                for _, response in failed
+                for suggestion in response.suggestions
+            ],
         )
 
         suggestions_text = "\n\t\t".join(formatted_response.suggestions)
         print(
-            f"[magenta]{ProofreadStep.__name__}\n\tGrade: {'Pass' if formatted_response.meets_expectations else 'Fail'}\n\t"
+            f"[magenta]{ProofreadStep.__name__}\n\tGrade: {'Pass' if formatted_response.meets_expectations else 'Fail'} "
+            f"(round {self.state.rounds}, {len(failed)} of {len(PROOFREADING_CRITERIA)} criteria failed)\n\t"
             f"Explanation: {formatted_response.explanation}\n\t"
             f"Suggestions: {suggestions_text}[/magenta]"
         )
 
-        if formatted_response.meets_expectations:
+        stop_reason = (
+            None if formatted_response.meets_expectations else self.out_of_rounds()
+        )
+        if stop_reason:
+            print(
+                f"[yellow]{ProofreadStep.__name__}\n\tStopping after {stop_reason}, "
+                f"publishing the last draft[/yellow]"
+            )
+
+        if formatted_response.meets_expectations or stop_reason:
             await context.emit_event(process_event="documentation_approved", data=docs)
         else:
             await context.emit_event(
@@ -214,16 +341,28 @@ class ProofreadStep(KernelProcessStep):
             )
 
 
+class PublishDocumentationState(BaseModel):
+    """State for the PublishDocumentationStep."""
+
+    docs: str | None = None
+
+
 # A process step to publish documentation
-class PublishDocumentationStep(KernelProcessStep):
+class PublishDocumentationStep(KernelProcessStep[PublishDocumentationState]):
+    state: PublishDocumentationState = Field(default_factory=PublishDocumentationState)
+
+    async def activate(self, state: KernelProcessStepState[PublishDocumentationState]):
+        self.state = state.state
+
     @kernel_function
     async def publish_documentation(self, docs: str) -> None:
         print(
             f"[green]{PublishDocumentationStep.__name__}\n\tPublishing product documentation:\n\n{docs}[/green]"
         )
+        self.state.docs = docs
 
 
-async def main():
+def create_kernel() -> Kernel:
     # Configure the kernel with an AI Service
     kernel = Kernel()
     kernel.add_service(
@@ -234,12 +373,19 @@ async def main():
             service_id=os.getenv("DEPLOYMENT_NAME"),
         )
     )
+    return kernel
+
 
+def build_process(catalog_path: str | None = None) -> KernelProcess:
+    """Build the process, step states are per built process so build one per product"""
     # Create the process builder
     process_builder = ProcessBuilder(name="DocumentationGeneration")
 
     # Add the steps
-    info_gathering_step = process_builder.add_step(GatherProductInfoStep)
+    info_gathering_step = process_builder.add_step(
+        GatherProductInfoStep,
+        initial_state=GatherProductInfoState(catalog_path=catalog_path),
+    )
     docs_generation_step = process_builder.add_step(GenerateDocumentationStep)
     docs_publish_step = process_builder.add_step(PublishDocumentationStep)
     docs_proofread_step = process_builder.add_step(ProofreadStep)
@@ -267,14 +413,31 @@ async def main():
         target=docs_publish_step
     )
 
-    # Build and start the process
-    kernel_process = process_builder.build()
+    return process_builder.build()
+
+
+async def generate_documentation(
+    kernel: Kernel, product_name: str, catalog_path: str | None = None
+) -> str | None:
+    """Run the process for one product, returns the published docs"""
     async with await start(
-        process=kernel_process,
+        process=build_process(catalog_path),
         kernel=kernel,
-        initial_event=KernelProcessEvent(id="Start", data="Contoso GlowBrew"),
+        initial_event=KernelProcessEvent(id="Start", data=product_name),
     ) as process_context:
-        _ = await process_context.get_state()
+        final_state = await process_context.get_state()
+
+    publish_state = next(
+        step.state.state
+        for step in final_state.steps
+        if step.state.name == PublishDocumentationStep.__name__
+    )
+    return publish_state.docs
+
+
+async def main():
+    # Build and start the process
+    await generate_documentation(create_kernel(), "Contoso GlowBrew")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+"""
+Async client for the Azure AI Agent Service that runs many agent threads at once
+
+`runs.create_and_process` blocks until a run finishes and polls every second.
+`AsyncAgentClient` creates runs without blocking, polls their status with an
+adaptive backoff and fetches only the messages of each finished run, so one
+event loop can drive many conversations concurrently.
+"""
+
+import asyncio
+import os
+import time
+
+from azure.ai.agents.aio import AgentsClient
+from azure.ai.agents.models import Agent, ListSortOrder, RunStatus, ThreadRun
+from azure.ai.projects.aio import AIProjectClient
+from azure.identity.aio import DefaultAzureCredential
+from dotenv import load_dotenv
+from rich import print
+
+# First status poll of a run, before any run duration was observed
+AGENT_POLL_INITIAL_SECONDS = float(os.getenv("AGENT_POLL_INITIAL_SECONDS", "0.25"))
+AGENT_POLL_MAX_SECONDS = float(os.getenv("AGENT_POLL_MAX_SECONDS", "2.0"))
+AGENT_MAX_CONCURRENT_THREADS = int(os.getenv("AGENT_MAX_CONCURRENT_THREADS", "8"))
+POLL_BACKOFF = 1.5
+# Weight of the newest run in the moving average run duration
+DURATION_SMOOTHING = 0.3
+
+TERMINAL_STATUSES = {
+    RunStatus.COMPLETED,
+    RunStatus.FAILED,
+    RunStatus.CANCELLED,
+    RunStatus.EXPIRED,
+}
+
+
+class AgentRunError(Exception):
+    pass
+
+
+class AsyncAgentClient:
+    """Ask an agent questions on many threads concurrently"""
+
+    def __init__(
+        self,
+        agents: AgentsClient,
+        agent_id: str,
+        max_concurrent_threads: int = AGENT_MAX_CONCURRENT_THREADS,
+    ):
+        self.agents = agents
+        self.agent_id = agent_id
+        self.thread_slots = asyncio.Semaphore(max_concurrent_threads)
+        self._agent: Agent | None = None
+        self._agent_lock = asyncio.Lock()
+        self.average_run_seconds: float | None = None
+        self.poll_count = 0
+
+    async def agent(self) -> Agent:
+        """The agent, looked up once and shared by all threads"""
+        async with self._agent_lock:
+            if self._agent is None:
+                self._agent = await self.agents.get_agent(self.agent_id)
+            return self._agent
+
+    def _first_poll_delay(self) -> float:
+        # Runs take about as long as the previous ones, so don't poll much earlier
+        if self.average_run_seconds is None:
+            return AGENT_POLL_INITIAL_SECONDS
+        return min(
+            max(0.8 * self.average_run_seconds, AGENT_POLL_INITIAL_SECONDS),
+            AGENT_POLL_MAX_SECONDS,
+        )
+
+    def _record_duration(self, seconds: float):
+        self.average_run_seconds = (
+            seconds
+            if self.average_run_seconds is None
+            else DURATION_SMOOTHING * seconds
+            + (1 - DURATION_SMOOTHING) * self.average_run_seconds
+        )
+
+    async def wait_for_run(self, run: ThreadRun) -> ThreadRun:
+        """Poll a run until it finishes, backing off while it's still running"""
+        start = time.monotonic()
+        delay = self._first_poll_delay()
+        while run.status not in TERMINAL_STATUSES:
+            if run.status == RunStatus.REQUIRES_ACTION:
+                raise AgentRunError(f"Run {run.id} requires tool outputs")
+            await asyncio.sleep(delay)
+            run = await self.agents.runs.get(thread_id=run.thread_id, run_id=run.id)
+            self.poll_count += 1
+            delay = min(delay * POLL_BACKOFF, AGENT_POLL_MAX_SECONDS)
+        if run.status == RunStatus.COMPLETED:
+            self._record_duration(time.monotonic() - start)
+        return run
+
+    async def ask(self, thread_id: str, question: str) -> str:
+        """Ask one question on a thread and return the agent's answer"""
+        agent = await self.agent()
+        await self.agents.messages.create(
+            thread_id=thread_id, role="user", content=question
+        )
+        run = await self.agents.runs.create(thread_id=thread_id, agent_id=agent.id)
+        run = await self.wait_for_run(run)
+        if run.status != RunStatus.COMPLETED:
+            raise AgentRunError(f"Run {run.id} {run.status}: {run.last_error}")
+
+        # Only the messages this run added, not the whole thread
+        answers = []
+        async for message in self.agents.messages.list(
+            thread_id=thread_id, run_id=run.id, order=ListSortOrder.ASCENDING
+        ):
+            if message.role == "assistant" and message.text_messages:
+                answers.append(message.text_messages[-1].text.value)
+        return "\n\n".join(answers)
+
+    async def converse(self, questions: list[str]) -> list[str]:
+        """Ask questions one after another on a new thread, follow-ups need the earlier answers"""
+        async with self.thread_slots:
+            thread = await self.agents.threads.create()
+            return [await self.ask(thread.id, question) for question in questions]
+
+    async def converse_many(
+        self, conversations: list[list[str]]
+    ) -> list[list[str] | Exception]:
+        """Run each conversation on its own thread, concurrently
+
+        A failed conversation returns its exception instead of the answers.
+        """
+        return await asyncio.gather(
+            *(self.converse(questions) for questions in conversations),
+            return_exceptions=True,
+        )
+
+
+async def main():
+    """Run a few conversations about painters on parallel threads"""
+    load_dotenv()
+
+    conversations = [
+        [
+            "Tell me about Leonardo da Vinci.",
+            "Tell me about his most famous piece of art.",
+        ],
+        ["Tell me about Michelangelo.", "Which chapel ceiling did he paint?"],
+        ["Tell me about Raphael."],
+        ["Who will win the next Super Bowl?"],
+    ]
+
+    async with (
+        DefaultAzureCredential() as credential,
+        AIProjectClient(
+            credential=credential, endpoint=os.environ["PROJECT_ENDPOINT"]
+        ) as project,
+    ):
+        client = AsyncAgentClient(
+            project.agents, os.getenv("AGENT_ID", "asst_ct6ObrQmVzExQLgrf43oihyi")
+        )
+        start = time.monotonic()
+        results = await client.converse_many(conversations)
+
+    for questions, answers in zip(conversations, results):
+        if isinstance(answers, Exception):
+            print(f"[red]Conversation failed: {answers}[/red]")
+            continue
+        for question, answer in zip(questions, answers):
+            print(f"[blue]user[/]: {question}")
+            print(f"[green]assistant[/]: {answer}")
+    print(
+        f"{len(conversations)} conversations in {time.monotonic() - start:.1f}s "
+        f"with {client.poll_count} status polls"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1 @@
+# This file marks the benchmark directory as a Python package.
@@ -0,0 +1,83 @@
+"""
+Compare the blocking agent service loop with the async agent client against a
+local stub of the agents endpoints.
+"""
+
+import asyncio
+import time
+
+from azure.ai.agents import AgentsClient
+from azure.ai.agents.aio import AgentsClient as AsyncAgentsClient
+from azure.ai.agents.models import ListSortOrder
+from rich.console import Console
+from rich.table import Table
+
+from src.wikipedia.agent_service.async_client import AsyncAgentClient
+
+from .stub_servers import AgentsStub, agents_client_kwargs
+
+console = Console()
+
+CONVERSATION_COUNT = 16
+QUESTIONS_PER_CONVERSATION = 2
+RUN_SECONDS = 1.0
+AGENT_ID = "asst_stub"
+
+CONVERSATIONS = [
+    [f"Question {q} about topic {c}" for q in range(QUESTIONS_PER_CONVERSATION)]
+    for c in range(CONVERSATION_COUNT)
+]
+
+
+def run_blocking(stub: AgentsStub) -> None:
+    """One question after another with `create_and_process`, like agent_service.py"""
+    agents = AgentsClient(**agents_client_kwargs(stub.base_url))
+    for questions in CONVERSATIONS:
+        agent = agents.get_agent(agent_id=AGENT_ID)
+        thread = agents.threads.create()
+        for question in questions:
+            agents.messages.create(thread_id=thread.id, role="user", content=question)
+            agents.runs.create_and_process(thread_id=thread.id, agent_id=agent.id)
+            list(agents.messages.list(thread.id, order=ListSortOrder.ASCENDING))
+    agents.close()
+
+
+async def run_async(stub: AgentsStub) -> None:
+    async with AsyncAgentsClient(**agents_client_kwargs(stub.base_url)) as agents:
+        client = AsyncAgentClient(agents, AGENT_ID)
+        results = await client.converse_many(CONVERSATIONS)
+    failures = [r for r in results if isinstance(r, Exception)]
+    assert not failures, failures[0]
+
+
+def main() -> None:
+    table = Table(
+        title=f"{CONVERSATION_COUNT} conversations of {QUESTIONS_PER_CONVERSATION} "
+        f"questions, {RUN_SECONDS:.0f}s runs"
+    )
+    for column in ["Client", "Wall time (s)", "Runs/s", "Status polls", "Requests"]:
+        table.add_column(column)
+
+    for name, run in [
+        ("Blocking create_and_process", run_blocking),
+        ("AsyncAgentClient", lambda stub: asyncio.run(run_async(stub))),
+    ]:
+        with AgentsStub(run_seconds=RUN_SECONDS) as stub:
+            start = time.monotonic()
+            run(stub)
+            elapsed = time.monotonic() - start
+            counts = stub.request_counts
+        runs = CONVERSATION_COUNT * QUESTIONS_PER_CONVERSATION
+        table.add_row(
+            name,
+            f"{elapsed:.1f}",
+            f"{runs / elapsed:.2f}",
+            str(counts["get_run"]),
+            str(sum(counts.values())),
+        )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
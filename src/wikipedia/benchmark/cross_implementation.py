@@ -0,0 +1,351 @@
+"""
+Compare the three implementations of the Wikipedia chat on the evaluation
+questions, against shared local stubs of Wikipedia and the model:
+
+- promptflow: the nodes of flow.dag.yaml in order, the original python tools and
+  the jinja2 templates through the OpenAI client, like the promptflow executor
+- process framework: `WikiChatProcess`, a new one per question like `get_answer`
+- agent service: the agent_service.py loop against a stubbed agent, whose runs
+  rewrite the question, search Wikipedia and answer with the same stubs
+
+Every implementation runs in a fresh process, so CPU time and memory are its own.
+The stubs, including the hosted agent's work, run in this process.
+"""
+
+import asyncio
+import importlib.util
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import tracemalloc
+import types
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Callable
+
+import psutil
+import requests
+from rich.console import Console
+from rich.table import Table
+
+from .stub_servers import (
+    AgentsStub,
+    ModelStub,
+    WikipediaStub,
+    agents_client_kwargs,
+    stub_chat_process,
+)
+
+console = Console()
+
+EVAL_DATA_PATH = Path(__file__).parents[1] / "evaluation" / "wiki.jsonl"
+FLOW_PATH = Path(__file__).parents[1] / "promptflow" / "flow.dag.yaml"
+DEPLOYMENT = "stub-gpt"
+API_VERSION = "2025-04-01-preview"
+AGENT_ID = "asst_stub"
+# Timed passes over the questions, after one warm-up question
+REPEATS = 2
+MODEL_LATENCY_SECONDS = 0.2
+WIKIPEDIA_LATENCY_SECONDS = 0.05
+
+# `${inputs.question}` or `${get_wiki_url.output}`
+REFERENCE_PATTERN = re.compile(r"^\$\{(\w+)\.(\w+)\}$")
+# `# system:`, `# user:` and `# assistant:` lines start the messages of a chat template
+ROLE_PATTERN = re.compile(r"^\s*#\s*(system|user|assistant)\s*:\s*$", re.MULTILINE)
+
+# An answer function returns the seconds per stage of one question
+Answer = Callable[[str], dict[str, float]]
+
+
+def promptflow_answer(urls: dict[str, str]) -> Answer:
+    """Run the flow's nodes one after another, like the promptflow executor"""
+    try:
+        import promptflow
+    except ImportError:
+        # The tools only need the `@tool` decorator of the promptflow runtime
+        promptflow = types.ModuleType("promptflow")
+        promptflow.tool = lambda func: func  # type: ignore
+        sys.modules["promptflow"] = promptflow
+    # get_wiki_url.py and search_result_from_url.py import it from `main`
+    sys.modules.setdefault("main", promptflow)
+
+    # The original tools always call en.wikipedia.org
+    send = requests.Session.request
+
+    def request(self, method, url, *args, **kwargs):
+        url = url.replace("https://en.wikipedia.org", urls["wikipedia"])
+        return send(self, method, url, *args, **kwargs)
+
+    requests.Session.request = request  # type: ignore
+
+    # Only what the promptflow runtime needs, the flow compiler's parser would
+    # import Semantic Kernel into this process
+    import jinja2
+    import yaml
+    from openai import AzureOpenAI
+
+    dag = yaml.safe_load(FLOW_PATH.read_text(encoding="utf-8"))
+    tools, templates = {}, {}
+    for node in dag["nodes"]:
+        path = FLOW_PATH.parent / node["source"]["path"]
+        if node["type"] == "python":
+            spec = importlib.util.spec_from_file_location(path.stem, path)
+            assert spec is not None and spec.loader is not None
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            tools[node["name"]] = getattr(module, path.stem)
+        else:
+            templates[node["name"]] = jinja2.Template(
+                path.read_text(encoding="utf-8"),
+                trim_blocks=True,
+                keep_trailing_newline=True,
+            )
+    client = AzureOpenAI(
+        azure_endpoint=urls["model"], api_key="stub", api_version=API_VERSION
+    )
+
+    def resolve(value, values: dict):
+        match = REFERENCE_PATTERN.match(str(value))
+        if match is None:
+            # Literal inputs like `count: '2'`
+            return int(value) if str(value).isdigit() else value
+        source, field = match.groups()
+        return values["inputs"][field] if source == "inputs" else values[source]
+
+    def answer(question: str) -> dict[str, float]:
+        values = {"inputs": {"question": question, "chat_history": []}}
+        stages = {}
+        # The nodes of flow.dag.yaml are listed in dependency order
+        for node in dag["nodes"]:
+            name = node["name"]
+            inputs = {k: resolve(v, values) for k, v in node["inputs"].items()}
+            start = time.perf_counter()
+            if node["type"] == "python":
+                values[name] = tools[name](**inputs)
+            else:
+                parts = ROLE_PATTERN.split(templates[name].render(**inputs))
+                response = client.chat.completions.create(
+                    model=DEPLOYMENT,
+                    messages=[
+                        {"role": role, "content": content.strip()}
+                        for role, content in zip(parts[1::2], parts[2::2])
+                        if content.strip()
+                    ],
+                    temperature=float(inputs.get("temperature") or 1),
+                )
+                values[name] = response.choices[0].message.content
+            stages[name] = time.perf_counter() - start
+        return stages
+
+    return answer
+
+
+def process_framework_answer(urls: dict[str, str]) -> Answer:
+    """A new `WikiChatProcess` per question, like the evaluation target"""
+    from src.wikipedia.process_framework.utils.profiling_utils import time_steps
+
+    StubWikiChatProcess = stub_chat_process(urls["model"], API_VERSION)
+
+    loop = asyncio.new_event_loop()
+
+    def answer(question: str) -> dict[str, float]:
+        with time_steps() as timer:
+            loop.run_until_complete(StubWikiChatProcess().chat(question))
+        return timer.step_seconds()
+
+    return answer
+
+
+def agent_service_answer(urls: dict[str, str]) -> Answer:
+    """A new thread per question, run with `create_and_process` like agent_service.py"""
+    from azure.ai.agents import AgentsClient
+    from azure.ai.agents.models import ListSortOrder
+
+    agents = AgentsClient(**agents_client_kwargs(urls["agents"]))
+    agent = agents.get_agent(agent_id=AGENT_ID)
+
+    def answer(question: str) -> dict[str, float]:
+        stages = {}
+        start = time.perf_counter()
+        thread = agents.threads.create()
+        agents.messages.create(thread_id=thread.id, role="user", content=question)
+        stages["create_thread"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        agents.runs.create_and_process(thread_id=thread.id, agent_id=agent.id)
+        stages["run"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        list(agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING))
+        stages["list_messages"] = time.perf_counter() - start
+        return stages
+
+    return answer
+
+
+IMPLEMENTATIONS: dict[str, Callable[[dict[str, str]], Answer]] = {
+    "promptflow": promptflow_answer,
+    "process framework": process_framework_answer,
+    "agent service": agent_service_answer,
+}
+
+
+def run_implementation(name: str, urls: dict[str, str], questions: list[str]) -> dict:
+    """Benchmark one implementation, in a fresh process"""
+    os.environ.update(
+        {"DEPLOYMENT_NAME": DEPLOYMENT, "WIKIPEDIA_BASE_URL": urls["wikipedia"]}
+    )
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        answer = IMPLEMENTATIONS[name](urls)
+        # Imports, connection pools and caches warm up on the first question
+        answer(questions[0])
+
+        turns = []
+        cpu_start = time.process_time()
+        for question in questions * REPEATS:
+            start = time.perf_counter()
+            stages = answer(question)
+            stages["end to end"] = time.perf_counter() - start
+            turns.append(stages)
+        cpu_seconds = time.process_time() - cpu_start
+
+        # tracemalloc slows down allocations, so memory gets its own pass
+        tracemalloc.start()
+        for question in questions:
+            answer(question)
+        _, heap_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "turns": turns,
+        "cpu_seconds": cpu_seconds / len(turns),
+        "heap_peak": heap_peak,
+        "rss": psutil.Process().memory_info().rss,
+        "answers": 1 + len(turns) + len(questions),
+    }
+
+
+def hosted_agent(urls: dict[str, str]) -> Callable[[str], str]:
+    """What the agent does server-side in every run"""
+
+    def complete(messages: list[dict]) -> str:
+        response = requests.post(
+            f"{urls['model']}/openai/deployments/{DEPLOYMENT}/chat/completions",
+            json={"messages": messages},
+            timeout=30,
+        )
+        return response.json()["choices"][0]["message"]["content"]
+
+    def run(question: str) -> str:
+        query = complete(
+            [
+                {
+                    "role": "system",
+                    "content": "Given an input question, infer user real intent.",
+                },
+                {"role": "user", "content": question},
+            ]
+        )
+        page = requests.get(
+            f"{urls['wikipedia']}/w/index.php", params={"search": query}, timeout=30
+        ).text
+        return complete(
+            [
+                {"role": "system", "content": f"Answer with SOURCES.\n\n{page}"},
+                {"role": "user", "content": question},
+            ]
+        )
+
+    return run
+
+
+def percentile(values: list[float], percent: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, round(percent / 100 * (len(values) - 1)))]
+
+
+def main() -> None:
+    with open(EVAL_DATA_PATH, encoding="utf-8") as f:
+        questions = [json.loads(line)["question"] for line in f if line.strip()]
+
+    with (
+        WikipediaStub(latency_seconds=WIKIPEDIA_LATENCY_SECONDS) as wikipedia,
+        ModelStub(latency_seconds=MODEL_LATENCY_SECONDS) as model,
+    ):
+        urls = {"wikipedia": wikipedia.base_url, "model": model.base_url}
+        agents = AgentsStub(run_executor=hosted_agent(urls)).start()
+        urls["agents"] = agents.base_url
+
+        results = {}
+        for name in IMPLEMENTATIONS:
+            console.print(f"Benchmarking [blue]{name}[/blue]...")
+            model_calls, wiki_requests = model.request_count, wikipedia.request_count
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                try:
+                    result = executor.submit(
+                        run_implementation, name, urls, questions
+                    ).result()
+                except Exception as e:
+                    console.print(f"[red]{name} failed: {e!r}[/red]")
+                    continue
+            result["model_calls"] = (model.request_count - model_calls) / result[
+                "answers"
+            ]
+            result["wiki_requests"] = (
+                wikipedia.request_count - wiki_requests
+            ) / result["answers"]
+            results[name] = result
+        agents.stop()
+
+    for name, result in results.items():
+        table = Table(title=f"{name} stages")
+        for column in ["Stage", "Mean (ms)", "p95 (ms)"]:
+            table.add_column(column)
+        for stage in result["turns"][0]:
+            seconds = [turn.get(stage, 0.0) for turn in result["turns"]]
+            table.add_row(
+                stage,
+                f"{1000 * sum(seconds) / len(seconds):.0f}",
+                f"{1000 * percentile(seconds, 95):.0f}",
+            )
+        console.print(table)
+
+    table = Table(
+        title=f"{len(questions)} questions x {REPEATS}, model {MODEL_LATENCY_SECONDS}s, "
+        f"Wikipedia {WIKIPEDIA_LATENCY_SECONDS}s"
+    )
+    for column in [
+        "Implementation",
+        "Mean (s)",
+        "p95 (s)",
+        "CPU/question (ms)",
+        "Heap peak (MiB)",
+        "RSS (MiB)",
+        "LLM calls/question",
+        "Wiki requests/question",
+    ]:
+        table.add_column(column)
+    for name, result in results.items():
+        end_to_end = [turn["end to end"] for turn in result["turns"]]
+        table.add_row(
+            name,
+            f"{sum(end_to_end) / len(end_to_end):.2f}",
+            f"{percentile(end_to_end, 95):.2f}",
+            f"{1000 * result['cpu_seconds']:.0f}",
+            f"{result['heap_peak'] / 2**20:.1f}",
+            f"{result['rss'] / 2**20:.0f}",
+            f"{result['model_calls']:.1f}",
+            f"{result['wiki_requests']:.1f}",
+        )
+    console.print(table)
+
+
+# run this as `uv run -m src.wikipedia.benchmark.cross_implementation`
+if __name__ == "__main__":
+    main()
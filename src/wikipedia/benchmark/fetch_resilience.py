@@ -0,0 +1,86 @@
+"""
+Compare plain, retried and hedged Wikipedia fetches against a local stub that
+injects latency and errors.
+"""
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rich.console import Console
+from rich.table import Table
+
+from src.wikipedia.process_framework.utils import http_utils
+from src.wikipedia.process_framework.utils.web_utils import (
+    fetch_text_content_from_url,
+)
+
+from .stub_servers import WikipediaStub
+
+console = Console()
+
+REQUEST_COUNT = 300
+CONCURRENCY = 5
+
+
+def run_fetches(base_url: str, max_retries: int, hedging: bool) -> dict:
+    """Fetch REQUEST_COUNT pages and summarize latency and failures"""
+    http_utils.MAX_RETRIES = max_retries
+    http_utils.HEDGING_ENABLED = hedging
+    http_utils.latency_tracker = http_utils.LatencyTracker()
+
+    def fetch(i: int) -> tuple[float, bool]:
+        start = time.monotonic()
+        _, text = fetch_text_content_from_url(
+            f"{base_url}/w/index.php?search=Entity {i}", timeout=5
+        )
+        return time.monotonic() - start, text == "No available content"
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        results = list(executor.map(fetch, range(REQUEST_COUNT)))
+
+    latencies = [latency for latency, _ in results]
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {
+        "p50": percentiles[49],
+        "p95": percentiles[94],
+        "p99": percentiles[98],
+        "failures": sum(failed for _, failed in results),
+    }
+
+
+def main() -> None:
+    # Let the benchmark, not the politeness limit, decide the request rate
+    http_utils.rate_limiter = http_utils.RateLimiter(500)
+
+    table = Table(title=f"{REQUEST_COUNT} fetches, 5% slow (1s), 10% 503/429")
+    for column in ["Mode", "p50 (s)", "p95 (s)", "p99 (s)", "Failures"]:
+        table.add_column(column)
+
+    modes = {
+        "plain": (0, False),
+        "retries": (http_utils.MAX_RETRIES or 2, False),
+        "retries + hedging": (http_utils.MAX_RETRIES or 2, True),
+    }
+    for mode, (max_retries, hedging) in modes.items():
+        with WikipediaStub(
+            latency_seconds=0.02,
+            slow_fraction=0.05,
+            slow_latency_seconds=1.0,
+            error_rate=0.1,
+        ) as stub:
+            summary = run_fetches(stub.base_url, max_retries, hedging)
+        table.add_row(
+            mode,
+            f"{summary['p50']:.3f}",
+            f"{summary['p95']:.3f}",
+            f"{summary['p99']:.3f}",
+            str(summary["failures"]),
+        )
+
+    console.print(table)
+
+
+# run this as `uv run -m src.wikipedia.benchmark.fetch_resilience`
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Load test `WikiChatProcess` with many multi-turn conversations at once
+
+Scripted conversations like the wikipedia.py demo arrive at `LOAD_ARRIVAL_RATE`
+conversations per second (Poisson arrivals, 0 starts them all at once), at most
+`concurrency` of them in flight. Every conversation is a new `WikiChatProcess`
+asking its questions one after another, so the fetch threads, the event loop,
+the rate limiter and the models are shared by all of them.
+
+The test steps through `LOAD_CONCURRENCY_LEVELS`, every level in a fresh
+process, and reports turn and step latency percentiles, errors, throughput and
+the saturation point, the level after which throughput stops scaling.
+
+    uv run -m src.wikipedia.benchmark.load_test
+    LOAD_BACKEND=live LOAD_CONCURRENCY_LEVELS=1,2,4 uv run -m src.wikipedia.benchmark.load_test
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+
+from rich.console import Console
+from rich.table import Table
+
+from .cross_implementation import DEPLOYMENT, percentile
+from .stub_servers import ModelStub, WikipediaStub, stub_chat_process
+
+console = Console()
+
+# stub: local Wikipedia and model stubs, live: the services configured in .env
+LOAD_BACKEND = os.getenv("LOAD_BACKEND", "stub").lower()
+# JSON lines with a `questions` list per conversation, the demo conversations if empty
+LOAD_CONVERSATIONS_PATH = os.getenv("LOAD_CONVERSATIONS_PATH", "")
+LOAD_CONCURRENCY_LEVELS = [
+    int(level)
+    for level in os.getenv("LOAD_CONCURRENCY_LEVELS", "1,2,4,8,16").split(",")
+]
+# Conversations per level are this many times the concurrency
+LOAD_CONVERSATIONS_PER_SLOT = int(os.getenv("LOAD_CONVERSATIONS_PER_SLOT", "3"))
+LOAD_ARRIVAL_RATE = float(os.getenv("LOAD_ARRIVAL_RATE", "0"))
+# Mean pause of the user between turns
+LOAD_THINK_SECONDS = float(os.getenv("LOAD_THINK_SECONDS", "0"))
+LOAD_TURN_TIMEOUT_SECONDS = float(os.getenv("LOAD_TURN_TIMEOUT_SECONDS", "60"))
+# Throughput has to grow by this share over the previous level to count as scaling
+LOAD_SCALING_THRESHOLD = float(os.getenv("LOAD_SCALING_THRESHOLD", "0.1"))
+LOAD_MODEL_LATENCY_SECONDS = float(os.getenv("LOAD_MODEL_LATENCY_SECONDS", "0.2"))
+LOAD_WIKI_LATENCY_SECONDS = float(os.getenv("LOAD_WIKI_LATENCY_SECONDS", "0.05"))
+LOAD_WIKI_ERROR_RATE = float(os.getenv("LOAD_WIKI_ERROR_RATE", "0"))
+
+# The wikipedia.py demo and two more conversations with follow-up questions
+DEMO_CONVERSATIONS = [
+    [
+        "Tell me about Leonardo da Vinci.",
+        "Tell me about his most famous piece of art.",
+        "Who will win the next Super Bowl?",
+    ],
+    ["Tell me about Michelangelo.", "Which chapel ceiling did he paint?"],
+    ["Tell me about Raphael.", "Which pope did he work for?"],
+]
+LOOP_LAG_INTERVAL_SECONDS = 0.01
+
+
+def load_conversations(path: str = LOAD_CONVERSATIONS_PATH) -> list[list[str]]:
+    if not path:
+        return DEMO_CONVERSATIONS
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["questions"] for line in f if line.strip()]
+
+
+async def monitor_loop_lag(lags: list[float]):
+    """How late the event loop wakes up a sleeping task, a sign of blocking work"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL_SECONDS)
+        lags.append(time.perf_counter() - start - LOOP_LAG_INTERVAL_SECONDS)
+
+
+async def drive(
+    process_class, conversations: list[list[str]], concurrency: int
+) -> dict:
+    """Run the conversations with at most `concurrency` in flight"""
+    from src.wikipedia.process_framework.utils.profiling_utils import time_steps
+
+    slots = asyncio.Semaphore(concurrency)
+    arrivals = random.Random(0)
+    turns: list[dict] = []
+    waits: list[float] = []
+
+    async def converse(questions: list[str]):
+        arrived = time.perf_counter()
+        async with slots:
+            waits.append(time.perf_counter() - arrived)
+            chat = process_class()
+            for question in questions:
+                error = None
+                start = time.perf_counter()
+                with time_steps() as timer:
+                    try:
+                        result = await asyncio.wait_for(
+                            chat.chat(question), LOAD_TURN_TIMEOUT_SECONDS
+                        )
+                        # Failed steps are only logged, the answer stays empty
+                        if not result["response"]:
+                            error = "empty answer"
+                    except TimeoutError:
+                        error = "timeout"
+                    except Exception as e:
+                        error = type(e).__name__
+                turns.append(
+                    {
+                        "seconds": time.perf_counter() - start,
+                        "steps": timer.step_seconds(),
+                        "error": error,
+                    }
+                )
+                if LOAD_THINK_SECONDS:
+                    await asyncio.sleep(arrivals.expovariate(1 / LOAD_THINK_SECONDS))
+
+    lags: list[float] = []
+    monitor = asyncio.create_task(monitor_loop_lag(lags))
+    tasks = []
+    start = time.perf_counter()
+    for questions in conversations:
+        tasks.append(asyncio.create_task(converse(questions)))
+        if LOAD_ARRIVAL_RATE > 0:
+            await asyncio.sleep(arrivals.expovariate(LOAD_ARRIVAL_RATE))
+    await asyncio.gather(*tasks)
+    wall_seconds = time.perf_counter() - start
+    monitor.cancel()
+    return {
+        "turns": turns,
+        "waits": waits,
+        "loop_lags": lags,
+        "wall_seconds": wall_seconds,
+    }
+
+
+def run_level(concurrency: int, urls: dict[str, str] | None, conversations) -> dict:
+    """Run one concurrency level, in a fresh process"""
+    if urls is not None:
+        os.environ.update(
+            {"DEPLOYMENT_NAME": DEPLOYMENT, "WIKIPEDIA_BASE_URL": urls["wikipedia"]}
+        )
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        if urls is not None:
+            process_class = stub_chat_process(urls["model"])
+        else:
+            from src.wikipedia.process_framework.wiki_chat_process import (
+                WikiChatProcess as process_class,
+            )
+        cpu_start = time.process_time()
+        result = asyncio.run(drive(process_class, conversations, concurrency))
+    result["cpu_seconds"] = time.process_time() - cpu_start
+    return result
+
+
+def summarize(concurrency: int, result: dict) -> dict:
+    turns = result["turns"]
+    ok = [turn["seconds"] for turn in turns if turn["error"] is None]
+    steps: dict[str, list[float]] = {}
+    for turn in turns:
+        for step, seconds in turn["steps"].items():
+            steps.setdefault(step, []).append(seconds)
+    return {
+        "concurrency": concurrency,
+        "conversations": len(result["waits"]),
+        "turns": len(turns),
+        "errors": Counter(turn["error"] for turn in turns if turn["error"]),
+        "throughput": len(ok) / result["wall_seconds"],
+        "latency": ok,
+        "steps": steps,
+        "wait_p95": percentile(result["waits"], 95),
+        "loop_lag_p99": percentile(result["loop_lags"] or [0.0], 99),
+        "cpu_share": result["cpu_seconds"] / result["wall_seconds"],
+    }
+
+
+def saturation_level(levels: list[dict]) -> dict | None:
+    """The first level whose next level adds less than `LOAD_SCALING_THRESHOLD` throughput"""
+    for level, next_level in zip(levels, levels[1:]):
+        if next_level["throughput"] < level["throughput"] * (
+            1 + LOAD_SCALING_THRESHOLD
+        ):
+            return level
+    return None
+
+
+def print_report(levels: list[dict]):
+    table = Table(
+        title=f"{LOAD_BACKEND} backend, arrival rate "
+        f"{LOAD_ARRIVAL_RATE or 'unlimited'}/s, think time {LOAD_THINK_SECONDS}s"
+    )
+    for column in [
+        "Concurrency",
+        "Conversations",
+        "Turns",
+        "Errors",
+        "Turns/s",
+        "p50 (s)",
+        "p95 (s)",
+        "p99 (s)",
+        "Queue wait p95 (s)",
+        "Loop lag p99 (ms)",
+        "CPU",
+    ]:
+        table.add_column(column)
+    for level in levels:
+        errors = sum(level["errors"].values())
+        latency = level["latency"] or [0.0]
+        table.add_row(
+            str(level["concurrency"]),
+            str(level["conversations"]),
+            str(level["turns"]),
+            f"{errors / level['turns']:.0%} "
+            + ", ".join(f"{kind} {count}" for kind, count in level["errors"].items()),
+            f"{level['throughput']:.2f}",
+            f"{percentile(latency, 50):.2f}",
+            f"{percentile(latency, 95):.2f}",
+            f"{percentile(latency, 99):.2f}",
+            f"{level['wait_p95']:.2f}",
+            f"{1000 * level['loop_lag_p99']:.1f}",
+            f"{level['cpu_share']:.0%}",
+        )
+    console.print(table)
+
+    table = Table(title="Step latency p50 / p95 / p99 (ms) per concurrency")
+    table.add_column("Step")
+    for level in levels:
+        table.add_column(str(level["concurrency"]))
+    steps = dict.fromkeys(step for level in levels for step in level["steps"])
+    for step in steps:
+        cells = []
+        for level in levels:
+            seconds = level["steps"].get(step)
+            cells.append(
+                " / ".join(f"{1000 * percentile(seconds, p):.0f}" for p in (50, 95, 99))
+                if seconds
+                else "-"
+            )
+        table.add_row(step, *cells)
+    console.print(table)
+
+    saturated = saturation_level(levels)
+    if saturated is None:
+        console.print(
+            f"[bold green]Throughput still scales at concurrency "
+            f"{levels[-1]['concurrency']}, add higher levels[/bold green]"
+        )
+    else:
+        console.print(
+            f"[bold yellow]Throughput stops scaling at concurrency "
+            f"{saturated['concurrency']} ({saturated['throughput']:.2f} turns/s)"
+            f"[/bold yellow]"
+        )
+
+
+def run_levels(urls: dict[str, str] | None, conversations: list[list[str]]) -> list:
+    levels = []
+    for concurrency in LOAD_CONCURRENCY_LEVELS:
+        scripted = [
+            conversations[i % len(conversations)]
+            for i in range(concurrency * LOAD_CONVERSATIONS_PER_SLOT)
+        ]
+        console.print(
+            f"Concurrency [blue]{concurrency}[/blue]: {len(scripted)} conversations..."
+        )
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            result = executor.submit(run_level, concurrency, urls, scripted).result()
+        levels.append(summarize(concurrency, result))
+    return levels
+
+
+def main() -> None:
+    conversations = load_conversations()
+    if LOAD_BACKEND == "live":
+        levels = run_levels(None, conversations)
+    else:
+        with (
+            WikipediaStub(
+                latency_seconds=LOAD_WIKI_LATENCY_SECONDS,
+                error_rate=LOAD_WIKI_ERROR_RATE,
+            ) as wikipedia,
+            ModelStub(latency_seconds=LOAD_MODEL_LATENCY_SECONDS) as model,
+        ):
+            urls = {"wikipedia": wikipedia.base_url, "model": model.base_url}
+            levels = run_levels(urls, conversations)
+    print_report(levels)
+
+
+# run this as `uv run -m src.wikipedia.benchmark.load_test`
+if __name__ == "__main__":
+    main()
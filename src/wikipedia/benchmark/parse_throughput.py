@@ -0,0 +1,70 @@
+"""
+Measure HTML extraction throughput with thread pools vs process pools of
+increasing size. Threads share the GIL, processes scale with the cores.
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from rich.console import Console
+from rich.table import Table
+
+from src.wikipedia.process_framework.utils.web_utils import extract_text
+
+console = Console()
+
+PAGE_COUNT = 100
+
+
+def make_page(paragraphs: int = 1000) -> bytes:
+    """A synthetic page roughly the size of a long Wikipedia article"""
+    body = "".join(
+        f"<p>Paragraph {i} describes the subject in <a href='#'>some</a> detail. "
+        f"It has <b>several</b> sentences with markup. The last one ends here.</p>"
+        f"<ul><li>Item {i} of a list with a few words</li></ul>"
+        for i in range(paragraphs)
+    )
+    return f"<html><body>{body}</body></html>".encode()
+
+
+def pages_per_second(executor: Executor, page: bytes) -> float:
+    # Warm up the workers before timing
+    list(executor.map(extract_text, [page] * 4))
+    start = time.perf_counter()
+    list(executor.map(extract_text, [page] * PAGE_COUNT))
+    return PAGE_COUNT / (time.perf_counter() - start)
+
+
+def main() -> None:
+    page = make_page()
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    start_method = (
+        "forkserver"
+        if "forkserver" in multiprocessing.get_all_start_methods()
+        else "spawn"
+    )
+
+    table = Table(
+        title=f"Extraction throughput ({len(page) // 1024} KiB page, {cores} cores)"
+    )
+    for column in ["Workers", "Threads (pages/s)", "Processes (pages/s)"]:
+        table.add_column(column)
+
+    for workers in worker_counts:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            threads = pages_per_second(executor, page)
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context(start_method)
+        ) as executor:
+            processes = pages_per_second(executor, page)
+        table.add_row(str(workers), f"{threads:.1f}", f"{processes:.1f}")
+
+    console.print(table)
+
+
+# run this as `uv run -m src.wikipedia.benchmark.parse_throughput`
+if __name__ == "__main__":
+    main()
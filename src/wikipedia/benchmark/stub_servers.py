@@ -0,0 +1,537 @@
+"""
+Local stub servers that stand in for Wikipedia, Azure OpenAI and the Azure AI
+Agent Service in benchmarks and resilience checks
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import parse_qs, urlparse
+
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.policies import AzureKeyCredentialPolicy
+
+ARTICLE_TEMPLATE = """<html><body>
+<h1>{title}</h1>
+<p>{title} is a subject with a long and well documented history. It has been studied by many scholars over the centuries.</p>
+<p>The earliest records of {title} date back several hundred years. Many of these records are kept in European archives.</p>
+<ul><li>{title} is known for its influence on later generations of artists and scientists.</li></ul>
+<p>Modern research on {title} continues to produce new insights. Exhibitions about it attract millions of visitors each year.</p>
+</body></html>"""
+
+SEARCH_TEMPLATE = """<html><body>
+<div class="mw-search-result-heading"><a>{title} (disambiguation)</a></div>
+<div class="mw-search-result-heading"><a>{title} history</a></div>
+</body></html>"""
+
+
+def agents_client_kwargs(endpoint: str) -> dict:
+    """Arguments for a sync or async `AgentsClient` of an `AgentsStub`"""
+    # The stub speaks plain HTTP, bearer tokens are only sent over HTTPS
+    credential = AzureKeyCredential("stub")
+    return {
+        "endpoint": endpoint,
+        "credential": credential,
+        "authentication_policy": AzureKeyCredentialPolicy(credential, "api-key"),
+    }
+
+
+def stub_chat_process(model_url: str, api_version: str = "2025-04-01-preview"):
+    """A `WikiChatProcess` subclass whose deployments are served by a `ModelStub`
+
+    Imports the process framework, so set `WIKIPEDIA_BASE_URL` and the other
+    settings it reads first.
+    """
+    from openai import AsyncAzureOpenAI
+    from semantic_kernel import Kernel
+    from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+
+    from src.wikipedia.process_framework.utils.routing_utils import router
+    from src.wikipedia.process_framework.wiki_chat_process import WikiChatProcess
+
+    client = AsyncAzureOpenAI(
+        azure_endpoint=model_url, api_key="stub", api_version=api_version
+    )
+
+    class StubWikiChatProcess(WikiChatProcess):
+        def _setup_kernel(self) -> Kernel:
+            # The Azure OpenAI settings only accept HTTPS endpoints, pass a client
+            kernel = Kernel()
+            for deployment in router.deployments:
+                kernel.add_service(
+                    AzureChatCompletion(
+                        deployment_name=deployment,
+                        async_client=client,
+                        service_id=deployment,
+                    )
+                )
+            return kernel
+
+    return StubWikiChatProcess
+
+
+class WikipediaStub:
+    """Serves fake `/w/index.php?search=...` pages with injected latency and errors
+
+    Entities starting with "Unknown" get a search results page, everything else
+    an article. A `slow_fraction` of requests take `slow_latency_seconds` instead
+    of `latency_seconds`, and an `error_rate` of requests fail with 503 or 429.
+    """
+
+    def __init__(
+        self,
+        latency_seconds: float = 0.05,
+        slow_fraction: float = 0.0,
+        slow_latency_seconds: float = 2.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency_seconds = latency_seconds
+        self.slow_fraction = slow_fraction
+        self.slow_latency_seconds = slow_latency_seconds
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = 0
+        self.server: ThreadingHTTPServer | None = None
+
+    @property
+    def base_url(self) -> str:
+        assert self.server is not None, "Start the stub first"
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _draw(self) -> tuple[float, int]:
+        with self.lock:
+            self.request_count += 1
+            slow = self.random.random() < self.slow_fraction
+            error = self.random.random() < self.error_rate
+            if error:
+                self.error_count += 1
+            status = self.random.choice([503, 429]) if error else 200
+        return (self.slow_latency_seconds if slow else self.latency_seconds), status
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                latency, status = stub._draw()
+                time.sleep(latency)
+
+                query = parse_qs(urlparse(self.path).query)
+                title = query.get("search", ["Nothing"])[0].strip("[]")
+                if status != 200:
+                    body = "Service unavailable"
+                elif title.startswith("Unknown"):
+                    body = SEARCH_TEMPLATE.format(title=title)
+                else:
+                    body = ARTICLE_TEMPLATE.format(title=title)
+
+                payload = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "WikipediaStub":
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self) -> "WikipediaStub":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class AgentsStub:
+    """Serves the Azure AI Agents endpoints used by the agent service demo
+
+    Threads, messages and runs are kept in memory. A run is queued, then in
+    progress, and completes `run_seconds` after it was created, when it adds an
+    assistant message answering the thread's last user message. With a
+    `run_executor`, runs instead complete once `run_executor(question)` returned
+    the answer, e.g. after calling other stubs like the hosted agent would.
+    Requests are counted per operation in `request_counts`.
+    """
+
+    ROUTES = [
+        ("GET", re.compile(r"^/assistants/(?P<agent_id>[^/]+)$"), "get_agent"),
+        ("POST", re.compile(r"^/threads$"), "create_thread"),
+        (
+            "POST",
+            re.compile(r"^/threads/(?P<thread_id>[^/]+)/messages$"),
+            "create_message",
+        ),
+        (
+            "GET",
+            re.compile(r"^/threads/(?P<thread_id>[^/]+)/messages$"),
+            "list_messages",
+        ),
+        ("POST", re.compile(r"^/threads/(?P<thread_id>[^/]+)/runs$"), "create_run"),
+        (
+            "GET",
+            re.compile(r"^/threads/(?P<thread_id>[^/]+)/runs/(?P<run_id>[^/]+)$"),
+            "get_run",
+        ),
+    ]
+
+    def __init__(
+        self,
+        run_seconds: float = 1.0,
+        latency_seconds: float = 0.01,
+        run_executor: Callable[[str], str] | None = None,
+    ):
+        self.run_seconds = run_seconds
+        self.latency_seconds = latency_seconds
+        self.run_executor = run_executor
+        self.run_pool: ThreadPoolExecutor | None = None
+        self.lock = threading.Lock()
+        self.threads: dict[str, list[dict]] = {}
+        self.runs: dict[str, dict] = {}
+        self.request_counts: Counter[str] = Counter()
+        self.server: ThreadingHTTPServer | None = None
+
+    @property
+    def base_url(self) -> str:
+        assert self.server is not None, "Start the stub first"
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @staticmethod
+    def _new_id(prefix: str) -> str:
+        return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+    def _message(self, thread_id: str, role: str, text: str, run_id=None) -> dict:
+        return {
+            "id": self._new_id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "status": "completed",
+            "role": role,
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+            "attachments": [],
+            "metadata": {},
+            "run_id": run_id,
+        }
+
+    def _last_question(self, thread_id: str) -> str:
+        return next(
+            (
+                m["content"][0]["text"]["value"]
+                for m in reversed(self.threads[thread_id])
+                if m["role"] == "user"
+            ),
+            "",
+        )
+
+    def _advance(self, run: dict) -> dict:
+        """Move a run along by the time passed since it was created"""
+        if run["status"] in ("completed", "failed"):
+            return run
+        answer: Future | None = run.get("_answer")
+        if answer is None:
+            elapsed = time.monotonic() - run["_started"]
+            if elapsed < self.run_seconds / 4:
+                return run
+            if elapsed < self.run_seconds:
+                run["status"] = "in_progress"
+                return run
+            text = f"Answer to: {self._last_question(run['thread_id'])}"
+        elif not answer.done():
+            run["status"] = "in_progress"
+            return run
+        elif answer.exception() is not None:
+            run["status"] = "failed"
+            run["last_error"] = {
+                "code": "server_error",
+                "message": str(answer.exception()),
+            }
+            return run
+        else:
+            text = answer.result()
+
+        run["status"] = "completed"
+        run["completed_at"] = int(time.time())
+        self.threads[run["thread_id"]].append(
+            self._message(run["thread_id"], "assistant", text, run["id"])
+        )
+        return run
+
+    def _handle(self, operation: str, params: dict, query: dict, body: dict):
+        if operation == "get_agent":
+            return {
+                "id": params["agent_id"],
+                "object": "assistant",
+                "name": "Stub Agent",
+                "model": "stub",
+                "tools": [],
+            }
+        if operation == "create_thread":
+            thread_id = self._new_id("thread")
+            self.threads[thread_id] = []
+            return {
+                "id": thread_id,
+                "object": "thread",
+                "created_at": int(time.time()),
+                "metadata": {},
+            }
+        messages = self.threads.get(params["thread_id"])
+        if messages is None:
+            return None
+        if operation == "create_message":
+            message = self._message(
+                params["thread_id"], body.get("role", "user"), body.get("content", "")
+            )
+            messages.append(message)
+            return message
+        if operation == "list_messages":
+            run_id = query.get("run_id", [None])[0]
+            data = [m for m in messages if run_id is None or m["run_id"] == run_id]
+            if query.get("order", ["desc"])[0] == "desc":
+                data = data[::-1]
+            # Pages continue after the previous page's last_id until one is empty
+            after = query.get("after", [None])[0]
+            if after is not None:
+                ids = [m["id"] for m in data]
+                data = data[ids.index(after) + 1 :] if after in ids else []
+            limit = int(query.get("limit", ["20"])[0])
+            has_more = len(data) > limit
+            data = data[:limit]
+            return {
+                "object": "list",
+                "data": data,
+                "first_id": data[0]["id"] if data else None,
+                "last_id": data[-1]["id"] if data else None,
+                "has_more": has_more,
+            }
+        if operation == "create_run":
+            run = {
+                "id": self._new_id("run"),
+                "object": "thread.run",
+                "thread_id": params["thread_id"],
+                "assistant_id": body.get("assistant_id"),
+                "status": "queued",
+                "created_at": int(time.time()),
+                "_started": time.monotonic(),
+            }
+            if self.run_executor is not None and self.run_pool is not None:
+                run["_answer"] = self.run_pool.submit(
+                    self.run_executor, self._last_question(params["thread_id"])
+                )
+            self.runs[run["id"]] = run
+            return {k: v for k, v in run.items() if not k.startswith("_")}
+        run = self.runs.get(params["run_id"])
+        if run is None:
+            return None
+        return {k: v for k, v in self._advance(run).items() if not k.startswith("_")}
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self, method: str):
+                time.sleep(stub.latency_seconds)
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                for route_method, pattern, operation in stub.ROUTES:
+                    match = pattern.match(url.path)
+                    if route_method == method and match:
+                        with stub.lock:
+                            stub.request_counts[operation] += 1
+                            result = stub._handle(
+                                operation, match.groupdict(), parse_qs(url.query), body
+                            )
+                        break
+                else:
+                    result = None
+
+                payload = json.dumps(
+                    result
+                    if result is not None
+                    else {"error": {"message": "Not found"}}
+                ).encode()
+                self.send_response(200 if result is not None else 404)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "AgentsStub":
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        if self.run_executor is not None:
+            self.run_pool = ThreadPoolExecutor(max_workers=16)
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.run_pool is not None:
+            self.run_pool.shutdown(cancel_futures=True)
+            self.run_pool = None
+
+    def __enter__(self) -> "AgentsStub":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class ModelStub:
+    """Serves Azure OpenAI chat completions for any deployment after a fixed latency
+
+    Query rewrite prompts are answered with the question they end with, as plain
+    text or, with a JSON schema `response_format`, as `{"query": ..., "entities":
+    [...]}`. Other prompts get an answer quoting the question. Token usage is
+    estimated at four characters per token.
+    """
+
+    ROUTE = re.compile(r"^/openai/deployments/(?P<deployment>[^/]+)/chat/completions$")
+
+    def __init__(self, latency_seconds: float = 0.2):
+        self.latency_seconds = latency_seconds
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.server: ThreadingHTTPServer | None = None
+
+    @property
+    def base_url(self) -> str:
+        assert self.server is not None, "Start the stub first"
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @staticmethod
+    def _text(content) -> str:
+        if isinstance(content, list):
+            return " ".join(part.get("text", "") for part in content)
+        return content or ""
+
+    def complete(self, deployment: str, body: dict) -> dict:
+        messages = body.get("messages", [])
+        texts = [self._text(m.get("content")) for m in messages]
+        question = next(
+            (
+                text
+                for m, text in zip(reversed(messages), reversed(texts))
+                if m.get("role") == "user"
+            ),
+            "",
+        )
+        # The promptflow rewrite template ends with the transcript, "Human: <question>"
+        lines = [line.strip() for line in question.splitlines() if line.strip()]
+        humans = [line[6:].strip() for line in lines if line.startswith("Human:")]
+        query = (humans[-1] if humans else " ".join(lines))[:80]
+        if (body.get("response_format") or {}).get("type") == "json_schema":
+            content = json.dumps({"query": query, "entities": [query]})
+        elif any("infer user real intent" in text for text in texts):
+            content = query
+        else:
+            content = f"Stub answer to: {query}. SOURCES: stub"
+
+        prompt_tokens = sum(len(text) for text in texts) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                with stub.lock:
+                    stub.request_count += 1
+                time.sleep(stub.latency_seconds)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                match = stub.ROUTE.match(urlparse(self.path).path)
+                if match:
+                    status = 200
+                    result = stub.complete(match["deployment"], body)
+                else:
+                    status = 404
+                    result = {"error": {"code": "404", "message": "Not found"}}
+
+                payload = json.dumps(result).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "ModelStub":
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self) -> "ModelStub":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,105 @@
+"""
+Evaluation cache - content-addressed target outputs and evaluator scores
+
+Target outputs are keyed by the question and a fingerprint of the process
+framework: its source code, prompts included, and the current values of the
+settings it reads. Scores are keyed by the evaluator, its judge model and the
+inputs it scored, so an unchanged answer is not judged again. Every entry is a
+JSON file named by its key under `EVAL_CACHE_DIR`.
+
+Set `EVAL_CACHE=false` to recompute every row, the results still refresh the cache.
+"""
+
+import hashlib
+import importlib.metadata
+import json
+import os
+import re
+from pathlib import Path
+
+EVAL_CACHE = os.getenv("EVAL_CACHE", "true").lower() == "true"
+EVAL_CACHE_DIR = os.getenv("EVAL_CACHE_DIR", "src/wikipedia/evaluation/cache")
+
+TARGET_SOURCE_DIR = Path(__file__).parents[1] / "process_framework"
+SETTING_PATTERN = re.compile(
+    r"""os\.(?:getenv\(|environ\.get\(|environ\[)\s*["'](\w+)["']"""
+)
+# Secrets, and settings that change how a turn is observed but not its answer
+IGNORED_SETTINGS = {
+    "API_KEY",
+    "APPLICATION_INSIGHTS_CONNECTION_STRING",
+    "LOG_LEVEL",
+    "METRICS_EXPORT_INTERVAL_MS",
+    "PROFILE_DIR",
+    "PROFILE_EVERY_N",
+    "PROFILE_INTERVAL_MS",
+    "PROFILE_SAMPLE_RATE",
+    "TRACE_BUFFER_MAX_SPANS",
+    "TRACE_LATENCY_THRESHOLD_SECONDS",
+    "TRACE_SAMPLE_RATIO",
+}
+
+
+def make_key(*parts) -> str:
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def target_fingerprint(source_dir: Path = TARGET_SOURCE_DIR) -> str:
+    """Changes with any step, prompt or util of the process, or a setting they read"""
+    digest = hashlib.sha256()
+    settings = set()
+    for path in sorted(source_dir.rglob("*.py")):
+        source = path.read_bytes()
+        digest.update(path.relative_to(source_dir).as_posix().encode())
+        digest.update(source)
+        settings.update(SETTING_PATTERN.findall(source.decode("utf-8")))
+    for name in sorted(settings - IGNORED_SETTINGS):
+        digest.update(f"{name}={os.getenv(name)}\n".encode())
+    return digest.hexdigest()[:32]
+
+
+def evaluator_fingerprint(
+    name: str, evaluator_class: type, options: dict, judge: dict
+) -> str:
+    """Changes with the evaluator, its options, the judge model or the SDK's prompts"""
+    try:
+        version = importlib.metadata.version("azure-ai-evaluation")
+    except importlib.metadata.PackageNotFoundError:
+        version = None
+    return make_key(name, evaluator_class.__qualname__, options, judge, version)
+
+
+class EvalCache:
+    """JSON entries per kind (`targets` or `scores`) and key"""
+
+    def __init__(self, directory: str = EVAL_CACHE_DIR, enabled: bool = EVAL_CACHE):
+        self.directory = Path(directory)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, kind: str, key: str) -> Path:
+        return self.directory / kind / f"{key}.json"
+
+    def get(self, kind: str, key: str) -> dict | None:
+        if not self.enabled:
+            self.misses += 1
+            return None
+        try:
+            with open(self._path(kind, key), encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, kind: str, key: str, value: dict):
+        path = self._path(kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write and rename, so an interrupted run leaves no partial entry
+        temporary = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(temporary, path)
@@ -2,8 +2,11 @@
 How to evaluate the process locally. More information: https://learn.microsoft.com/en-us/azure/ai-foundry/how-to/develop/evaluate-sdk
 """
 
+import itertools
 import json
 import os
+import tempfile
+import time
 
 from azure.ai.evaluation import (
     AzureOpenAIModelConfiguration,
@@ -15,8 +18,14 @@ from azure.ai.evaluation import (
 from dotenv import load_dotenv
 from rich.console import Console
 
+from src.wikipedia.process_framework.utils.usage_utils import (
+    UsageTracker,
+    print_usage_report,
+)
 from src.wikipedia.process_framework.wiki_chat_process import get_answer
 
+from .eval_cache import EvalCache, evaluator_fingerprint, make_key, target_fingerprint
+from .local_evaluators import PRESCREEN, PrescreenEvaluator, prescreen_outputs
 from .print_eval import print_metrics, print_row
 
 console = Console()
@@ -24,6 +33,324 @@ console = Console()
 EVAL_DATA_PATH = "src/wikipedia/evaluation/wiki.jsonl"
 OUTPUT_PATH = "src/wikipedia/evaluation/evaluation_result.json"
 
+# Append rows to EVAL_STREAM_PATH as they finish instead of writing OUTPUT_PATH at the end
+EVAL_STREAM = os.getenv("EVAL_STREAM", "false").lower() == "true"
+EVAL_STREAM_PATH = os.getenv(
+    "EVAL_STREAM_PATH", "src/wikipedia/evaluation/evaluation_result.jsonl"
+)
+EVAL_CHUNK_SIZE = int(os.getenv("EVAL_CHUNK_SIZE", "50"))
+
+# Evaluator name -> class and options
+EVALUATORS = {
+    "relevance": (RelevanceEvaluator, {"threshold": 4}),
+    "retrieval": (RetrievalEvaluator, {"threshold": 3}),
+    "groundedness": (GroundednessEvaluator, {"threshold": 4}),
+}
+TARGET_OUTPUTS = ("response", "context", "usage")
+# Local scores are reported like an evaluator's, under this name
+METRIC_NAMES = [*EVALUATORS, "prescreen"] if PRESCREEN != "off" else list(EVALUATORS)
+
+
+def run_evaluate(items: list[dict], evaluators: dict, target=None) -> list[dict]:
+    """Run `evaluate` on some rows of the dataset and return its rows in order
+
+    Without a target, the rows must carry the `response` and `context` to score.
+    """
+    source = "target" if target is not None else "data"
+    with tempfile.TemporaryDirectory() as directory:
+        data_path = os.path.join(directory, "data.jsonl")
+        with open(data_path, "w", encoding="utf-8") as f:
+            for item in items:
+                f.write(json.dumps(item) + "\n")
+        result = evaluate(
+            data=data_path,
+            target=target,
+            evaluators=evaluators,
+            evaluator_config={
+                "default": {
+                    "column_mapping": {
+                        "query": "${data.question}",
+                        "ground_truth": "${data.ground_truth_answer}",
+                        "context": f"${{{source}.context}}",
+                        "response": f"${{{source}.response}}",
+                    }
+                }
+            },
+        )
+    return result["rows"]
+
+
+def score_key(fingerprint: str, row: dict) -> str:
+    return make_key(
+        fingerprint,
+        row.get("inputs.question"),
+        row.get("inputs.ground_truth_answer"),
+        row.get("outputs.response"),
+        row.get("outputs.context"),
+    )
+
+
+def evaluator_outputs(name: str, row: dict) -> dict:
+    prefix = f"outputs.{name}."
+    return {key: value for key, value in row.items() if key.startswith(prefix)}
+
+
+def evaluate_incrementally(
+    items: list[dict], evaluators: dict[str, tuple], cache: EvalCache
+) -> tuple[list[dict], list[dict]]:
+    """Evaluate the dataset, recomputing only answers and scores missing from the cache
+
+    `evaluators` maps names to `(evaluator, fingerprint)`. Returns all rows and
+    the rows answered in this run. With `PRESCREEN=gate`, new answers are
+    pre-screened first and the judges only score the rows that pass.
+    """
+    fingerprint = target_fingerprint()
+    target_keys = [make_key(item["question"], fingerprint) for item in items]
+    rows = []
+    for item, key in zip(items, target_keys):
+        row = {f"inputs.{name}": value for name, value in item.items()}
+        outputs = cache.get("targets", key) or {}
+        row.update({f"outputs.{name}": value for name, value in outputs.items()})
+        rows.append(row)
+
+    # New answers get every score in the same run, unless they are pre-screened first
+    unanswered = [i for i, row in enumerate(rows) if "outputs.response" not in row]
+    if unanswered:
+        console.print(
+            f"[bold]Answering {len(unanswered)} of {len(rows)} questions[/bold]"
+        )
+        results = run_evaluate(
+            [items[i] for i in unanswered],
+            (
+                {"prescreen": PrescreenEvaluator()}
+                if PRESCREEN == "gate"
+                else {name: evaluator for name, (evaluator, _) in evaluators.items()}
+            ),
+            target=get_answer,
+        )
+        for i, result in zip(unanswered, results):
+            rows[i].update(
+                {k: v for k, v in result.items() if k.startswith("outputs.")}
+            )
+            if rows[i].get("outputs.response") is not None:
+                cache.put(
+                    "targets",
+                    target_keys[i],
+                    {name: rows[i].get(f"outputs.{name}") for name in TARGET_OUTPUTS},
+                )
+
+    with_answer = [row for row in rows if row.get("outputs.response") is not None]
+    if PRESCREEN != "off":
+        # Cheap enough to score every row again, in one batch
+        for row, outputs in zip(with_answer, prescreen_outputs(with_answer)):
+            row.update(outputs)
+    gated = set()
+    if PRESCREEN == "gate":
+        gated = {
+            i
+            for i, row in enumerate(rows)
+            if row.get("outputs.prescreen.prescreen_result") == "fail"
+        }
+        if gated:
+            console.print(
+                f"[bold]{len(gated)} answers failed the pre-screen, "
+                f"not sent to the judges[/bold]"
+            )
+
+    # Cached answers are only judged by evaluators whose score is missing
+    for name, (evaluator, evaluator_key) in evaluators.items():
+        unscored = []
+        for i, row in enumerate(rows):
+            if row.get("outputs.response") is None or i in gated:
+                continue
+            key = score_key(evaluator_key, row)
+            outputs = evaluator_outputs(name, row)
+            if outputs.get(f"outputs.{name}.{name}") is not None:
+                cache.put("scores", key, outputs)
+            elif cached := cache.get("scores", key):
+                row.update(cached)
+            else:
+                unscored.append(i)
+        if not unscored:
+            continue
+        console.print(f"[bold]Scoring {len(unscored)} answers for {name}[/bold]")
+        results = run_evaluate(
+            [
+                {
+                    **items[i],
+                    "response": rows[i]["outputs.response"],
+                    "context": rows[i]["outputs.context"],
+                }
+                for i in unscored
+            ],
+            {name: evaluator},
+        )
+        for i, result in zip(unscored, results):
+            outputs = evaluator_outputs(name, result)
+            rows[i].update(outputs)
+            if outputs.get(f"outputs.{name}.{name}") is not None:
+                cache.put("scores", score_key(evaluator_key, rows[i]), outputs)
+
+    return rows, [rows[i] for i in unanswered]
+
+
+class RunningMetrics:
+    """Means of the numeric evaluator outputs and pass rates, updated row by row
+
+    A row the pre-screen kept from the judges counts as failed by every judge
+    in the pass rates, the means only cover the judged rows.
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.sums: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.results: dict[str, int] = {}
+        self.passes: dict[str, int] = {}
+        self.gated = 0
+
+    def add(self, row: dict):
+        gated = row.get("outputs.prescreen.prescreen_result") == "fail" and not any(
+            key.startswith(f"outputs.{name}.")
+            for name in self.names
+            if name != "prescreen"
+            for key in row
+        )
+        self.gated += gated
+        for name in self.names:
+            if gated and name != "prescreen":
+                self.results[name] = self.results.get(name, 0) + 1
+                continue
+            prefix = f"outputs.{name}."
+            for key, value in row.items():
+                if not key.startswith(prefix):
+                    continue
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    column = f"{name}.{key[len(prefix) :]}"
+                    self.sums[column] = self.sums.get(column, 0.0) + value
+                    self.counts[column] = self.counts.get(column, 0) + 1
+                elif key.endswith("_result"):
+                    self.results[name] = self.results.get(name, 0) + 1
+                    self.passes[name] = self.passes.get(name, 0) + (value == "pass")
+
+    def to_dict(self) -> dict:
+        """The metrics like `evaluate` reports them"""
+        metrics = {
+            column: round(total / self.counts[column], 2)
+            for column, total in self.sums.items()
+        }
+        for name, count in self.results.items():
+            metrics[f"{name}.binary_aggregate"] = round(
+                self.passes.get(name, 0) / count, 2
+            )
+        if self.gated:
+            metrics["prescreen.gated_rows"] = self.gated
+        return metrics
+
+
+def aggregate_metrics(rows: list[dict], names) -> dict:
+    metrics = RunningMetrics(names)
+    for row in rows:
+        metrics.add(row)
+    return metrics.to_dict()
+
+
+def read_stream(path: str, metrics: RunningMetrics) -> dict[int, str]:
+    """Rows already in a streamed result file, by dataset line, added to `metrics`
+
+    A row cut off by an interrupted run is removed from the file.
+    """
+    done: dict[int, str] = {}
+    if not os.path.exists(path):
+        return done
+    end = 0
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                break
+            done[row["line_number"]] = row.get("inputs.question")
+            metrics.add(row)
+            end += len(line)
+    with open(path, "r+b") as f:
+        f.truncate(end)
+    return done
+
+
+def is_complete(row: dict, judges) -> bool:
+    """Answered and scored by every judge, or kept from the judges by the pre-screen"""
+    if row.get("outputs.response") is None:
+        return False
+    if row.get("outputs.prescreen.prescreen_result") == "fail" and PRESCREEN == "gate":
+        return True
+    return all(row.get(f"outputs.{name}.{name}") is not None for name in judges)
+
+
+def evaluate_streaming(
+    evaluators: dict[str, tuple],
+    cache: EvalCache,
+    data_path: str = EVAL_DATA_PATH,
+    output_path: str = EVAL_STREAM_PATH,
+    chunk_size: int = EVAL_CHUNK_SIZE,
+) -> tuple[RunningMetrics, UsageTracker]:
+    """Evaluate the dataset chunk by chunk, appending every row to a JSON lines file
+
+    Only the current chunk is kept in memory. Rows already in the file are
+    skipped, so an interrupted run resumes where it stopped. Rows without an
+    answer or a judge's score are not written, the next run retries them.
+    """
+    metrics = RunningMetrics(METRIC_NAMES)
+    done = read_stream(output_path, metrics)
+    if done:
+        console.print(f"[bold]Resuming after {len(done)} rows in {output_path}[/bold]")
+
+    def pending():
+        with open(data_path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f):
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if line_number not in done:
+                    yield line_number, item
+                elif done[line_number] != item["question"]:
+                    raise ValueError(
+                        f"Line {line_number} of {data_path} changed since "
+                        f"{output_path} was written, move it away to start over"
+                    )
+
+    usage = UsageTracker()
+    evaluated = 0
+    incomplete = 0
+    start_time = time.monotonic()
+    with open(output_path, "a", encoding="utf-8") as output:
+        for chunk in itertools.batched(pending(), chunk_size):
+            rows, answered = evaluate_incrementally(
+                [item for _, item in chunk], evaluators, cache
+            )
+            for (line_number, _), row in zip(chunk, rows):
+                if not is_complete(row, evaluators):
+                    incomplete += 1
+                    continue
+                output.write(json.dumps({"line_number": line_number, **row}) + "\n")
+                metrics.add(row)
+                evaluated += 1
+            # Flushed per chunk, so a crash loses at most the chunk in progress
+            output.flush()
+            for row in answered:
+                usage.merge(UsageTracker.model_validate(row.get("outputs.usage") or {}))
+            console.print(
+                f"[bold green]{len(done) + evaluated} rows written "
+                f"({evaluated / (time.monotonic() - start_time):.1f}/s)[/bold green]"
+            )
+
+    if incomplete:
+        console.print(
+            f"[yellow]{incomplete} rows without an answer or a score were not "
+            f"written, rerun to retry them[/yellow]"
+        )
+    return metrics, usage
+
 
 def main() -> None:
     """Run the evaluation pipeline and print results."""
@@ -46,31 +373,39 @@ def main() -> None:
         azure_deployment=deployment_name,
         api_version=api_version,
     )
+    judge = {
+        "endpoint": endpoint,
+        "deployment": deployment_name,
+        "version": api_version,
+    }
+    evaluators = {
+        name: (
+            evaluator_class(model_config=model_config, **options),
+            evaluator_fingerprint(name, evaluator_class, options, judge),
+        )
+        for name, (evaluator_class, options) in EVALUATORS.items()
+    }
 
-    result = evaluate(
-        data=EVAL_DATA_PATH,
-        target=get_answer,
-        evaluators={
-            "relevance": RelevanceEvaluator(model_config=model_config, threshold=4),
-            "retrieval": RetrievalEvaluator(
-                model_config=model_config,
-                threshold=3,
-            ),
-            "groundedness": GroundednessEvaluator(
-                model_config=model_config,
-                threshold=4,
-            ),
-        },
-        evaluator_config={
-            "default": {
-                "column_mapping": {
-                    "query": "${data.question}",
-                    "ground_truth": "${data.ground_truth_answer}",
-                    "context": "${target.context}",
-                    "response": "${target.response}",
-                }
-            }
-        },
+    cache = EvalCache()
+    if EVAL_STREAM:
+        metrics, usage = evaluate_streaming(evaluators, cache)
+        console.rule("[bold green]Evaluation Results[/bold green]")
+        print_metrics(metrics.to_dict(), console)
+        print_usage_report(usage, title="Token Usage of the Wiki Chat Process")
+        return
+
+    with open(EVAL_DATA_PATH, encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+
+    rows, answered = evaluate_incrementally(items, evaluators, cache)
+    result = {
+        "rows": rows,
+        "metrics": aggregate_metrics(rows, METRIC_NAMES),
+        "studio_url": None,
+    }
+    console.print(
+        f"[bold]{cache.hits} answers and scores from the cache, "
+        f"{len(answered)} questions answered[/bold]"
     )
 
     with open(OUTPUT_PATH, "w") as f:
@@ -82,6 +417,12 @@ def main() -> None:
     for row in result["rows"]:
         print_row(row, console)
 
+    # Cached answers cost no tokens in this run
+    usage = UsageTracker()
+    for row in answered:
+        usage.merge(UsageTracker.model_validate(row.get("outputs.usage") or {}))
+    print_usage_report(usage, title="Token Usage of the Wiki Chat Process")
+
 
 # run this as `uv run -m src.evaluation.evaluate`
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+"""
+Local evaluators - cheap lexical scores, computed for a whole dataset in NumPy batches
+
+- `context_overlap`: share of the response's words found in the retrieved
+  context, a lexical stand-in for groundedness
+- `citation_present`: 1 when the response has a SOURCES part
+- `citation_valid`: share of the URLs the response cites that were retrieved
+- `token_f1`: token F1 of the response against the ground truth answer
+
+Rows failing the pre-screen (`prescreen_result` is "fail") are clearly
+ungrounded, with `PRESCREEN=gate` they are not sent to the LLM judges.
+"""
+
+import os
+import re
+import zlib
+from urllib.parse import unquote_plus
+
+import numpy as np
+
+from src.wikipedia.process_framework.utils.memory_utils import terms
+
+# off: LLM judges only, score: add the local scores, gate: also skip judges for failing rows
+PRESCREEN = os.getenv("PRESCREEN", "off").lower()
+PRESCREEN_MIN_OVERLAP = float(os.getenv("PRESCREEN_MIN_OVERLAP", "0.3"))
+PRESCREEN_REQUIRE_CITATION = (
+    os.getenv("PRESCREEN_REQUIRE_CITATION", "false").lower() == "true"
+)
+
+SOURCES_PATTERN = re.compile(r"\bSOURCES\b", re.IGNORECASE)
+URL_PATTERN = re.compile(r"https?://[^\s<>()\[\]\"']+")
+CONTEXT_SOURCE_PATTERN = re.compile(r"^Source: (.+)$", re.MULTILINE)
+
+
+def split_sources(response: str) -> tuple[str, str]:
+    """The answer and its SOURCES part, empty when there is none"""
+    match = SOURCES_PATTERN.search(response)
+    if match is None:
+        return response, ""
+    return response[: match.start()], response[match.start() :]
+
+
+def normalize_url(url: str) -> str:
+    return unquote_plus(url).strip().rstrip(".,;:").lower()
+
+
+def token_counts(texts: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Unique `(row, term)` keys with their counts, and the number of terms per row
+
+    A key holds the row in its high and the term's CRC32 in its low 32 bits, so
+    the terms of every row are counted and matched in one sorted array.
+    """
+    rows, hashes = [], []
+    for row, text in enumerate(texts):
+        words = terms(text or "")
+        rows.extend([row] * len(words))
+        hashes.extend(zlib.crc32(word.encode()) for word in words)
+    rows = np.array(rows, dtype=np.uint64)
+    keys = (rows << np.uint64(32)) | np.array(hashes, dtype=np.uint64)
+    unique, counts = np.unique(keys, return_counts=True)
+    lengths = np.bincount(rows.astype(np.int64), minlength=len(texts))
+    return unique, counts, lengths
+
+
+def shared_terms(texts: list[str], others: list[str]) -> tuple[np.ndarray, ...]:
+    """Terms each text shares with the other text of its row, counted with clipping
+
+    Returns the shared counts and the number of terms of both sides per row.
+    """
+    keys, counts, lengths = token_counts(texts)
+    other_keys, other_counts, other_lengths = token_counts(others)
+    common, i, j = np.intersect1d(
+        keys, other_keys, assume_unique=True, return_indices=True
+    )
+    shared = np.bincount(
+        (common >> np.uint64(32)).astype(np.int64),
+        weights=np.minimum(counts[i], other_counts[j]),
+        minlength=len(texts),
+    )
+    return shared, lengths, other_lengths
+
+
+def citation_scores(
+    responses: list[str], contexts: list[str]
+) -> tuple[np.ndarray, np.ndarray]:
+    """Whether each response has a SOURCES part, and the share of its URLs that were retrieved
+
+    Retrieved URLs may contain spaces, a cited URL cut off at one still counts
+    when it is the start of a retrieved URL.
+    """
+    present = np.zeros(len(responses))
+    valid = np.zeros(len(responses))
+    for row, (response, context) in enumerate(zip(responses, contexts)):
+        _, sources = split_sources(response or "")
+        present[row] = bool(sources)
+        cited = [normalize_url(url) for url in URL_PATTERN.findall(response or "")]
+        if not cited:
+            continue
+        retrieved = [
+            normalize_url(url) for url in CONTEXT_SOURCE_PATTERN.findall(context or "")
+        ]
+        valid[row] = sum(
+            any(url.startswith(cite) for url in retrieved) for cite in cited
+        ) / len(cited)
+    return present, valid
+
+
+def prescreen_scores(
+    responses: list[str],
+    contexts: list[str],
+    ground_truths: list[str],
+    min_overlap: float = PRESCREEN_MIN_OVERLAP,
+    require_citation: bool = PRESCREEN_REQUIRE_CITATION,
+) -> dict[str, np.ndarray]:
+    """Every local score of a batch of rows, one array per score"""
+    answers = [split_sources(response or "")[0] for response in responses]
+    shared, answer_lengths, _ = shared_terms(answers, contexts)
+    context_overlap = shared / np.maximum(answer_lengths, 1)
+
+    shared, answer_lengths, truth_lengths = shared_terms(answers, ground_truths)
+    precision = shared / np.maximum(answer_lengths, 1)
+    recall = shared / np.maximum(truth_lengths, 1)
+    token_f1 = np.divide(
+        2 * precision * recall,
+        precision + recall,
+        out=np.zeros(len(responses)),
+        where=precision + recall > 0,
+    )
+    # No ground truth, no F1
+    token_f1[truth_lengths == 0] = np.nan
+
+    citation_present, citation_valid = citation_scores(responses, contexts)
+    passed = context_overlap >= min_overlap
+    if require_citation:
+        passed &= citation_present > 0
+    return {
+        "context_overlap": context_overlap,
+        "citation_present": citation_present,
+        "citation_valid": citation_valid,
+        "token_f1": token_f1,
+        "passed": passed,
+    }
+
+
+def prescreen_outputs(rows: list[dict], name: str = "prescreen") -> list[dict]:
+    """Score evaluation rows, as `outputs.<name>.*` columns like the SDK's evaluators"""
+    scores = prescreen_scores(
+        [row.get("outputs.response") or "" for row in rows],
+        [row.get("outputs.context") or "" for row in rows],
+        [row.get("inputs.ground_truth_answer") or "" for row in rows],
+    )
+    outputs = []
+    for i in range(len(rows)):
+        columns = {
+            f"outputs.{name}.{score}": round(float(values[i]), 4)
+            for score, values in scores.items()
+            if score != "passed" and not np.isnan(values[i])
+        }
+        columns[f"outputs.{name}.{name}_result"] = (
+            "pass" if scores["passed"][i] else "fail"
+        )
+        outputs.append(columns)
+    return outputs
+
+
+class PrescreenEvaluator:
+    """The local scores of one row, as an `evaluate` custom evaluator"""
+
+    def __call__(self, *, response: str, context: str, ground_truth: str = "") -> dict:
+        row = {
+            "outputs.response": response,
+            "outputs.context": context,
+            "inputs.ground_truth_answer": ground_truth,
+        }
+        prefix = "outputs.prescreen."
+        return {
+            key[len(prefix) :]: value
+            for key, value in prescreen_outputs([row])[0].items()
+        }
@@ -60,6 +60,14 @@ def print_row(row, console: Console):
         f"{'✅ Pass' if groundedness_result == 'pass' else '❌ Fail'} ({groundedness})",
     )
     table.add_row("[dim]Groundedness Reason[/dim]", shorten_text(groundedness_reason))
+    if prescreen_result := row.get("outputs.prescreen.prescreen_result"):
+        table.add_row(
+            "[bold yellow]PRE-SCREEN[/bold yellow]",
+            f"{'✅ Pass' if prescreen_result == 'pass' else '❌ Fail'} "
+            f"(overlap {row.get('outputs.prescreen.context_overlap')}, "
+            f"F1 {row.get('outputs.prescreen.token_f1', '-')}, "
+            f"citations {row.get('outputs.prescreen.citation_valid')})",
+        )
 
     panel = Panel(table, title="Result", expand=False, border_style="magenta")
     console.print(panel)
@@ -0,0 +1,141 @@
+"""
+Flow Compiler - Builds a Semantic Kernel process from a promptflow flow.dag.yaml
+
+Every node becomes a `FlowNodeStep` that runs as soon as the values of all its
+`${...}` inputs arrived, so nodes without a dependency path between them run in
+the same superstep, concurrently.
+"""
+
+import asyncio
+import uuid
+from pathlib import Path
+from typing import Any, Callable
+
+from rich import print
+from semantic_kernel import Kernel
+from semantic_kernel.processes import ProcessBuilder
+from semantic_kernel.processes.kernel_process import KernelProcess, KernelProcessEvent
+from semantic_kernel.processes.local_runtime.local_kernel_process import start
+
+from .steps.flow_node_step import (
+    FlowNodeStep,
+    FlowNodeStepState,
+    FlowOutputStep,
+    FlowOutputStepState,
+)
+from .utils.flow_utils import Flow, load_flow, parse_reference
+from .utils.llm_utils import create_kernel
+from .utils.web_utils import format_search_results, search_results_from_urls
+from .utils.wiki_utils import get_wiki_urls
+
+OUTPUT_STEP_NAME = "flow_outputs"
+
+WIKIPEDIA_FLOW_PATH = Path(__file__).parents[1] / "promptflow" / "flow.dag.yaml"
+# The migrated versions of the Wikipedia flow's python nodes
+WIKIPEDIA_TOOLS: dict[str, Callable] = {
+    "get_wiki_url": get_wiki_urls,
+    "search_result_from_url": search_results_from_urls,
+    "process_search_result": format_search_results,
+}
+
+
+def compile_flow(flow: Flow) -> ProcessBuilder:
+    """Build the process graph of a flow from its data dependencies"""
+    process_builder = ProcessBuilder(name=flow.name)  # type: ignore
+
+    steps = {
+        node.name: process_builder.add_step(
+            FlowNodeStep,
+            name=node.name,
+            initial_state=FlowNodeStepState(node=node, flow_directory=flow.directory),
+        )
+        for node in flow.nodes
+    }
+    output_step = process_builder.add_step(
+        FlowOutputStep,
+        name=OUTPUT_STEP_NAME,
+        initial_state=FlowOutputStepState(outputs=flow.outputs),
+    )
+
+    consumers: dict[str, list] = {}
+    for node in flow.nodes:
+        dependencies = node.dependencies
+        # Nodes with only literal inputs start with the flow too
+        for source in dependencies or {"inputs"}:
+            consumers.setdefault(source, []).append(steps[node.name])
+    output_sources = {
+        reference[0]
+        for reference in map(parse_reference, flow.outputs.values())
+        if reference is not None
+    }
+    for source in output_sources:
+        consumers.setdefault(source, []).append(output_step)
+
+    # Flow inputs -> every node that reads them
+    for target in consumers.get("inputs", []):
+        process_builder.on_input_event("Start").send_event_to(
+            target=target, function_name="receive", parameter_name="data"
+        )
+
+    # Node output -> every node that reads it
+    for source, step in steps.items():
+        for target in consumers.get(source, []):
+            step.on_event("node_completed").send_event_to(
+                target=target, function_name="receive", parameter_name="data"
+            )
+
+    return process_builder
+
+
+def clear_pending(process: KernelProcess, run_id: str):
+    """Drop the values a run left in the step states, so a reused process doesn't grow"""
+    for step in process.steps:
+        pending = getattr(step.state.state, "pending", None)
+        if pending is not None:
+            pending.pop(run_id, None)
+
+
+async def run_flow(
+    process: KernelProcess, kernel: Kernel, inputs: dict[str, Any]
+) -> dict[str, Any]:
+    """Run a compiled flow once and return its outputs"""
+    run_id = uuid.uuid4().hex
+    try:
+        async with await start(
+            process=process,
+            kernel=kernel,
+            initial_event=KernelProcessEvent(
+                id="Start", data={"run_id": run_id, "source": "inputs", "value": inputs}
+            ),
+        ) as process_context:
+            final_state = await process_context.get_state()
+    finally:
+        # A failed node leaves the values of its run waiting in the steps downstream
+        clear_pending(process, run_id)
+
+    output_step = next(
+        step for step in final_state.steps if step.state.name == OUTPUT_STEP_NAME
+    )
+    outputs = output_step.state.state.results.pop(run_id, None)  # type: ignore
+    if outputs is None:
+        # A failing node stops the run, its error is logged by the step
+        print(f"[red]Flow {process.state.name} produced no outputs[/red]")
+        return {}
+    return outputs
+
+
+async def main():
+    """Compile the Wikipedia flow and answer its default question"""
+    from . import wiki_chat_process  # noqa: F401  Loads .env and sets up telemetry
+
+    flow = load_flow(WIKIPEDIA_FLOW_PATH, tools=WIKIPEDIA_TOOLS)
+    for index, stage in enumerate(flow.stages()):
+        print(f"Stage {index}: [blue]{', '.join(stage)}[/blue]")
+
+    process = compile_flow(flow).build()
+    outputs = await run_flow(process, create_kernel(), dict(flow.inputs))
+    print(f"Flow outputs: {outputs}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,7 +6,7 @@ EXTRACT_QUERY_SYSTEM_PROMPT = """You are an AI assistant reading the transcript
 
 The conversation history is provided just in case of a coreference (e.g. "What is this?" where "this" is defined in previous conversation).
 
-Return the output as query used for next round user message.
+Return the output as query used for next round user message, together with the entities the query is about (people, works, places or concepts that have a Wikipedia article). Comparison questions have one entity per compared item, at most 3.
 
 EXAMPLE
 Conversation history:
@@ -15,6 +15,7 @@ AI: Sure, I can help you with that. Here are some of the best restaurants nearby
 Human: How do I get to Rock Bar?
 
 Output: directions to Rock Bar
+Entities: Rock Bar
 END OF EXAMPLE
 
 EXAMPLE
@@ -26,6 +27,15 @@ AI: To get to Rock Bar, you need to go to the 52nd floor of the Park A. You can
 Human: Show me more restaurants.
 
 Output: best restaurants nearby
+Entities: restaurants
+END OF EXAMPLE
+
+EXAMPLE
+Conversation history:
+Human: How did da Vinci's and Michelangelo's techniques differ?
+
+Output: painting techniques of Leonardo da Vinci and Michelangelo
+Entities: Leonardo da Vinci, Michelangelo
 END OF EXAMPLE
 
 Today is {date}.
@@ -3,6 +3,8 @@
 from .extract_query_step import ExtractQueryStep
 from .get_wiki_url_step import GetWikiUrlStep
 from .search_url_step import SearchUrlStep
+from .fetch_url_step import FetchUrlStep
+from .collect_search_results_step import CollectSearchResultsStep
 from .process_search_result_step import ProcessSearchResultStep
 from .augmented_chat_step import AugmentedChatStep
 
@@ -10,6 +12,8 @@ __all__ = [
     "ExtractQueryStep",
     "GetWikiUrlStep",
     "SearchUrlStep",
+    "FetchUrlStep",
+    "CollectSearchResultsStep",
     "ProcessSearchResultStep",
     "AugmentedChatStep",
 ]
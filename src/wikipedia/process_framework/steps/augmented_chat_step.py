@@ -2,6 +2,7 @@
 Augmented Chat Step - Generates final answer using context and chat history
 """
 
+import asyncio
 from datetime import datetime
 
 from pydantic import BaseModel, Field
@@ -18,6 +19,11 @@ from semantic_kernel.processes.kernel_process import (
 )
 
 from ..prompts.augmented_chat_prompt import AUGMENTED_CHAT_SYSTEM_PROMPT
+from ..utils.deadline_utils import MIN_STEP_SECONDS, record_degradation, remaining
+from ..utils.llm_utils import get_chat_message_content
+from ..utils.profiling_utils import profiled_step
+
+TIMEOUT_ANSWER = "I'm sorry, I couldn't come up with an answer in time."
 
 
 class AugmentedChatStepState(BaseModel):
@@ -42,6 +48,7 @@ class AugmentedChatStep(KernelProcessStep[AugmentedChatStepState]):
             )
 
     @kernel_function
+    @profiled_step
     async def generate_answer(
         self,
         data: dict[str, str],
@@ -53,6 +60,10 @@ class AugmentedChatStep(KernelProcessStep[AugmentedChatStepState]):
         context_str = data.get("context")
         self.state.context = context_str or ""
 
+        time_left = remaining(data.get("deadline"))
+        if not context_str and time_left is not None:
+            record_degradation("answer_without_context")
+
         # TODO: Find a better way to simulate a function call in the chat history
         # This https://learn.microsoft.com/en-us/semantic-kernel/concepts/ai-services/chat-completion/chat-history?pivots=programming-language-python fails because the model somehow ignores the function content
         if context_str:
@@ -66,14 +77,25 @@ class AugmentedChatStep(KernelProcessStep[AugmentedChatStepState]):
         else:
             self.state.chat_history.add_user_message(question)
 
-        chat_service, settings = kernel.select_ai_service(type=ChatCompletionClientBase)
-        assert isinstance(chat_service, ChatCompletionClientBase)
-
-        response = await chat_service.get_chat_message_content(
-            chat_history=self.state.chat_history, settings=settings
-        )
+        # The deployment is picked per step in `get_chat_message_content`
+        _, settings = kernel.select_ai_service(type=ChatCompletionClientBase)
+
+        try:
+            # Always give the answer a minimal chance, even when the budget is spent
+            response = await asyncio.wait_for(
+                get_chat_message_content(
+                    kernel,
+                    self.state.chat_history,
+                    settings,
+                    step="augmented_chat",
+                ),
+                timeout=None if time_left is None else max(time_left, MIN_STEP_SECONDS),
+            )
+            final_answer = str(response).strip()
+        except asyncio.TimeoutError:
+            record_degradation("answer_timeout")
+            final_answer = TIMEOUT_ANSWER
 
-        final_answer = str(response).strip()
         self.state.chat_history.add_assistant_message(final_answer)
         self.state.answer = final_answer
 
@@ -0,0 +1,100 @@
+"""
+Collect Search Results Step - Fans in the per-URL fetches of a turn
+"""
+
+from pydantic import BaseModel, Field
+from rich import print
+from semantic_kernel.functions import kernel_function
+from semantic_kernel.processes.kernel_process import (
+    KernelProcessStep,
+    KernelProcessStepContext,
+    KernelProcessStepState,
+)
+
+from ..utils.deadline_utils import record_degradation
+from ..utils.fan_in_utils import find_gate, release_gate
+from ..utils.profiling_utils import profiled_step
+from ..utils.web_utils import get_page_sentence
+
+
+class CollectSearchResultsStepState(BaseModel):
+    # turn_id -> fetches, dropped when the turn's gate is released
+    pending: dict[str, list[dict]] = Field(default_factory=dict)
+    fetch_count: int = 0  # Fetches seen across all turns
+    cut_counts: dict[str, int] = Field(default_factory=dict)  # policy -> cut fetches
+
+
+class CollectSearchResultsStep(KernelProcessStep[CollectSearchResultsStepState]):
+    """Process step to gather fetched content once the fan-in policy is met"""
+
+    state: CollectSearchResultsStepState = Field(  # type: ignore
+        default_factory=CollectSearchResultsStepState
+    )
+
+    async def activate(self, state: KernelProcessStepState):
+        self.state = state.state  # type: ignore
+
+    @kernel_function
+    @profiled_step
+    async def collect_result(
+        self, data: dict, context: KernelProcessStepContext
+    ) -> None:
+        """Collect one fetch and emit the search results after the last one"""
+
+        turn_id = data["turn_id"]
+        if turn_id not in self.state.pending:
+            gate = find_gate(turn_id)
+            if gate is None:
+                # A late fetch of a turn that already ended
+                return
+            pending = self.state.pending
+            gate.on_release(lambda: pending.pop(turn_id, None))
+        fetches = self.state.pending.setdefault(turn_id, [])
+        fetches.append(data)
+        if len(fetches) < data["expected"]:
+            return
+
+        del self.state.pending[turn_id]
+        release_gate(turn_id)
+
+        cut_count = 0
+        for fetch in fetches:
+            self.state.fetch_count += 1
+            if fetch["cut_by"]:
+                cut_count += 1
+                self.state.cut_counts[fetch["cut_by"]] = (
+                    self.state.cut_counts.get(fetch["cut_by"], 0) + 1
+                )
+
+        if any(fetch["cut_by"] == "turn_deadline" for fetch in fetches):
+            record_degradation("retrieval_cut_short")
+
+        search_results = []
+        documents = {}
+        for fetch in sorted(fetches, key=lambda f: f["index"]):
+            if fetch["result"] is None:
+                continue
+            url, page = fetch["result"]
+            if page is None:
+                search_results.append((url, "No available content"))
+            else:
+                search_results.append((url, get_page_sentence(page, fetch["count"])))
+                documents[url] = page
+
+        print(
+            f"Retrieved content from {len(search_results)} URLs "
+            f"({cut_count} cut, totals: {self.state.cut_counts} of {self.state.fetch_count} fetches)"
+        )
+
+        await context.emit_event(
+            process_event="search_results_ready",
+            data={
+                "question": data["question"],
+                "search_results": search_results,
+                "deadline": data.get("deadline"),
+            },
+        )
+        if documents:
+            await context.emit_event(
+                process_event="documents_fetched", data={"documents": documents}
+            )
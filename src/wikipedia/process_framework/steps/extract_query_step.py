@@ -2,10 +2,12 @@
 Extract Query Step - Refines the user's question based on chat history
 """
 
+import asyncio
+import time
 from datetime import datetime
 from typing import ClassVar
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from rich import print
 from semantic_kernel import Kernel
 from semantic_kernel.connectors.ai.chat_completion_client_base import (
@@ -21,10 +23,31 @@ from semantic_kernel.processes.kernel_process.kernel_process_step_state import (
 )
 
 from ..prompts.extract_query_prompt import EXTRACT_QUERY_SYSTEM_PROMPT
+from ..utils.deadline_utils import has_time_for_step, record_degradation, step_budget
+from ..utils.llm_utils import get_chat_message_content
+from ..utils.metrics_utils import query_rewrite_counter, query_rewrite_saved_counter
+from ..utils.profiling_utils import profiled_step
+from ..utils.query_utils import (
+    QUERY_FAST_PATH,
+    can_skip_rewrite,
+    normalize_query,
+    rewrite_latency,
+)
+
+
+class ExtractedQuery(BaseModel):
+    """Structured output of the query rewrite"""
+
+    query: str = Field(description="The query for the next round user message.")
+    entities: list[str] = Field(
+        description="Wikipedia entities the query is about, one per compared item."
+    )
 
 
 class ExtractQueryStepState(BaseModel):
     chat_history: ChatHistory = Field(default_factory=ChatHistory)
+    rewrite_count: int = 0  # Rewrites by the LLM
+    bypass_count: int = 0  # Rewrites skipped by the fast path
 
 
 class ExtractQueryStep(KernelProcessStep):
@@ -41,9 +64,12 @@ class ExtractQueryStep(KernelProcessStep):
         self.state = state.state  # type: ignore
         if self.state.chat_history is None:
             self.state.chat_history = ChatHistory(system_message=self.system_prompt)
-        self.state.chat_history.system_message = self.system_prompt
+        # Setting the system message adds another one, so only set it once per session
+        if not self.state.chat_history.system_message:
+            self.state.chat_history.system_message = self.system_prompt
 
     @kernel_function
+    @profiled_step
     async def extract_query(
         self,
         kernel: Kernel,
@@ -51,19 +77,89 @@ class ExtractQueryStep(KernelProcessStep):
     ) -> dict:
         """Extract the real intent from user question and chat history"""
 
-        chat_service, settings = kernel.select_ai_service(type=ChatCompletionClientBase)
-        assert isinstance(chat_service, ChatCompletionClientBase)
+        # The deployment is picked per step in `get_chat_message_content`
+        _, settings = kernel.select_ai_service(type=ChatCompletionClientBase)
+        settings.response_format = ExtractedQuery  # type: ignore
 
         question = data.get("question")
+        deadline = data.get("deadline")
 
         self.state.chat_history.add_user_message(question)
 
-        response = await chat_service.get_chat_message_content(
-            chat_history=self.state.chat_history, settings=settings
+        if not has_time_for_step(deadline):
+            # Not enough time for a rewrite, search with the question as asked
+            record_degradation("query_rewrite_skipped")
+            return {
+                "extracted_query": question,
+                "entities": [question],
+                "question": question,
+                "deadline": deadline,
+            }
+
+        if QUERY_FAST_PATH and can_skip_rewrite(question, self.state.chat_history):
+            return self._bypass_rewrite(question, deadline)
+
+        start = time.monotonic()
+        try:
+            response = await asyncio.wait_for(
+                get_chat_message_content(
+                    kernel,
+                    self.state.chat_history,
+                    settings,
+                    step="extract_query",
+                ),
+                timeout=step_budget(deadline),
+            )
+            extracted = self._parse_response(str(response))
+            self.state.rewrite_count += 1
+            rewrite_latency.record(time.monotonic() - start)
+            query_rewrite_counter.add(1, {"path": "llm"})
+        except asyncio.TimeoutError:
+            record_degradation("query_rewrite_timeout")
+            extracted = ExtractedQuery(query=question, entities=[question])
+
+        print(
+            f"Extracted query: [blue]{extracted.query}[/blue], "
+            f"entities: [blue]{', '.join(extracted.entities)}[/blue]"
         )
 
-        extracted_query = str(response).strip()
-
-        print(f"Extracted query: [blue]{extracted_query}[/blue]")
+        return {
+            "extracted_query": extracted.query,
+            "entities": extracted.entities,
+            "question": question,
+            "deadline": deadline,
+        }
+
+    def _bypass_rewrite(self, question: str, deadline: float | None) -> dict:
+        """Search with the locally normalized question instead of an LLM rewrite"""
+        extracted_query = normalize_query(question)
+        self.state.bypass_count += 1
+        query_rewrite_counter.add(1, {"path": "fast_path"})
+
+        # Assume the rewrite would have taken as long as the ones timed so far
+        average = rewrite_latency.average
+        query_rewrite_saved_counter.add(average)
+        turns = self.state.bypass_count + self.state.rewrite_count
+        print(
+            f"Extracted query: [blue]{extracted_query}[/blue] "
+            f"(fast path, {self.state.bypass_count} of {turns} turns, "
+            f"~{average * self.state.bypass_count:.1f}s saved)"
+        )
 
-        return {"extracted_query": extracted_query, "question": question}
+        return {
+            "extracted_query": extracted_query,
+            "entities": [extracted_query],
+            "question": question,
+            "deadline": deadline,
+        }
+
+    @staticmethod
+    def _parse_response(content: str) -> ExtractedQuery:
+        """Parse the structured output, or take a plain text answer as the query"""
+        try:
+            extracted = ExtractedQuery.model_validate_json(content)
+        except ValidationError:
+            extracted = ExtractedQuery(query=content.strip(), entities=[])
+        if not extracted.entities:
+            extracted.entities = [extracted.query]
+        return extracted
@@ -0,0 +1,55 @@
+"""
+Fetch URL Step - Fetches content from a single Wikipedia URL
+"""
+
+import asyncio
+
+import requests
+from rich import print
+from semantic_kernel.functions import kernel_function
+from semantic_kernel.processes.kernel_process import (
+    KernelProcessStep,
+    KernelProcessStepContext,
+)
+
+from ..utils.deadline_utils import http_timeout
+from ..utils.fan_in_utils import get_gate
+from ..utils.metrics_utils import fetches_in_flight
+from ..utils.profiling_utils import profiled_step
+from ..utils.web_utils import FETCH_EXECUTOR, fetch_page_text
+
+
+class FetchUrlStep(KernelProcessStep):
+    """Process step to fetch content from one URL of the fan-out"""
+
+    @kernel_function
+    @profiled_step
+    async def fetch_url(self, data: dict, context: KernelProcessStepContext) -> None:
+        """Fetch the full text of one URL unless the fan-in already completed without it"""
+
+        url = data["url"]
+        gate = get_gate(data["turn_id"])
+
+        def submit_fetch():
+            future = FETCH_EXECUTOR.submit(
+                fetch_page_text, url, timeout=http_timeout(data.get("deadline"))
+            )
+            # Counts until the thread is done, also for fetches the fan-in cut
+            fetches_in_flight.add(1)
+            future.add_done_callback(lambda _: fetches_in_flight.add(-1))
+            return asyncio.wrap_future(future)
+
+        try:
+            result = await gate.run(submit_fetch)
+        except requests.RequestException as e:
+            print(f"Get url failed with error: {e} for URL: {url}")
+            result = (url, None)
+
+        await context.emit_event(
+            process_event="url_fetched",
+            data={
+                **data,
+                "result": result,
+                "cut_by": gate.closed_by if result is None else None,
+            },
+        )
@@ -0,0 +1,146 @@
+"""
+Flow Node Step - Runs one node of a compiled promptflow flow
+"""
+
+import asyncio
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel, Field
+from rich import print
+from semantic_kernel import Kernel
+from semantic_kernel.connectors.ai.chat_completion_client_base import (
+    ChatCompletionClientBase,
+)
+from semantic_kernel.functions import kernel_function
+from semantic_kernel.processes.kernel_process import (
+    KernelProcessStep,
+    KernelProcessStepContext,
+    KernelProcessStepState,
+)
+
+from ..utils.flow_utils import (
+    LLM_PARAMETERS,
+    FlowNode,
+    coerce_literal,
+    load_tool,
+    parse_reference,
+    render_chat_template,
+    resolve_reference,
+)
+from ..utils.llm_utils import get_chat_message_content
+
+
+class FlowNodeStepState(BaseModel):
+    node: FlowNode | None = None
+    flow_directory: str = ""
+    pending: dict[str, dict[str, Any]] = Field(default_factory=dict)  # run_id -> values
+
+
+class FlowNodeStep(KernelProcessStep[FlowNodeStepState]):
+    """Process step to run a flow node once the values of all its inputs arrived"""
+
+    state: FlowNodeStepState = Field(default_factory=FlowNodeStepState)  # type: ignore
+
+    async def activate(self, state: KernelProcessStepState):
+        self.state = state.state  # type: ignore
+
+    @kernel_function
+    async def receive(
+        self, data: dict, context: KernelProcessStepContext, kernel: Kernel
+    ) -> None:
+        """Collect one upstream value and run the node after the last one"""
+
+        node = self.state.node
+        assert node is not None
+        values = self.state.pending.setdefault(data["run_id"], {})
+        values[data["source"]] = data["value"]
+        if not node.dependencies <= values.keys():
+            return
+        del self.state.pending[data["run_id"]]
+
+        inputs = {}
+        for name, value in node.inputs.items():
+            reference = parse_reference(value)
+            inputs[name] = (
+                value if reference is None else resolve_reference(values, *reference)
+            )
+
+        print(f"Running flow node [blue]{node.name}[/blue] ({node.type})")
+        if node.type == "python":
+            output = await self._run_tool(node, inputs)
+        else:
+            output = await self._run_template(node, inputs, kernel)
+
+        await context.emit_event(
+            process_event="node_completed",
+            data={"run_id": data["run_id"], "source": node.name, "value": output},
+        )
+
+    async def _run_tool(self, node: FlowNode, inputs: dict) -> Any:
+        tool = load_tool(node.tool)
+        kwargs = {
+            name: coerce_literal(tool, name, value) for name, value in inputs.items()
+        }
+        if asyncio.iscoroutinefunction(tool):
+            return await tool(**kwargs)
+        # Tools are blocking functions, run them in a thread so nodes overlap
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(tool, **kwargs))
+
+    async def _run_template(self, node: FlowNode, inputs: dict, kernel: Kernel) -> str:
+        template = (Path(self.state.flow_directory) / node.source).read_text(
+            encoding="utf-8"
+        )
+        variables = {k: v for k, v in inputs.items() if k not in LLM_PARAMETERS}
+        chat_history = render_chat_template(template, variables)
+        if node.type == "prompt":
+            return str(chat_history.messages[-1].content)
+
+        # The deployment is picked per node name in `get_chat_message_content`
+        _, settings = kernel.select_ai_service(type=ChatCompletionClientBase)
+        for name in ("temperature", "top_p", "max_tokens"):
+            value = inputs.get(name)
+            if value not in (None, "") and hasattr(settings, name):
+                setattr(settings, name, (int if name == "max_tokens" else float)(value))
+
+        response = await get_chat_message_content(
+            kernel, chat_history, settings, step=node.name
+        )
+        return str(response).strip()
+
+
+class FlowOutputStepState(BaseModel):
+    outputs: dict[str, str] = Field(default_factory=dict)  # Output name -> reference
+    pending: dict[str, dict[str, Any]] = Field(default_factory=dict)  # run_id -> values
+    # run_id -> outputs, until `run_flow` picks them up
+    results: dict[str, dict[str, Any]] = Field(default_factory=dict)
+
+
+class FlowOutputStep(KernelProcessStep[FlowOutputStepState]):
+    """Process step to collect the flow outputs of a run"""
+
+    state: FlowOutputStepState = Field(default_factory=FlowOutputStepState)  # type: ignore
+
+    async def activate(self, state: KernelProcessStepState):
+        self.state = state.state  # type: ignore
+
+    @kernel_function
+    async def receive(self, data: dict) -> None:
+        """Collect one upstream value and keep the outputs after the last one"""
+
+        references = {
+            name: parse_reference(value) for name, value in self.state.outputs.items()
+        }
+        sources = {reference[0] for reference in references.values() if reference}
+        values = self.state.pending.setdefault(data["run_id"], {})
+        values[data["source"]] = data["value"]
+        if not sources <= values.keys():
+            return
+        del self.state.pending[data["run_id"]]
+
+        self.state.results[data["run_id"]] = {
+            name: resolve_reference(values, *reference) if reference else None
+            for name, reference in references.items()
+        }
@@ -1,28 +1,93 @@
 """
-Get Wiki URL Step - Gets Wikipedia URLs for a given entity
+Get Wiki URL Step - Gets Wikipedia URLs for the entities of a query
 """
 
+import asyncio
+from functools import partial
+
+import requests
 from rich import print
 from semantic_kernel.functions import kernel_function
 from semantic_kernel.processes.kernel_process import KernelProcessStep
 
-from ..utils.wiki_utils import get_wiki_urls
+from ..utils.deadline_utils import has_time_for_step, http_timeout, record_degradation
+from ..utils.profiling_utils import profiled_step
+from ..utils.resilience_utils import CircuitOpenError, breaker_for
+from ..utils.web_utils import FETCH_EXECUTOR
+from ..utils.wiki_utils import WIKIPEDIA_BASE_URL, get_wiki_urls
+
+# Entities of one query looked up at the same time, a comparison rarely has more
+MAX_ENTITIES = 3
+
+
+def interleave(url_lists: list[list[str]]) -> list[str]:
+    """Merge the URL lists of all entities round-robin, without duplicates"""
+    merged = []
+    for rank in range(max((len(urls) for urls in url_lists), default=0)):
+        for urls in url_lists:
+            if rank < len(urls) and urls[rank] not in merged:
+                merged.append(urls[rank])
+    return merged
 
 
 class GetWikiUrlStep(KernelProcessStep):
-    """Process step to get Wikipedia URLs for a given entity"""
+    """Process step to get Wikipedia URLs for the entities of a query"""
 
     @kernel_function
+    @profiled_step
     async def get_urls(self, data: dict, count: int = 2) -> dict:
         """Get Wikipedia URLs for the given entity"""
 
         extracted_query = data["extracted_query"]
+        deadline = data.get("deadline")
+
+        if not has_time_for_step(deadline):
+            # Answer without context rather than miss the deadline
+            record_degradation("retrieval_skipped")
+            return {"question": data["question"], "url_list": [], "deadline": deadline}
+
+        if breaker_for(WIKIPEDIA_BASE_URL).is_open:
+            # Wikipedia is failing, answer without context instead of waiting for it
+            print("[yellow]Wikipedia circuit is open, skipping URL lookup[/yellow]")
+            return {"question": data["question"], "url_list": [], "deadline": deadline}
+
+        entities = (data.get("entities") or [extracted_query])[:MAX_ENTITIES]
+        print(f"Getting Wiki URLs for entities: [blue]{', '.join(entities)}[/blue]")
+
+        # Each lookup is a blocking request, so the entities are resolved in parallel threads
+        loop = asyncio.get_running_loop()
+        lookups = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    FETCH_EXECUTOR,
+                    partial(
+                        get_wiki_urls, entity, count, timeout=http_timeout(deadline)
+                    ),
+                )
+                for entity in entities
+            ),
+            return_exceptions=True,
+        )
 
-        print(f"Getting Wiki URLs for entity: [blue]{extracted_query}[/blue]")
-        url_list = get_wiki_urls(extracted_query, count)
+        url_lists = []
+        for entity, lookup in zip(entities, lookups):
+            if isinstance(lookup, requests.Timeout):
+                record_degradation("url_lookup_timeout")
+            elif isinstance(lookup, CircuitOpenError):
+                print(f"[yellow]{lookup}, skipping URL lookup[/yellow]")
+            elif isinstance(lookup, requests.RequestException):
+                print(f"Get url failed with error: {lookup} for entity: {entity}")
+            elif isinstance(lookup, BaseException):
+                raise lookup
+            else:
+                url_lists.append(lookup)
+        url_list = interleave(url_lists)
         print(f"Found {len(url_list)} URLs")
 
         return {
             "question": data["question"],
+            "extracted_query": extracted_query,
+            "entities": entities,
             "url_list": url_list,
+            "deadline": deadline,
         }
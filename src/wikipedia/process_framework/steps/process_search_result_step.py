@@ -6,27 +6,41 @@ from rich import print
 from semantic_kernel.functions import kernel_function
 from semantic_kernel.processes.kernel_process import KernelProcessStep
 
+from ..utils.context_utils import CONTEXT_MAX_TOKENS, fit_to_budget
+from ..utils.dedup_utils import CONTEXT_DEDUP, dedup_search_results
+from ..utils.metrics_utils import context_length_histogram, dedup_tokens_saved_counter
+from ..utils.profiling_utils import profiled_step
+from ..utils.web_utils import format_search_results
+
 
 class ProcessSearchResultStep(KernelProcessStep):
     """Process step to format search results"""
 
     @kernel_function
+    @profiled_step
     async def process_results(self, data: dict) -> dict:
         """Format search results into context string"""
 
-        def format_doc(doc_tuple):
-            url, content = doc_tuple
-            return f"Content: {content}\nSource: {url}"
-
-        context_list = []
-        for url, content in data["search_results"]:
-            context_list.append({"Content": content, "Source": url})
-
-        # ToDo: Aren't we doing this in the previous lines already?
-        context_str = "\n\n".join(
-            [format_doc((c["Source"], c["Content"])) for c in context_list]
-        )
-
-        print(f"Formatted {len(context_list)} search results")
-
-        return {"question": data["question"], "context": context_str}
+        search_results = data["search_results"]
+        if CONTEXT_DEDUP:
+            search_results, tokens_saved = dedup_search_results(search_results)
+            dedup_tokens_saved_counter.add(tokens_saved)
+            if tokens_saved:
+                print(f"Removed near-duplicate sentences, ~{tokens_saved} tokens saved")
+        search_results, tokens_dropped = fit_to_budget(search_results)
+        if tokens_dropped:
+            print(
+                f"Trimmed context to ~{CONTEXT_MAX_TOKENS} tokens, "
+                f"~{tokens_dropped} tokens dropped"
+            )
+
+        context_str = format_search_results(search_results)
+
+        context_length_histogram.record(len(context_str))
+        print(f"Formatted {len(search_results)} search results")
+
+        return {
+            "question": data["question"],
+            "context": context_str,
+            "deadline": data.get("deadline"),
+        }
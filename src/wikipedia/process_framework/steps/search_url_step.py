@@ -1,27 +1,145 @@
 """
-Search URL Step - Fetches content from Wikipedia URLs
+Search URL Step - Fans out one fetch per Wikipedia URL
 """
 
+import uuid
+
+from pydantic import BaseModel, Field
 from rich import print
 from semantic_kernel.functions import kernel_function
-from semantic_kernel.processes.kernel_process import KernelProcessStep
+from semantic_kernel.processes.kernel_process import (
+    KernelProcessStep,
+    KernelProcessStepContext,
+    KernelProcessStepState,
+)
+
+from ..utils.deadline_utils import (
+    ANSWER_RESERVE_SECONDS,
+    has_time_for_step,
+    record_degradation,
+)
+from ..utils.fan_in_utils import FanInPolicy, open_gate
+from ..utils.memory_utils import SESSION_MEMORY, DocumentMemory
+from ..utils.metrics_utils import memory_lookup_counter, urls_per_turn_histogram
+from ..utils.profiling_utils import profiled_step
+from ..utils.resilience_utils import breaker_for
+
+
+class SearchUrlStepState(BaseModel):
+    fan_in_policy: FanInPolicy = Field(default_factory=FanInPolicy.from_env)
+    memory: DocumentMemory = Field(
+        default_factory=DocumentMemory
+    )  # Pages of earlier turns
 
-from ..utils.web_utils import search_results_from_urls
 
+class SearchUrlStep(KernelProcessStep[SearchUrlStepState]):
+    """Process step to fan out the URL fetches of a turn"""
 
-class SearchUrlStep(KernelProcessStep):
-    """Process step to fetch content from URLs"""
+    state: SearchUrlStepState = Field(default_factory=SearchUrlStepState)  # type: ignore
+
+    async def activate(self, state: KernelProcessStepState):
+        self.state = state.state  # type: ignore
 
     @kernel_function
-    async def search_urls(self, data: dict, count: int = 10) -> dict:
-        """Fetch content from the provided URLs"""
+    @profiled_step
+    async def search_urls(
+        self, data: dict, context: KernelProcessStepContext, count: int = 10
+    ) -> None:
+        """Emit one fetch request per URL"""
 
         url_list = data["url_list"]
+        deadline = data.get("deadline")
+
+        if SESSION_MEMORY and self.state.memory.documents:
+            query = data.get("extracted_query") or data["question"]
+            memory_results = self._lookup_memory(
+                url_list, data.get("entities") or [query], count
+            )
+            memory_lookup_counter.add(
+                1, {"result": "hit" if memory_results else "miss"}
+            )
+            if memory_results:
+                print(
+                    f"Answering from session memory with {len(memory_results)} pages, "
+                    f"skipping {len(url_list)} fetches"
+                )
+                await context.emit_event(
+                    process_event="search_results_ready",
+                    data={
+                        "question": data["question"],
+                        "search_results": memory_results,
+                        "deadline": deadline,
+                    },
+                )
+                return
+
         print(f"Searching {len(url_list)} URLs for content")
-        search_results = search_results_from_urls(url_list, count)
-        print(f"Retrieved content from {len(search_results)} URLs")
 
-        return {
-            "question": data["question"],
-            "search_results": search_results,
-        }
+        if url_list and not has_time_for_step(deadline):
+            record_degradation("fetch_skipped")
+            url_list = []
+
+        open_urls = [url for url in url_list if breaker_for(url).is_open]
+        if open_urls:
+            print(f"[yellow]Circuit open, skipping {len(open_urls)} URLs[/yellow]")
+            url_list = [url for url in url_list if url not in open_urls]
+
+        urls_per_turn_histogram.record(len(url_list))
+
+        if not url_list:
+            await context.emit_event(
+                process_event="search_results_ready",
+                data={
+                    "question": data["question"],
+                    "search_results": [],
+                    "deadline": deadline,
+                },
+            )
+            return
+
+        turn_id = uuid.uuid4().hex
+        open_gate(
+            turn_id,
+            len(url_list),
+            self.state.fan_in_policy,
+            turn_deadline=deadline - ANSWER_RESERVE_SECONDS if deadline else None,
+        )
+
+        for index, url in enumerate(url_list):
+            await context.emit_event(
+                process_event="url_fetch_requested",
+                data={
+                    "question": data["question"],
+                    "turn_id": turn_id,
+                    "url": url,
+                    "index": index,
+                    "expected": len(url_list),
+                    "count": count,
+                    "deadline": deadline,
+                },
+            )
+
+    def _lookup_memory(
+        self, url_list: list[str], entities: list[str], count: int
+    ) -> list[tuple[str, str]]:
+        """Memory results for every entity, or none if an entity is missing"""
+        memory_results = []
+        for entity in entities:
+            entity_results = self.state.memory.lookup(url_list, entity, count)
+            if not entity_results:
+                return []
+            memory_results += [
+                result
+                for result in entity_results
+                if result[0] not in dict(memory_results)
+            ]
+        return memory_results
+
+    @kernel_function
+    @profiled_step
+    async def remember_documents(self, data: dict) -> None:
+        """Keep the full text of fetched pages for follow-up questions"""
+        if not SESSION_MEMORY:
+            return
+        for url, page in data["documents"].items():
+            self.state.memory.add(url, page)
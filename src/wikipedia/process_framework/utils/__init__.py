@@ -2,11 +2,13 @@
 
 from .wiki_utils import get_wiki_urls
 from .web_utils import search_results_from_urls
+from .fan_in_utils import FanInPolicy
 from .observability_utils import set_up_logging, set_up_tracing, set_up_metrics
 
 __all__ = [
     "get_wiki_urls",
     "search_results_from_urls",
+    "FanInPolicy",
     "set_up_logging",
     "set_up_tracing",
     "set_up_metrics",
@@ -0,0 +1,177 @@
+"""
+Cassette utilities - record and replay HTTP exchanges and chat completions
+
+Set `CASSETTE_MODE=record` to capture every Wikipedia request and every chat
+completion of a run into `CASSETTE_PATH`, and `CASSETTE_MODE=replay` to serve
+them back offline. `CASSETTE_LATENCY=zero` replays without the recorded latency,
+which leaves only the CPU and orchestration overhead of the steps. Replayed
+requests skip the rate limiter, the circuit breakers and hedging.
+
+A recording is kept in memory and written as one gzip stream when the process exits.
+"""
+
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from rich import print
+from semantic_kernel.connectors.ai.completion_usage import CompletionUsage
+from semantic_kernel.contents import AuthorRole, ChatHistory, ChatMessageContent
+
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassettes/wiki_chat.jsonl.gz")
+CASSETTE_LATENCY = os.getenv("CASSETTE_LATENCY", "recorded").lower()
+
+# Prompts contain today's date, which would make yesterday's recording miss
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+class CassetteMissError(requests.RequestException):
+    """Raised in replay mode for a request that was never recorded"""
+
+
+class Cassette:
+    """Gzipped JSON lines of recorded exchanges, keyed by a hash of the request"""
+
+    def __init__(self, path: str, mode: str, latency: str = "recorded"):
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.entries: dict[str, list[dict]] = defaultdict(list)
+        self.recorded: list[dict] = []
+        self.cursors: dict[str, int] = defaultdict(int)
+        self.lock = threading.Lock()
+
+        if mode == "replay":
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.entries[entry["key"]].append(entry)
+            print(
+                f"Replaying {sum(map(len, self.entries.values()))} exchanges from {path}"
+            )
+        elif mode == "record":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            print(f"Recording exchanges to {path}")
+
+    @staticmethod
+    def make_key(kind: str, request: object) -> str:
+        payload = json.dumps([kind, request], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def record(self, kind: str, key: str, latency: float, **payload):
+        entry = {"kind": kind, "key": key, "latency": round(latency, 4), **payload}
+        with self.lock:
+            self.recorded.append(entry)
+
+    def close(self):
+        """Write the recording, a single gzip stream compresses far better than one per entry"""
+        with self.lock:
+            if self.mode != "record":
+                return
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            with gzip.open(temporary, "wt", encoding="utf-8") as f:
+                for entry in self.recorded:
+                    f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            os.replace(temporary, self.path)
+        print(f"Recorded {len(self.recorded)} exchanges to {self.path}")
+
+    def play(self, key: str) -> dict:
+        """Next recorded exchange for the key, repeating the last one when exhausted"""
+        with self.lock:
+            entries = self.entries.get(key)
+            if not entries:
+                raise CassetteMissError(f"No recorded exchange for key {key}")
+            entry = entries[min(self.cursors[key], len(entries) - 1)]
+            self.cursors[key] += 1
+        return entry
+
+    def replay_latency(self, entry: dict) -> float:
+        return entry["latency"] if self.latency == "recorded" else 0.0
+
+
+_cassette: Cassette | None = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Cassette | None:
+    """The cassette of this run, None when recording and replaying are off"""
+    global _cassette
+    if CASSETTE_MODE not in ("record", "replay"):
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE, CASSETTE_LATENCY)
+            atexit.register(_cassette.close)
+        return _cassette
+
+
+def http_key(url: str) -> str:
+    return Cassette.make_key("http", ["GET", url])
+
+
+def record_http(
+    cassette: Cassette, url: str, response: requests.Response, latency: float
+):
+    cassette.record(
+        "http",
+        http_key(url),
+        latency,
+        url=url,
+        status=response.status_code,
+        headers={
+            k: v
+            for k, v in response.headers.items()
+            if k.lower() in ("content-type", "retry-after")
+        },
+        encoding=response.encoding,
+        body=response.content.decode(response.encoding or "utf-8", errors="replace"),
+    )
+
+
+def replay_http(entry: dict) -> requests.Response:
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    response.encoding = entry["encoding"]
+    response._content = entry["body"].encode(entry["encoding"] or "utf-8")
+    response.url = entry["url"]
+    return response
+
+
+def chat_key(model_id: str | None, chat_history: ChatHistory, response_format) -> str:
+    messages = [
+        [str(message.role), DATE_PATTERN.sub("<date>", message.content or "")]
+        for message in chat_history.messages
+    ]
+    response_format_name = getattr(response_format, "__name__", response_format)
+    return Cassette.make_key("chat", [model_id, messages, response_format_name])
+
+
+def record_chat(
+    cassette: Cassette, key: str, response: ChatMessageContent, latency: float
+):
+    usage = response.metadata.get("usage")
+    cassette.record(
+        "chat",
+        key,
+        latency,
+        content=response.content,
+        usage=usage.model_dump() if isinstance(usage, CompletionUsage) else None,
+    )
+
+
+def replay_chat(entry: dict) -> ChatMessageContent:
+    metadata = {}
+    if entry.get("usage"):
+        metadata["usage"] = CompletionUsage(**entry["usage"])
+    return ChatMessageContent(
+        role=AuthorRole.ASSISTANT, content=entry["content"], metadata=metadata
+    )
@@ -0,0 +1,45 @@
+"""
+Context utilities - fit the retrieved pages of all entities into one token budget
+"""
+
+import os
+
+from .dedup_utils import estimate_tokens, split_sentences
+
+# Estimated tokens of page content passed to the answer, 0 for no limit
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "2000"))
+
+
+def fit_to_budget(
+    search_results: list[tuple[str, str]], max_tokens: int = CONTEXT_MAX_TOKENS
+) -> tuple[list[tuple[str, str]], int]:
+    """Keep sentences of the `(url, content)` results until the budget is spent
+
+    Sentences are taken round-robin across the results, so every source, and with
+    it every entity of a comparison, keeps its leading sentences. Returns the
+    trimmed results in their original order and the estimated tokens dropped.
+    """
+    if max_tokens <= 0:
+        return search_results, 0
+
+    sentences = [split_sentences(content) for _, content in search_results]
+    kept: list[list[str]] = [[] for _ in search_results]
+    remaining = max_tokens
+    dropped = 0
+    for rank in range(max((len(s) for s in sentences), default=0)):
+        for index, source_sentences in enumerate(sentences):
+            if rank >= len(source_sentences):
+                continue
+            tokens = estimate_tokens(source_sentences[rank])
+            if tokens <= remaining:
+                kept[index].append(source_sentences[rank])
+                remaining -= tokens
+            else:
+                dropped += tokens
+
+    fitted = [
+        (url, " ".join(kept[index]))
+        for index, (url, _) in enumerate(search_results)
+        if kept[index]
+    ]
+    return fitted, dropped
@@ -0,0 +1,65 @@
+"""
+Deadline utilities - per-turn latency budget shared by all steps
+"""
+
+import os
+import time
+
+from opentelemetry import metrics
+from rich import print
+
+# Upper bound for any single HTTP request, with or without a turn budget
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+# Time kept back for the final answer when earlier steps decide how long they may take
+ANSWER_RESERVE_SECONDS = float(os.getenv("ANSWER_RESERVE_SECONDS", "5"))
+# Steps skip their work instead of starting it with less time than this left
+MIN_STEP_SECONDS = 0.5
+
+meter = metrics.get_meter(__name__)
+degradation_counter = meter.create_counter(
+    "wiki_chat.degradations",
+    description="Number of times a step degraded because the turn budget ran short",
+)
+degradation_counts: dict[str, int] = {}
+
+
+def make_deadline(budget_seconds: float | None) -> float | None:
+    """Turn a latency budget into a monotonic deadline"""
+    if budget_seconds is None:
+        return None
+    return time.monotonic() + budget_seconds
+
+
+def remaining(deadline: float | None) -> float | None:
+    """Seconds left until the deadline, None when the turn has no deadline"""
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def step_budget(deadline: float | None) -> float | None:
+    """Seconds a step before the final answer may spend"""
+    if deadline is None:
+        return None
+    return deadline - time.monotonic() - ANSWER_RESERVE_SECONDS
+
+
+def has_time_for_step(deadline: float | None) -> bool:
+    budget = step_budget(deadline)
+    return budget is None or budget >= MIN_STEP_SECONDS
+
+
+def http_timeout(deadline: float | None) -> float:
+    """Timeout for one HTTP request of a step before the final answer"""
+    budget = step_budget(deadline)
+    if budget is None:
+        return HTTP_TIMEOUT_SECONDS
+    return max(min(budget, HTTP_TIMEOUT_SECONDS), MIN_STEP_SECONDS)
+
+
+def record_degradation(path: str):
+    degradation_counts[path] = degradation_counts.get(path, 0) + 1
+    degradation_counter.add(1, {"path": path})
+    print(
+        f"[yellow]Turn budget: {path} (fired {degradation_counts[path]} times)[/yellow]"
+    )
@@ -0,0 +1,104 @@
+"""
+Dedup utilities - remove near-duplicate sentences across retrieved pages
+
+Sentences are compared by MinHash signatures of their word shingles. A sentence
+whose estimated Jaccard similarity to an earlier kept sentence of another page
+reaches `DEDUP_THRESHOLD` is dropped, so the first source keeps the attribution.
+Sentences of the same page are never compared.
+"""
+
+import os
+import re
+import zlib
+
+import numpy as np
+
+CONTEXT_DEDUP = os.getenv("CONTEXT_DEDUP", "true").lower() == "true"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.7"))
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+
+# Universal hashing (a * x + b) mod p, with 32-bit x, a and b so nothing overflows uint64
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(0)
+_A = _rng.integers(1, 1 << 32, NUM_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, NUM_PERMUTATIONS, dtype=np.uint64)
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def split_sentences(text: str) -> list[str]:
+    return [s for s in SENTENCE_PATTERN.split(text) if s.strip()]
+
+
+def shingle_hashes(sentence: str, size: int = SHINGLE_SIZE) -> list[int]:
+    words = WORD_PATTERN.findall(sentence.lower())
+    if not words:
+        return [0]
+    size = min(size, len(words))
+    return [
+        zlib.crc32(" ".join(words[i : i + size]).encode())
+        for i in range(len(words) - size + 1)
+    ]
+
+
+def minhash_signatures(sentences: list[str]) -> np.ndarray:
+    """One row of `NUM_PERMUTATIONS` minimum hashes per sentence"""
+    hashes = [shingle_hashes(s) for s in sentences]
+    offsets = np.cumsum([0] + [len(h) for h in hashes[:-1]])
+    flat = np.fromiter((h for hs in hashes for h in hs), dtype=np.uint64)
+    permuted = (flat[:, None] * _A[None, :] + _B[None, :]) % _PRIME
+    return np.minimum.reduceat(permuted, offsets, axis=0)
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English text
+    return len(text) // 4
+
+
+def dedup_search_results(
+    search_results: list[tuple[str, str]], threshold: float = DEDUP_THRESHOLD
+) -> tuple[list[tuple[str, str]], int]:
+    """Drop near-duplicate sentences across the pages of `(url, content)` results
+
+    A page's own repeated sentences are kept, only other pages are compared.
+    Returns the results without the duplicates, leaving out results with nothing
+    left, and the estimated number of tokens saved.
+    """
+    sentences = []
+    owners = []
+    pages = []
+    page_ids: dict[str, int] = {}
+    for index, (url, content) in enumerate(search_results):
+        for sentence in split_sentences(content):
+            sentences.append(sentence)
+            owners.append(index)
+            pages.append(page_ids.setdefault(url, len(page_ids)))
+    if len(page_ids) < 2:
+        return search_results, 0
+
+    signatures = minhash_signatures(sentences)
+    similarity = (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2)
+    pages = np.array(pages)
+
+    kept = np.zeros(len(sentences), dtype=bool)
+    for i in range(len(sentences)):
+        # Only kept sentences of other pages count as earlier copies
+        earlier = kept[:i] & (pages[:i] != pages[i])
+        kept[i] = not (similarity[i, :i][earlier] >= threshold).any()
+
+    kept_sentences: list[list[str]] = [[] for _ in search_results]
+    for sentence, owner, keep in zip(sentences, owners, kept):
+        if keep:
+            kept_sentences[owner].append(sentence)
+
+    tokens_saved = sum(
+        estimate_tokens(sentence) for sentence, keep in zip(sentences, kept) if not keep
+    )
+    deduped = [
+        (url, " ".join(kept_sentences[index]))
+        for index, (url, _) in enumerate(search_results)
+        if kept_sentences[index]
+    ]
+    return deduped, tokens_saved
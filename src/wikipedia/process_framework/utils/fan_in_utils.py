@@ -0,0 +1,150 @@
+"""
+Fan-in utilities - decide when the per-URL fetches of a turn are complete
+"""
+
+import asyncio
+import os
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class FanInPolicy(BaseModel):
+    """Completes the fan-in when all fetches are done, when `first_k` fetches are
+    done or when `deadline_seconds` have passed, whichever comes first."""
+
+    first_k: int | None = None
+    deadline_seconds: float | None = None
+
+    @classmethod
+    def from_env(cls) -> "FanInPolicy":
+        first_k = os.getenv("FAN_IN_FIRST_K")
+        deadline_seconds = os.getenv("FAN_IN_DEADLINE_SECONDS")
+        return cls(
+            first_k=int(first_k) if first_k else None,
+            deadline_seconds=float(deadline_seconds) if deadline_seconds else None,
+        )
+
+
+class FanInGate:
+    """Tracks the in-flight fetches of one turn and closes once the policy is met"""
+
+    def __init__(
+        self, expected: int, policy: FanInPolicy, turn_deadline: float | None = None
+    ):
+        self.expected = expected
+        self.policy = policy
+        self.completed = 0
+        self.closed_by: str | None = None
+        self._closed = asyncio.Event()
+        self._timer = None
+        self._release_callbacks: list[Callable[[], None]] = []
+
+        # Close on whichever is earlier: the policy deadline or the turn's own deadline
+        delays = {}
+        if policy.deadline_seconds is not None:
+            delays["deadline"] = policy.deadline_seconds
+        if turn_deadline is not None:
+            delays["turn_deadline"] = max(turn_deadline - time.monotonic(), 0)
+        if delays:
+            reason = min(delays, key=delays.__getitem__)
+            self._timer = asyncio.get_running_loop().call_later(
+                delays[reason], self.close, reason
+            )
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed.is_set()
+
+    def close(self, reason: str):
+        if not self._closed.is_set():
+            self.closed_by = reason
+            self._closed.set()
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def on_release(self, callback: Callable[[], None]):
+        """Call `callback` once the gate is released, to drop the turn's leftovers"""
+        self._release_callbacks.append(callback)
+
+    async def run(self, fetch: Callable[[], Awaitable[T]]) -> T | None:
+        """Run a fetch unless the gate closes first. Returns None if the fetch was cut."""
+        if self.is_closed:
+            return None
+
+        fetch_task = asyncio.ensure_future(fetch())
+        closed_task = asyncio.ensure_future(self._closed.wait())
+        await asyncio.wait(
+            {fetch_task, closed_task}, return_when=asyncio.FIRST_COMPLETED
+        )
+        closed_task.cancel()
+
+        if not fetch_task.done():
+            # The worker thread keeps running, but nobody waits for it anymore
+            fetch_task.cancel()
+            return None
+
+        self.completed += 1
+        if self.completed >= self.expected:
+            self.close("all")
+        elif self.policy.first_k is not None and self.completed >= self.policy.first_k:
+            self.close("first_k")
+
+        return fetch_task.result()
+
+
+_gates: dict[str, FanInGate] = {}
+# Turn ids of the gates opened by the current chat turn
+_turn_gates: ContextVar[list[str] | None] = ContextVar("turn_gates", default=None)
+
+
+@contextmanager
+def release_gates_on_exit():
+    """Release the gates the enclosed turn left open, when it failed or timed out
+    before `CollectSearchResultsStep` released them"""
+    turn_ids: list[str] = []
+    token = _turn_gates.set(turn_ids)
+    try:
+        yield
+    finally:
+        _turn_gates.reset(token)
+        for turn_id in turn_ids:
+            release_gate(turn_id)
+
+
+def open_gate(
+    turn_id: str,
+    expected: int,
+    policy: FanInPolicy,
+    turn_deadline: float | None = None,
+) -> FanInGate:
+    gate = FanInGate(expected, policy, turn_deadline)
+    _gates[turn_id] = gate
+    turn_ids = _turn_gates.get()
+    if turn_ids is not None:
+        turn_ids.append(turn_id)
+    return gate
+
+
+def get_gate(turn_id: str) -> FanInGate:
+    return _gates[turn_id]
+
+
+def find_gate(turn_id: str) -> FanInGate | None:
+    """The turn's gate, None once it was released"""
+    return _gates.get(turn_id)
+
+
+def release_gate(turn_id: str) -> FanInGate | None:
+    gate = _gates.pop(turn_id, None)
+    if gate is not None:
+        gate.close(gate.closed_by or "all")
+        for callback in gate._release_callbacks:
+            callback()
+    return gate
@@ -0,0 +1,199 @@
+"""
+Flow utilities - read promptflow flow.dag.yaml files for the flow compiler
+"""
+
+import importlib
+import importlib.util
+import inspect
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable
+
+import jinja2
+import yaml
+from pydantic import BaseModel, Field
+from semantic_kernel.contents import AuthorRole, ChatHistory, ChatMessageContent
+
+# `${inputs.question}`, `${get_wiki_url.output}` or `${node.output.field}`
+REFERENCE_PATTERN = re.compile(r"^\$\{(\w+)\.(\w+)((?:\.\w+)*)\}$")
+# Inputs of llm nodes that configure the completion rather than fill the template
+LLM_PARAMETERS = frozenset(
+    """deployment_name temperature top_p stop max_tokens logit_bias
+    presence_penalty frequency_penalty response_format""".split()
+)
+# `# system:`, `# user:` and `# assistant:` lines start the messages of a chat template
+ROLE_PATTERN = re.compile(r"^\s*#\s*(system|user|assistant)\s*:\s*$", re.MULTILINE)
+NODE_TYPES = ("python", "llm", "prompt")
+
+
+def parse_reference(value: Any) -> tuple[str, list[str]] | None:
+    """The source and field path of a `${...}` reference, or None for a literal"""
+    if not isinstance(value, str):
+        return None
+    match = REFERENCE_PATTERN.match(value.strip())
+    if match is None:
+        return None
+    source, field, path = match.groups()
+    fields = [f for f in path.split(".") if f]
+    if source == "inputs":
+        return source, [field, *fields]
+    # Node outputs are referenced as `${node.output}`
+    return source, fields
+
+
+def resolve_reference(values: dict[str, Any], source: str, path: list[str]) -> Any:
+    value = values[source]
+    for field in path:
+        value = value[field] if isinstance(value, dict) else getattr(value, field)
+    return value
+
+
+class FlowNode(BaseModel):
+    """One node of a flow, as the compiled step needs it"""
+
+    name: str
+    type: str
+    source: str  # Template path for llm and prompt nodes
+    tool: str = ""  # `module:function` or `file.py:function` for python nodes
+    inputs: dict[str, Any] = Field(default_factory=dict)
+
+    @property
+    def dependencies(self) -> set[str]:
+        """Nodes and `inputs` this node waits for"""
+        references = (parse_reference(value) for value in self.inputs.values())
+        return {reference[0] for reference in references if reference is not None}
+
+
+class Flow(BaseModel):
+    """A parsed flow.dag.yaml"""
+
+    name: str
+    directory: str
+    inputs: dict[str, Any] = Field(default_factory=dict)  # Input name -> default
+    outputs: dict[str, str] = Field(default_factory=dict)  # Output name -> reference
+    nodes: list[FlowNode] = Field(default_factory=list)
+
+    def stages(self) -> list[list[str]]:
+        """Nodes grouped by dependency depth, every group runs concurrently"""
+        depth: dict[str, int] = {}
+        remaining = {node.name: node.dependencies - {"inputs"} for node in self.nodes}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if deps <= depth.keys()]
+            if not ready:
+                raise ValueError(
+                    f"Flow {self.name} has a cycle or unknown references in "
+                    f"{', '.join(sorted(remaining))}"
+                )
+            for name in ready:
+                depth[name] = 1 + max((depth[d] for d in remaining[name]), default=-1)
+                del remaining[name]
+        stages: list[list[str]] = [
+            [] for _ in range(max(depth.values(), default=-1) + 1)
+        ]
+        for node in self.nodes:
+            stages[depth[node.name]].append(node.name)
+        return stages
+
+
+def tool_reference(tool: Callable) -> str:
+    return f"{tool.__module__}:{tool.__qualname__}"
+
+
+def load_flow(path: str | Path, tools: dict[str, Callable] | None = None) -> Flow:
+    """Parse a flow.dag.yaml
+
+    Python nodes run the callable given in `tools` under the node name, or else the
+    function named like the node's source file, e.g. `get_wiki_url` in get_wiki_url.py.
+    """
+    path = Path(path)
+    dag = yaml.safe_load(path.read_text(encoding="utf-8"))
+    tools = tools or {}
+
+    nodes = []
+    for node in dag.get("nodes", []):
+        if node["type"] not in NODE_TYPES:
+            raise ValueError(f"Node {node['name']} has unsupported type {node['type']}")
+        source = node["source"]["path"]
+        tool = ""
+        if node["type"] == "python":
+            tool = (
+                tool_reference(tools[node["name"]])
+                if node["name"] in tools
+                else f"{path.parent / source}:{Path(source).stem}"
+            )
+        nodes.append(
+            FlowNode(
+                name=node["name"],
+                type=node["type"],
+                source=source,
+                tool=tool,
+                inputs=node.get("inputs") or {},
+            )
+        )
+
+    flow = Flow(
+        name=dag.get("name") or dag.get("id") or path.parent.name,
+        directory=str(path.parent),
+        inputs={
+            name: spec.get("default") for name, spec in dag.get("inputs", {}).items()
+        },
+        outputs={
+            name: spec["reference"] for name, spec in dag.get("outputs", {}).items()
+        },
+        nodes=nodes,
+    )
+    flow.stages()  # Fail on cycles and unknown references before building anything
+    return flow
+
+
+@lru_cache
+def load_tool(reference: str) -> Callable:
+    """Import the function behind a `module:function` or `file.py:function` reference"""
+    location, _, name = reference.rpartition(":")
+    if location.endswith(".py"):
+        spec = importlib.util.spec_from_file_location(Path(location).stem, location)
+        assert spec is not None and spec.loader is not None
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(location)
+    tool = module
+    for attribute in name.split("."):
+        tool = getattr(tool, attribute)
+    return tool  # type: ignore
+
+
+def coerce_literal(tool: Callable, name: str, value: Any) -> Any:
+    """Convert a literal string input, like `count: '2'`, to the parameter's type"""
+    parameter = inspect.signature(tool).parameters.get(name)
+    if not isinstance(value, str) or parameter is None:
+        return value
+    kind = (
+        parameter.annotation
+        if parameter.annotation is not inspect.Parameter.empty
+        else type(parameter.default)
+    )
+    if kind in (int, float):
+        return kind(value)
+    if kind is bool:
+        return value.lower() == "true"
+    return value
+
+
+def render_chat_template(template: str, variables: dict[str, Any]) -> ChatHistory:
+    """Render a promptflow chat template into a chat history"""
+    text = jinja2.Template(
+        template, trim_blocks=True, keep_trailing_newline=True
+    ).render(**variables)
+    chat_history = ChatHistory()
+    parts = ROLE_PATTERN.split(text)
+    if parts[0].strip():
+        # Text before the first role line is a user message
+        chat_history.add_user_message(parts[0].strip())
+    for role, content in zip(parts[1::2], parts[2::2]):
+        if content.strip():
+            chat_history.add_message(
+                ChatMessageContent(role=AuthorRole(role), content=content.strip())
+            )
+    return chat_history
@@ -0,0 +1,287 @@
+"""
+HTTP utilities - rate limited GETs with retries and hedging for Wikipedia fetches
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from opentelemetry import metrics
+
+from .cassette_utils import get_cassette, http_key, record_http, replay_http
+from .deadline_utils import HTTP_TIMEOUT_SECONDS
+from .metrics_utils import http_peak_bytes_histogram
+from .resilience_utils import breaker_for
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/113.0.0.0 Safari/537.36 Edg/113.0.1774.35"
+}
+
+# Shared by every request to Wikipedia, including retries and hedges
+REQUESTS_PER_SECOND = float(os.getenv("WIKI_REQUESTS_PER_SECOND", "10"))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+BACKOFF_BASE_SECONDS = 0.2
+BACKOFF_CAP_SECONDS = 2.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Fire a duplicate request once a fetch is slower than this latency percentile
+HEDGING_ENABLED = os.getenv("HTTP_HEDGING", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = 20
+
+# Bodies are streamed and cut off after this many bytes, 0 for no limit
+MAX_PAGE_BYTES = int(os.getenv("HTTP_MAX_PAGE_BYTES", "1000000"))
+READ_CHUNK_BYTES = 64 * 1024
+
+meter = metrics.get_meter(__name__)
+retry_counter = meter.create_counter(
+    "wiki_chat.http.retries", description="Number of retried HTTP requests"
+)
+hedge_counter = meter.create_counter(
+    "wiki_chat.http.hedges", description="Number of hedged HTTP requests"
+)
+
+
+class RateLimiter:
+    """Token bucket shared by all threads"""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.capacity = burst or max(int(rate), 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        """Take a token, False without one when none frees up within `timeout`"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait_seconds = (1 - self.tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait_seconds > deadline:
+                return False
+            time.sleep(wait_seconds)
+
+    def has_token(self) -> bool:
+        with self.lock:
+            self._refill()
+            return self.tokens >= 1
+
+
+class LatencyTracker:
+    """Rolling window of request latencies"""
+
+    def __init__(self, size: int = 200):
+        self.samples: deque[float] = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p: float) -> float | None:
+        with self.lock:
+            if len(self.samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+rate_limiter = RateLimiter(REQUESTS_PER_SECOND)
+latency_tracker = LatencyTracker()
+_hedge_executor = ThreadPoolExecutor(max_workers=10, thread_name_prefix="wiki-hedge")
+
+
+def _backoff(attempt: int, response: requests.Response | None) -> float:
+    """Full jitter exponential backoff, or the server's Retry-After if it sent one"""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return random.uniform(
+        0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt)
+    )
+
+
+def read_capped(
+    response: requests.Response, max_bytes: int = MAX_PAGE_BYTES
+) -> requests.Response:
+    """Read a streamed body in chunks, at most `max_bytes` of it, as the response's content
+
+    A longer body is cut at the start of the last tag that arrived, so the
+    extractor works on a clean prefix, and the rest is never downloaded.
+    """
+    body = bytearray()
+    truncated = False
+    try:
+        for chunk in response.iter_content(READ_CHUNK_BYTES):
+            body += chunk
+            if max_bytes and len(body) > max_bytes:
+                truncated = True
+                break
+    finally:
+        # Drops the connection when the body was not read to the end
+        response.close()
+    http_peak_bytes_histogram.record(len(body), {"truncated": truncated})
+    if truncated:
+        del body[max_bytes:]
+        # Never inside a multi-byte character either, `<` is plain ASCII
+        tag_start = body.rfind(b"<")
+        if tag_start > 0:
+            del body[tag_start:]
+    response._content = bytes(body)
+    return response
+
+
+def _send(session: requests.Session, url: str, timeout: float) -> requests.Response:
+    """Send one GET with a size-capped body, recorded or replayed when a cassette is active"""
+    cassette = get_cassette()
+    if cassette is not None and cassette.mode == "replay":
+        entry = cassette.play(http_key(url))
+        time.sleep(cassette.replay_latency(entry))
+        return replay_http(entry)
+
+    start = time.monotonic()
+    response = read_capped(
+        session.get(url, headers=HEADERS, timeout=timeout, stream=True)
+    )
+    if cassette is not None:
+        record_http(cassette, url, response, time.monotonic() - start)
+    return response
+
+
+def _replaying() -> bool:
+    cassette = get_cassette()
+    return cassette is not None and cassette.mode == "replay"
+
+
+def get_with_retries(
+    url: str,
+    timeout: float = HTTP_TIMEOUT_SECONDS,
+    session: requests.Session | None = None,
+    sent: threading.Event | None = None,
+) -> requests.Response:
+    """GET a URL, retrying 5xx/429 responses and connection errors within `timeout`
+
+    Raises `CircuitOpenError` without sending anything while the host's circuit is
+    open, and `requests.Timeout` when the rate limiter has no token within `timeout`.
+    `sent` is set once the first attempt leaves the rate limiter.
+    """
+    session = session or requests.Session()
+    if _replaying():
+        # Replays measure the steps' own overhead, without limiter sleeps or backoff
+        return _send(session, url, timeout)
+    deadline = time.monotonic() + timeout
+    attempt = 0
+
+    breaker = breaker_for(url)
+
+    while True:
+        trial = breaker.before_request()
+        if not rate_limiter.acquire(max(deadline - time.monotonic(), 0)):
+            if trial:
+                breaker.release_trial()
+            raise requests.Timeout(
+                f"No rate limiter token within the timeout for {url}"
+            )
+        if sent is not None:
+            sent.set()
+        response = None
+        start = time.monotonic()
+        try:
+            response = _send(session, url, max(deadline - time.monotonic(), 0.1))
+        except requests.ConnectionError:
+            breaker.record_failure()
+            if attempt >= MAX_RETRIES:
+                raise
+        except requests.Timeout:
+            breaker.record_failure()
+            raise
+        except Exception:
+            # Body read and redirect errors too, or a half-open trial never ends
+            breaker.record_failure()
+            raise
+        else:
+            # Time on the wire only, hedges are timed from the send as well
+            latency_tracker.record(time.monotonic() - start)
+            if response.status_code not in RETRY_STATUS_CODES:
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+
+        delay = _backoff(attempt, response)
+        if attempt >= MAX_RETRIES or time.monotonic() + delay >= deadline:
+            if response is None:
+                raise requests.Timeout(f"No time left to retry {url}")
+            return response
+
+        attempt += 1
+        status = str(response.status_code) if response is not None else "error"
+        retry_counter.add(1, {"status": status})
+        time.sleep(delay)
+
+
+def hedged_get(url: str, timeout: float = HTTP_TIMEOUT_SECONDS) -> requests.Response:
+    """GET a URL and fire a duplicate request if the first one is slower than usual
+
+    The hedge timer starts when the first request is sent, not while it waits for
+    the rate limiter, and no duplicate is fired while the limiter is out of tokens.
+    """
+    if _replaying():
+        # A duplicate would take the next recorded exchange, in timing-dependent order
+        return get_with_retries(url, timeout)
+    deadline = time.monotonic() + timeout
+    hedge_after = (
+        latency_tracker.percentile(HEDGE_PERCENTILE) if HEDGING_ENABLED else None
+    )
+
+    if hedge_after is None or hedge_after >= timeout:
+        return get_with_retries(url, timeout)
+
+    sent = threading.Event()
+    primary = _hedge_executor.submit(get_with_retries, url, timeout, sent=sent)
+    # Also wakes the wait below when the primary fails before it is sent
+    primary.add_done_callback(lambda _: sent.set())
+    sent.wait(timeout)
+    done, _ = wait([primary], timeout=hedge_after)
+    remaining = deadline - time.monotonic()
+    if done or remaining <= 0.1 or not rate_limiter.has_token():
+        return primary.result()
+
+    hedge = _hedge_executor.submit(get_with_retries, url, remaining)
+    pending = {primary, hedge}
+    fallback: requests.Response | None = None
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                response = future.result()
+            except requests.RequestException as e:
+                error = e
+                continue
+            if response.status_code in RETRY_STATUS_CODES:
+                # Give the other request a chance to succeed
+                fallback = response
+                continue
+            hedge_counter.add(1, {"winner": "hedge" if future is hedge else "primary"})
+            return response
+
+    hedge_counter.add(1, {"winner": "none"})
+    if fallback is not None:
+        return fallback
+    assert error is not None
+    raise error
@@ -0,0 +1,178 @@
+"""
+LLM utilities - single entry point for the chat completions of the steps
+"""
+
+import asyncio
+import os
+import time
+
+from opentelemetry import metrics, trace
+from rich import print
+from semantic_kernel import Kernel
+from semantic_kernel.connectors.ai.chat_completion_client_base import (
+    ChatCompletionClientBase,
+)
+from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+from semantic_kernel.connectors.ai.prompt_execution_settings import (
+    PromptExecutionSettings,
+)
+from semantic_kernel.contents import ChatHistory, ChatMessageContent
+from semantic_kernel.exceptions import (
+    KernelServiceNotFoundError,
+    ServiceContentFilterException,
+    ServiceException,
+    ServiceInvalidRequestError,
+)
+
+from .cassette_utils import chat_key, get_cassette, record_chat, replay_chat
+from .metrics_utils import record_llm_usage
+from .resilience_utils import CircuitOpenError
+from .routing_utils import router
+from .usage_utils import record_turn_usage
+
+meter = metrics.get_meter(__name__)
+fallback_counter = meter.create_counter(
+    "wiki_chat.llm.fallbacks",
+    description="Chat completions that fell back to the next deployment of a step's chain",
+)
+
+
+def create_kernel() -> Kernel:
+    """A kernel with an Azure OpenAI service per deployment"""
+    kernel = Kernel()
+
+    # Add an Azure OpenAI service for `DEPLOYMENT_NAME` and every deployment in
+    # `MODEL_ROUTES`, the first one is the default
+    for deployment in router.deployments:
+        kernel.add_service(
+            AzureChatCompletion(
+                deployment_name=deployment,
+                api_key=os.getenv("API_KEY"),
+                endpoint=os.getenv("ENDPOINT"),
+                service_id=deployment,
+            )
+        )
+
+    return kernel
+
+
+def routed_services(
+    kernel: Kernel, step: str
+) -> list[tuple[str, ChatCompletionClientBase]]:
+    """The registered chat services for a step, in the order to try them"""
+    services = []
+    for deployment in router.candidates(step):
+        try:
+            services.append(
+                (
+                    deployment,
+                    kernel.get_service(deployment, type=ChatCompletionClientBase),
+                )
+            )
+        except KernelServiceNotFoundError:
+            continue
+    if not services:
+        chat_service, _ = kernel.select_ai_service(type=ChatCompletionClientBase)
+        assert isinstance(chat_service, ChatCompletionClientBase)
+        services.append((chat_service.service_id, chat_service))
+    return services
+
+
+async def complete(
+    chat_service: ChatCompletionClientBase,
+    chat_history: ChatHistory,
+    settings: PromptExecutionSettings,
+    step: str,
+    deployment: str,
+) -> tuple[ChatMessageContent, float]:
+    """Get one chat completion, recorded or replayed when a cassette is active"""
+    cassette = get_cassette()
+    key = ""
+    start = time.monotonic()
+    if cassette is not None:
+        key = chat_key(
+            chat_service.ai_model_id,
+            chat_history,
+            getattr(settings, "response_format", None),
+        )
+        if cassette.mode == "replay":
+            entry = cassette.play(key)
+            await asyncio.sleep(cassette.replay_latency(entry))
+            response = replay_chat(entry)
+            latency = time.monotonic() - start
+            record_llm_usage(step, deployment, latency, response.metadata.get("usage"))
+            return response, latency
+
+    response = await chat_service.get_chat_message_content(
+        chat_history=chat_history, settings=settings
+    )
+    assert response is not None
+
+    latency = time.monotonic() - start
+    record_llm_usage(step, deployment, latency, response.metadata.get("usage"))
+    if cassette is not None:
+        record_chat(cassette, key, response, latency)
+
+    return response, latency
+
+
+async def get_chat_message_content(
+    kernel: Kernel,
+    chat_history: ChatHistory,
+    settings: PromptExecutionSettings,
+    step: str = "unknown",
+) -> ChatMessageContent:
+    """Get a chat completion from the deployments routed to `step`
+
+    Falls back to the next deployment of the step's chain when one fails.
+    Deployments with an open circuit are skipped, unless every deployment of the
+    chain is open, then the last one is tried anyway. Latency and token usage
+    are recorded per `step` and added to the current turn.
+    """
+    services = routed_services(kernel, step)
+    error: Exception | None = None
+    only_open_circuits = True
+    for i, (deployment, chat_service) in enumerate(services):
+        breaker = router.breaker(deployment)
+        trial = False
+        try:
+            trial = breaker.before_request()
+        except CircuitOpenError as e:
+            if not (only_open_circuits and i == len(services) - 1):
+                print(f"[yellow]{step}: deployment {deployment} skipped: {e}[/yellow]")
+                fallback_counter.add(1, {"step": step, "deployment": deployment})
+                error = e
+                continue
+            # Every circuit is open, a last try beats failing the step outright
+        try:
+            response, latency = await complete(
+                chat_service, chat_history, settings, step, deployment
+            )
+        except (ServiceContentFilterException, ServiceInvalidRequestError):
+            # The deployment works, the request would fail anywhere
+            breaker.record_success()
+            raise
+        except asyncio.CancelledError:
+            # The step ran out of its own time budget, not the deployment's fault
+            if trial:
+                breaker.release_trial()
+            raise
+        except ServiceException as e:
+            router.record_failure(deployment)
+            fallback_counter.add(1, {"step": step, "deployment": deployment})
+            print(f"[yellow]{step}: deployment {deployment} failed: {e}[/yellow]")
+            error = e
+            only_open_circuits = False
+            continue
+        except Exception:
+            # Unwrapped transport errors, cassette misses: still a verdict on the trial
+            router.record_failure(deployment)
+            raise
+
+        router.record_success(deployment, latency)
+        trace.get_current_span().set_attribute("wiki_chat.llm.deployment", deployment)
+        record_turn_usage(step, response.metadata.get("usage"))
+        return response
+
+    assert error is not None
+    raise error
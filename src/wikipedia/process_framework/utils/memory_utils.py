@@ -0,0 +1,122 @@
+"""
+Memory utilities - per-session memory of the pages fetched in earlier turns
+
+Pages are kept as full extracted text in an inverted index. A query matches a
+page when the page covers enough of the query's terms, weighted by how rare
+they are across the remembered pages.
+"""
+
+import math
+import os
+import re
+from collections import Counter, OrderedDict
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+from .dedup_utils import split_sentences
+
+SESSION_MEMORY = os.getenv("SESSION_MEMORY", "true").lower() == "true"
+# Share of the query terms (weighted by rarity) a page has to contain
+MEMORY_MATCH_THRESHOLD = float(os.getenv("MEMORY_MATCH_THRESHOLD", "0.6"))
+MEMORY_MAX_DOCUMENTS = int(os.getenv("MEMORY_MAX_DOCUMENTS", "20"))
+MEMORY_MAX_RESULTS = 2
+
+WORD_PATTERN = re.compile(r"\w+")
+STOP_WORDS = frozenset(
+    """a about an and are as at be by did do does for from had has have he her his
+    how i in is it its me my of on or she that the their them they this to was
+    what when where which who whom why will with you your tell know more please""".split()
+)
+
+
+def terms(text: str) -> list[str]:
+    return [
+        word
+        for word in WORD_PATTERN.findall(text.lower())
+        if word not in STOP_WORDS and len(word) > 1
+    ]
+
+
+class DocumentMemory(BaseModel):
+    """Full page texts by URL, oldest dropped first"""
+
+    documents: OrderedDict[str, str] = Field(default_factory=OrderedDict)
+    _postings: dict[str, set[str]] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context):
+        for url, text in self.documents.items():
+            self._index(url, text)
+
+    def _index(self, url: str, text: str):
+        for term in set(terms(text)):
+            self._postings.setdefault(term, set()).add(url)
+
+    def _unindex(self, url: str, text: str):
+        for term in set(terms(text)):
+            urls = self._postings.get(term)
+            if urls is not None:
+                urls.discard(url)
+                if not urls:
+                    del self._postings[term]
+
+    def add(self, url: str, text: str):
+        if url in self.documents:
+            self._unindex(url, self.documents.pop(url))
+        self.documents[url] = text
+        self._index(url, text)
+        while len(self.documents) > MEMORY_MAX_DOCUMENTS:
+            oldest_url, oldest_text = self.documents.popitem(last=False)
+            self._unindex(oldest_url, oldest_text)
+
+    def _idf(self, term: str) -> float:
+        # Terms no remembered page contains weigh the most
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self.documents) + 1) / (df + 0.5))
+
+    def search(self, query: str) -> list[tuple[str, float]]:
+        """Pages with their share of the query's term weight, best first"""
+        query_terms = set(terms(query))
+        if not query_terms or not self.documents:
+            return []
+
+        weights = {term: self._idf(term) for term in query_terms}
+        total = sum(weights.values())
+        scores: Counter[str] = Counter()
+        for term, weight in weights.items():
+            for url in self._postings.get(term, ()):
+                scores[url] += weight / total
+        return scores.most_common()
+
+    def best_sentences(self, url: str, query: str, count: int = 10) -> str:
+        """The `count` sentences of a page that share the most with the query"""
+        sentences = split_sentences(self.documents[url])
+        query_terms = set(terms(query))
+        ranked = sorted(
+            range(len(sentences)),
+            key=lambda i: -sum(
+                self._idf(term) for term in query_terms & set(terms(sentences[i]))
+            ),
+        )
+        return " ".join(sentences[i] for i in sorted(ranked[:count]))
+
+    def lookup(
+        self,
+        url_list: list[str],
+        query: str,
+        count: int = 10,
+        threshold: float = MEMORY_MATCH_THRESHOLD,
+    ) -> list[tuple[str, str]]:
+        """Search results from memory, or an empty list if memory can't answer
+
+        Memory answers when it holds every URL of the turn, or when a remembered
+        page matches the query well enough.
+        """
+        if url_list and all(url in self.documents for url in url_list):
+            urls = url_list
+        else:
+            urls = [
+                url
+                for url, score in self.search(query)[:MEMORY_MAX_RESULTS]
+                if score >= threshold
+            ]
+        return [(url, self.best_sentences(url, query, count)) for url in urls]
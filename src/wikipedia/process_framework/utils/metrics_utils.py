@@ -0,0 +1,129 @@
+"""
+Metrics utilities - custom performance metrics of the wiki chat process
+
+All instruments are named `wiki_chat.*` so that they pass the views of
+`set_up_metrics`. Resilience, deadline and fan-in counters live next to the
+code they count.
+"""
+
+from opentelemetry import metrics
+
+meter = metrics.get_meter(__name__)
+
+http_bytes_histogram = meter.create_histogram(
+    "wiki_chat.http.response_bytes",
+    unit="By",
+    description="Size of the Wikipedia responses per operation",
+    explicit_bucket_boundaries_advisory=[
+        1_000,
+        10_000,
+        50_000,
+        100_000,
+        250_000,
+        500_000,
+        1_000_000,
+        5_000_000,
+    ],
+)
+http_peak_bytes_histogram = meter.create_histogram(
+    "wiki_chat.http.peak_bytes",
+    unit="By",
+    description="Most body bytes buffered at once by a Wikipedia request, before any cut to HTTP_MAX_PAGE_BYTES",
+    explicit_bucket_boundaries_advisory=[
+        10_000,
+        50_000,
+        100_000,
+        250_000,
+        500_000,
+        1_000_000,
+        2_000_000,
+        5_000_000,
+    ],
+)
+http_duration_histogram = meter.create_histogram(
+    "wiki_chat.http.duration",
+    unit="s",
+    description="Wikipedia request latency per operation, including retries and hedges",
+    explicit_bucket_boundaries_advisory=[0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30],
+)
+llm_tokens_counter = meter.create_counter(
+    "wiki_chat.llm.tokens",
+    unit="{token}",
+    description="Prompt and completion tokens per step",
+)
+llm_duration_histogram = meter.create_histogram(
+    "wiki_chat.llm.duration",
+    unit="s",
+    description="Chat completion latency per step",
+    explicit_bucket_boundaries_advisory=[0.25, 0.5, 1, 2, 5, 10, 20, 60],
+)
+urls_per_turn_histogram = meter.create_histogram(
+    "wiki_chat.turn.urls",
+    unit="{url}",
+    description="URLs fetched per chat turn",
+    explicit_bucket_boundaries_advisory=[0, 1, 2, 3, 5, 10, 20],
+)
+context_length_histogram = meter.create_histogram(
+    "wiki_chat.context.length",
+    unit="{character}",
+    description="Length of the context passed to the answer",
+    explicit_bucket_boundaries_advisory=[
+        0,
+        500,
+        1_000,
+        2_000,
+        5_000,
+        10_000,
+        20_000,
+        50_000,
+    ],
+)
+dedup_tokens_saved_counter = meter.create_counter(
+    "wiki_chat.dedup.tokens_saved",
+    unit="{token}",
+    description="Estimated context tokens saved by removing near-duplicate sentences",
+)
+memory_lookup_counter = meter.create_counter(
+    "wiki_chat.memory.lookups",
+    description="Session memory lookups by result (hit or miss)",
+)
+query_rewrite_counter = meter.create_counter(
+    "wiki_chat.query_rewrite",
+    description="Query rewrites by path (llm or fast_path)",
+)
+query_rewrite_saved_counter = meter.create_counter(
+    "wiki_chat.query_rewrite.seconds_saved",
+    unit="s",
+    description="Estimated latency saved by bypassing the query rewrite",
+)
+chats_in_flight = meter.create_up_down_counter(
+    "wiki_chat.chats.in_flight",
+    unit="{chat}",
+    description="Chat turns currently running",
+)
+fetches_in_flight = meter.create_up_down_counter(
+    "wiki_chat.fetches.in_flight",
+    unit="{fetch}",
+    description="URL fetches queued or running in the fetch executor",
+)
+
+
+def record_http(operation: str, seconds: float, size: int | None = None):
+    attributes = {"operation": operation}
+    http_duration_histogram.record(seconds, attributes)
+    if size is not None:
+        http_bytes_histogram.record(size, attributes)
+
+
+def record_llm_usage(step: str, deployment: str, seconds: float, usage) -> None:
+    """Record latency and the `CompletionUsage` of a chat completion, if any"""
+    attributes = {"step": step, "deployment": deployment}
+    llm_duration_histogram.record(seconds, attributes)
+    if usage is None:
+        return
+    if usage.prompt_tokens:
+        llm_tokens_counter.add(usage.prompt_tokens, {**attributes, "type": "prompt"})
+    if usage.completion_tokens:
+        llm_tokens_counter.add(
+            usage.completion_tokens, {**attributes, "type": "completion"}
+        )
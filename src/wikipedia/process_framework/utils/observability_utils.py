@@ -20,6 +20,8 @@ from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from opentelemetry.semconv.attributes.service_attributes import SERVICE_NAME
 from opentelemetry.trace import set_tracer_provider
 
+from .tail_sampling_utils import TailSamplingSpanProcessor
+
 from pathlib import Path
 
 DOTENV_PATH = Path(__file__).parents[4] / ".env"
@@ -30,6 +32,9 @@ if not load_dotenv(dotenv_path=DOTENV_PATH, verbose=True):
 
 connection_string = os.getenv("APPLICATION_INSIGHTS_CONNECTION_STRING")
 
+# How often metrics are exported
+METRICS_EXPORT_INTERVAL_MS = int(os.getenv("METRICS_EXPORT_INTERVAL_MS", "5000"))
+
 # Create a resource to represent the service/sample
 resource = Resource.create({SERVICE_NAME: "semantic_kernel_wiki_chat_process"})
 
@@ -65,7 +70,10 @@ def set_up_tracing():
     tracer_provider = TracerProvider(resource=resource)
     # Span processors are initialized with an exporter which is responsible
     # for sending the telemetry data to a particular backend.
-    tracer_provider.add_span_processor(BatchSpanProcessor(exporter))
+    # Tail sampling decides per trace, once its root span has ended, what reaches the exporter.
+    tracer_provider.add_span_processor(
+        TailSamplingSpanProcessor(BatchSpanProcessor(exporter))
+    )
     # Sets the global default tracer provider
     set_tracer_provider(tracer_provider)
 
@@ -76,13 +84,16 @@ def set_up_metrics():
     # Initialize a metric provider for the application. This is a factory for creating meters.
     meter_provider = MeterProvider(
         metric_readers=[
-            PeriodicExportingMetricReader(exporter, export_interval_millis=5000)
+            PeriodicExportingMetricReader(
+                exporter, export_interval_millis=METRICS_EXPORT_INTERVAL_MS
+            )
         ],
         resource=resource,
         views=[
-            # Dropping all instrument names except for those starting with "semantic_kernel"
+            # Dropping all instrument names except for those starting with "semantic_kernel" or "wiki_chat"
             View(instrument_name="*", aggregation=DropAggregation()),
             View(instrument_name="semantic_kernel*"),
+            View(instrument_name="wiki_chat*"),
         ],
     )
     # Sets the global default meter provider
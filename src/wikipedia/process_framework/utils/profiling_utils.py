@@ -0,0 +1,213 @@
+"""
+Profiling utilities - opt-in CPU and wall-clock profiles of selected chat turns
+
+Profile a random `PROFILE_SAMPLE_RATE` fraction of turns and/or every
+`PROFILE_EVERY_N`th turn. A profiled turn writes to `PROFILE_DIR`, prefixed
+with the process id so that runs do not overwrite each other:
+
+- `<pid>-turn-<n>.folded`: sampled stacks of all threads in collapsed-stack format,
+  ready for `flamegraph.pl` or speedscope
+- `<pid>-turn-<n>.prof`: cProfile of the event loop thread, for `pstats` or snakeviz
+- `<pid>-turn-<n>.json`: wall-clock time per step
+
+With both settings at 0 (the default) turns are not profiled and the only cost is
+a context variable lookup per step call.
+
+`time_steps()` records only the wall-clock time per step, without the sampler and
+cProfile overhead, e.g. to compare step latencies in benchmarks.
+"""
+
+import cProfile
+import functools
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from rich import print
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_EVERY_N = int(os.getenv("PROFILE_EVERY_N", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+
+_turn_counter = itertools.count(1)
+_current_profile: ContextVar["TurnProfile | StepTimer | None"] = ContextVar(
+    "turn_profile", default=None
+)
+
+
+class StackSampler(threading.Thread):
+    """Samples the stacks of all other threads at a fixed interval"""
+
+    def __init__(self, interval_seconds: float):
+        super().__init__(name="turn-profiler", daemon=True)
+        self.interval_seconds = interval_seconds
+        self.stacks: Counter[str] = Counter()
+        self.stopped = threading.Event()
+
+    @staticmethod
+    def _collapse(frame, thread_name: str) -> str:
+        names = []
+        while frame is not None:
+            module = frame.f_globals.get("__name__", "?")
+            names.append(f"{module}:{frame.f_code.co_name}")
+            frame = frame.f_back
+        names.append(thread_name)
+        return ";".join(reversed(names))
+
+    def run(self):
+        while not self.stopped.wait(self.interval_seconds):
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                thread_name = thread_names.get(ident, f"thread-{ident}")
+                self.stacks[self._collapse(frame, thread_name)] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class TurnProfile:
+    """CPU samples, an event loop cProfile and step wall-clock times of one turn"""
+
+    def __init__(self, turn_number: int, directory: str, interval_seconds: float):
+        self.turn_number = turn_number
+        self.directory = Path(directory)
+        self.sampler = StackSampler(interval_seconds)
+        self.profiler: cProfile.Profile | None = cProfile.Profile()
+        self.step_times: dict[str, list[float]] = {}
+        self.started = 0.0
+        self.wall_seconds = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.sampler.start()
+        try:
+            self.profiler.enable()  # type: ignore
+        except ValueError:
+            # Only one cProfile can run at a time, e.g. with concurrent turns
+            self.profiler = None
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.sampler.stop()
+        self.wall_seconds = time.perf_counter() - self.started
+
+    def add_step_time(self, step: str, seconds: float):
+        self.step_times.setdefault(step, []).append(seconds)
+
+    def write(self) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stem = self.directory / f"{os.getpid()}-turn-{self.turn_number:05d}"
+
+        with open(stem.with_suffix(".folded"), "w", encoding="utf-8") as f:
+            for stack, count in self.sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        if self.profiler is not None:
+            self.profiler.dump_stats(stem.with_suffix(".prof"))
+
+        breakdown = {
+            "turn": self.turn_number,
+            "wall_seconds": round(self.wall_seconds, 4),
+            "samples": sum(self.sampler.stacks.values()),
+            "steps": {
+                step: {
+                    "calls": len(times),
+                    "total_seconds": round(sum(times), 4),
+                    "max_seconds": round(max(times), 4),
+                }
+                for step, times in self.step_times.items()
+            },
+        }
+        with open(stem.with_suffix(".json"), "w", encoding="utf-8") as f:
+            json.dump(breakdown, f, indent=2)
+        return stem
+
+
+class StepTimer:
+    """Start and end times of the step calls of one or more turns"""
+
+    def __init__(self):
+        self.spans: dict[str, list[tuple[float, float]]] = {}
+
+    def add_step_time(self, step: str, seconds: float):
+        end = time.perf_counter()
+        self.spans.setdefault(step, []).append((end - seconds, end))
+
+    def step_seconds(self) -> dict[str, float]:
+        """Wall-clock time per step, from the first call's start to the last call's end
+
+        Concurrent calls, like the fetches of a fan-out, count once.
+        """
+        return {
+            step: max(end for _, end in spans) - min(start for start, _ in spans)
+            for step, spans in self.spans.items()
+        }
+
+
+@contextmanager
+def time_steps():
+    """Record the wall-clock time of the steps called inside the block"""
+    timer = StepTimer()
+    token = _current_profile.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_profile.reset(token)
+
+
+def should_profile(turn_number: int) -> bool:
+    if PROFILE_EVERY_N > 0 and turn_number % PROFILE_EVERY_N == 0:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def profile_turn():
+    """Profile the enclosed turn if it is selected, otherwise do nothing"""
+    turn_number = next(_turn_counter)
+    if not should_profile(turn_number):
+        yield None
+        return
+
+    profile = TurnProfile(turn_number, PROFILE_DIR, PROFILE_INTERVAL_SECONDS)
+    token = _current_profile.set(profile)
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
+        _current_profile.reset(token)
+        stem = profile.write()
+        print(
+            f"[blue]Profiled turn {turn_number} ({profile.wall_seconds:.2f}s) "
+            f"to {stem}.*[/blue]"
+        )
+
+
+def profiled_step(func):
+    """Record the wall-clock time of a step function in the current turn profile"""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return await func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            profile.add_step_time(func.__qualname__, time.perf_counter() - start)
+
+    return wrapper
@@ -0,0 +1,75 @@
+"""
+Query utilities - decide locally when a question needs no LLM rewrite
+"""
+
+import os
+import re
+
+from semantic_kernel.contents import AuthorRole, ChatHistory
+
+QUERY_FAST_PATH = os.getenv("QUERY_FAST_PATH", "false").lower() == "true"
+# Assumed latency of an LLM rewrite until rewrites have been timed
+QUERY_REWRITE_DEFAULT_SECONDS = float(os.getenv("QUERY_REWRITE_DEFAULT_SECONDS", "1.5"))
+
+# Words that point back into the conversation, a question with one of them needs the history
+REFERENCE_WORDS = frozenset(
+    """he him his himself she her hers herself it its itself they them their theirs
+    themselves this that these those there then former latter above previous same
+    such other another again also""".split()
+)
+WORD_PATTERN = re.compile(r"[a-z']+")
+# Question and request phrasing that doesn't help a Wikipedia search
+LEADING_PHRASES = re.compile(
+    r"^(?:(?:please|can you|could you|would you)\s+)*"
+    r"(?:tell me (?:about|more about)|explain|describe|"
+    r"(?:what|who|where|when|which) (?:is|was|are|were)(?: the| a| an)?|"
+    r"what do you know about)\s+",
+    re.IGNORECASE,
+)
+
+
+def is_first_turn(chat_history: ChatHistory) -> bool:
+    """True if the history holds no user message but the current one"""
+    user_messages = [m for m in chat_history.messages if m.role == AuthorRole.USER]
+    return len(user_messages) <= 1
+
+
+def has_references(question: str) -> bool:
+    words = WORD_PATTERN.findall(question.lower())
+    return any(word in REFERENCE_WORDS for word in words)
+
+
+def can_skip_rewrite(question: str, chat_history: ChatHistory) -> bool:
+    """A first question that doesn't refer to anything needs no rewrite"""
+    return is_first_turn(chat_history) and not has_references(question)
+
+
+def normalize_query(question: str) -> str:
+    """Strip question phrasing and punctuation, `What is sfumato?` becomes `sfumato`"""
+    query = " ".join(question.split())
+    query = LEADING_PHRASES.sub("", query)
+    query = query.rstrip("?!. ")
+    return query or question.strip()
+
+
+class RewriteLatency:
+    """Running average of the LLM rewrite latency, shared by all sessions
+
+    The default counts as the first sample, so the fast path of a session's
+    first turn can estimate its saving before any rewrite was timed.
+    """
+
+    def __init__(self, default_seconds: float):
+        self.total = default_seconds
+        self.count = 1
+
+    def record(self, seconds: float):
+        self.total += seconds
+        self.count += 1
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count
+
+
+rewrite_latency = RewriteLatency(QUERY_REWRITE_DEFAULT_SECONDS)
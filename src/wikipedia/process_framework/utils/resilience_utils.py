@@ -0,0 +1,138 @@
+"""
+Resilience utilities - negative result cache and per-host circuit breakers
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+import requests
+from opentelemetry import metrics
+from rich import print
+
+NEGATIVE_CACHE_TTL_SECONDS = float(os.getenv("NEGATIVE_CACHE_TTL_SECONDS", "60"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+meter = metrics.get_meter(__name__)
+negative_cache_counter = meter.create_counter(
+    "wiki_chat.negative_cache.lookups",
+    description="Negative cache lookups by result (hit or miss)",
+)
+circuit_transition_counter = meter.create_counter(
+    "wiki_chat.circuit_breaker.transitions",
+    description="Circuit breaker state changes per host",
+)
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of sending a request to a host whose circuit is open"""
+
+
+class NegativeCache:
+    """Remembers lookups that found nothing for a short time"""
+
+    def __init__(self, ttl_seconds: float, max_size: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.entries: OrderedDict[str, float] = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(entity: str) -> str:
+        return " ".join(entity.lower().split())
+
+    def add(self, entity: str):
+        with self.lock:
+            self.entries[self._key(entity)] = time.monotonic() + self.ttl_seconds
+            self.entries.move_to_end(self._key(entity))
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def __contains__(self, entity: str) -> bool:
+        with self.lock:
+            expires = self.entries.get(self._key(entity))
+            if expires is not None and expires < time.monotonic():
+                del self.entries[self._key(entity)]
+                expires = None
+        negative_cache_counter.add(1, {"result": "miss" if expires is None else "hit"})
+        return expires is not None
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets a single trial request through
+    once `reset_seconds` have passed"""
+
+    def __init__(self, host: str, failure_threshold: int, reset_seconds: float):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        circuit_transition_counter.add(
+            1, {"host": self.host, "from": self.state, "to": state}
+        )
+        print(f"[yellow]Circuit for {self.host}: {self.state} -> {state}[/yellow]")
+        self.state = state
+
+    @property
+    def is_open(self) -> bool:
+        with self.lock:
+            return (
+                self.state == "open"
+                and time.monotonic() - self.opened_at < self.reset_seconds
+            )
+
+    def before_request(self) -> bool:
+        """Raise while the circuit is open, True when this request is the trial"""
+        with self.lock:
+            if self.state == "closed":
+                return False
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    raise CircuitOpenError(f"Circuit for {self.host} is open")
+                self._transition("half_open")
+                return True
+            # Half open: a trial request is already in flight
+            raise CircuitOpenError(f"Circuit for {self.host} is half open")
+
+    def release_trial(self):
+        """Give up a trial that ended without a verdict, the next request is the trial"""
+        with self.lock:
+            if self.state == "half_open":
+                self._transition("open")
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self._transition("closed")
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._transition("open")
+
+
+negative_cache = NegativeCache(NEGATIVE_CACHE_TTL_SECONDS)
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(url: str) -> CircuitBreaker:
+    host = urlparse(url).netloc
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(
+                host, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS
+            )
+        return _breakers[host]
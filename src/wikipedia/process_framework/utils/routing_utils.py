@@ -0,0 +1,97 @@
+"""
+Routing utilities - pick the Azure OpenAI deployment for each step's chat completion
+
+`MODEL_ROUTES` maps steps to fallback chains of deployments, for example
+`extract_query=gpt-4o-mini,gpt-4o;augmented_chat=gpt-4o`. Steps without a route
+use `DEPLOYMENT_NAME`. With `MODEL_ROUTING_POLICY=fastest` the healthy deployments
+of a chain are tried fastest first instead of in the configured order.
+"""
+
+import os
+import threading
+
+from .resilience_utils import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS,
+    CircuitBreaker,
+)
+
+MODEL_ROUTING_POLICY = os.getenv("MODEL_ROUTING_POLICY", "ordered").lower()
+# Weight of the newest sample in a deployment's moving average latency
+LATENCY_SMOOTHING = 0.3
+
+
+def parse_routes(spec: str) -> dict[str, list[str]]:
+    routes = {}
+    for route in spec.split(";"):
+        step, _, deployments = route.partition("=")
+        chain = [d.strip() for d in deployments.split(",") if d.strip()]
+        if step.strip() and chain:
+            routes[step.strip()] = chain
+    return routes
+
+
+class DeploymentRouter:
+    """Fallback chains per step, with a circuit breaker and latency average per deployment"""
+
+    def __init__(
+        self,
+        routes: dict[str, list[str]],
+        default_deployment: str | None,
+        policy: str = "ordered",
+    ):
+        self.routes = routes
+        self.default_deployment = default_deployment
+        self.policy = policy
+        self.latencies: dict[str, float] = {}
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def deployments(self) -> list[str]:
+        """Every deployment a step may be routed to"""
+        deployments = [self.default_deployment] if self.default_deployment else []
+        for chain in self.routes.values():
+            deployments += [d for d in chain if d not in deployments]
+        return deployments
+
+    def breaker(self, deployment: str) -> CircuitBreaker:
+        with self.lock:
+            if deployment not in self.breakers:
+                self.breakers[deployment] = CircuitBreaker(
+                    deployment, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS
+                )
+            return self.breakers[deployment]
+
+    def candidates(self, step: str) -> list[str]:
+        """Deployments to try for a step, in order"""
+        chain = self.routes.get(step) or (
+            [self.default_deployment] if self.default_deployment else []
+        )
+        healthy = [d for d in chain if not self.breaker(d).is_open]
+        if self.policy == "fastest":
+            with self.lock:
+                # Deployments without samples go first, so each one gets measured
+                healthy.sort(key=lambda d: self.latencies.get(d, 0.0))
+        # Open circuits go last, they are only tried when the whole chain is open
+        return healthy + [d for d in chain if d not in healthy]
+
+    def record_success(self, deployment: str, seconds: float):
+        self.breaker(deployment).record_success()
+        with self.lock:
+            previous = self.latencies.get(deployment)
+            self.latencies[deployment] = (
+                seconds
+                if previous is None
+                else LATENCY_SMOOTHING * seconds + (1 - LATENCY_SMOOTHING) * previous
+            )
+
+    def record_failure(self, deployment: str):
+        self.breaker(deployment).record_failure()
+
+
+router = DeploymentRouter(
+    parse_routes(os.getenv("MODEL_ROUTES", "")),
+    os.getenv("DEPLOYMENT_NAME"),
+    MODEL_ROUTING_POLICY,
+)
@@ -0,0 +1,140 @@
+"""
+Tail sampling utilities - keep slow and failed traces, sample the rest
+
+Spans are buffered per trace until the root span ends. The whole trace is then
+exported if the root took longer than `TRACE_LATENCY_THRESHOLD_SECONDS` or any
+span failed, and otherwise with probability `TRACE_SAMPLE_RATIO`.
+
+A trace evicted from a full buffer before its root ended is decided early. A
+drop is only provisional: the spans that end later are buffered again, and a
+slow or failed root still exports them.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from opentelemetry import metrics
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor
+from opentelemetry.trace import StatusCode
+
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "1.0"))
+TRACE_LATENCY_THRESHOLD_SECONDS = float(
+    os.getenv("TRACE_LATENCY_THRESHOLD_SECONDS", "10")
+)
+TRACE_BUFFER_MAX_SPANS = int(os.getenv("TRACE_BUFFER_MAX_SPANS", "10000"))
+
+# Remember recent decisions so spans ending after their root follow the trace
+DECISION_MEMORY = 4096
+
+meter = metrics.get_meter(__name__)
+trace_decision_counter = meter.create_counter(
+    "wiki_chat.traces.sampled",
+    description="Tail sampling decisions per trace by reason",
+)
+
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """Buffers spans per trace and passes kept traces on to another processor"""
+
+    def __init__(
+        self,
+        delegate: SpanProcessor,
+        sample_ratio: float = TRACE_SAMPLE_RATIO,
+        latency_threshold_seconds: float = TRACE_LATENCY_THRESHOLD_SECONDS,
+        max_buffered_spans: int = TRACE_BUFFER_MAX_SPANS,
+    ):
+        self.delegate = delegate
+        self.sample_ratio = sample_ratio
+        self.latency_threshold_ns = int(latency_threshold_seconds * 1e9)
+        self.max_buffered_spans = max_buffered_spans
+        self.traces: OrderedDict[int, list[ReadableSpan]] = OrderedDict()
+        self.buffered_spans = 0
+        self.decisions: OrderedDict[int, bool] = OrderedDict()
+        # Evicted traces dropped before their root ended, the root can still keep them
+        self.provisional: set[int] = set()
+        self.lock = threading.Lock()
+
+    def _sampled_by_ratio(self, trace_id: int) -> bool:
+        # Same idea as TraceIdRatioBased: deterministic per trace id
+        return (trace_id & 0xFFFFFFFFFFFFFFFF) < self.sample_ratio * 2**64
+
+    def _decide(
+        self, trace_id: int, spans: list[ReadableSpan], root: ReadableSpan | None
+    ):
+        if any(span.status.status_code == StatusCode.ERROR for span in spans):
+            reason = "error"
+        elif (
+            root is not None
+            and root.end_time is not None
+            and root.start_time is not None
+            and root.end_time - root.start_time >= self.latency_threshold_ns
+        ):
+            reason = "slow"
+        elif self._sampled_by_ratio(trace_id):
+            reason = "ratio"
+        else:
+            reason = "dropped"
+        if root is None:
+            reason += "_evicted"
+
+        keep = not reason.startswith("dropped")
+        trace_decision_counter.add(1, {"reason": reason})
+        self.decisions[trace_id] = keep
+        if keep or root is not None:
+            self.provisional.discard(trace_id)
+        else:
+            self.provisional.add(trace_id)
+        while len(self.decisions) > DECISION_MEMORY:
+            forgotten_id, _ = self.decisions.popitem(last=False)
+            self.provisional.discard(forgotten_id)
+        return keep
+
+    def on_start(self, span: Span, parent_context: Context | None = None) -> None:
+        self.delegate.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        is_root = span.parent is None or span.parent.is_remote
+        to_export: list[ReadableSpan] = []
+
+        with self.lock:
+            if trace_id in self.decisions and trace_id not in self.provisional:
+                # Late span of a trace that was already decided
+                if self.decisions[trace_id]:
+                    to_export.append(span)
+            else:
+                self.traces.setdefault(trace_id, []).append(span)
+                self.buffered_spans += 1
+
+                if is_root:
+                    spans = self.traces.pop(trace_id)
+                    self.buffered_spans -= len(spans)
+                    if self._decide(trace_id, spans, span):
+                        to_export.extend(spans)
+
+                # Bound memory by deciding on the oldest traces early
+                while self.buffered_spans > self.max_buffered_spans and self.traces:
+                    oldest_id, spans = self.traces.popitem(last=False)
+                    self.buffered_spans -= len(spans)
+                    if self._decide(oldest_id, spans, None):
+                        to_export.extend(spans)
+
+        for exported in to_export:
+            self.delegate.on_end(exported)
+
+    def shutdown(self) -> None:
+        with self.lock:
+            to_export = []
+            while self.traces:
+                trace_id, spans = self.traces.popitem(last=False)
+                if self._decide(trace_id, spans, None):
+                    to_export.extend(spans)
+            self.buffered_spans = 0
+        for span in to_export:
+            self.delegate.on_end(span)
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
@@ -0,0 +1,140 @@
+"""
+Usage utilities - token and cost accounting per step, turn and session
+"""
+
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from pydantic import BaseModel, Field
+from rich.console import Console
+from rich.table import Table
+from semantic_kernel.contents import AuthorRole, ChatHistory
+
+# Tokens a WikiChatProcess may spend before the budget action kicks in, 0 for no budget
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", "0"))
+# "compact" trims the chat histories, "refuse" answers no further questions
+TOKEN_BUDGET_ACTION = os.getenv("TOKEN_BUDGET_ACTION", "compact").lower()
+# Non-system messages kept per chat history when compacting
+COMPACT_KEEP_MESSAGES = int(os.getenv("COMPACT_KEEP_MESSAGES", "4"))
+
+PROMPT_PRICE_PER_1K_TOKENS = float(os.getenv("PROMPT_PRICE_PER_1K_TOKENS", "0"))
+COMPLETION_PRICE_PER_1K_TOKENS = float(os.getenv("COMPLETION_PRICE_PER_1K_TOKENS", "0"))
+
+
+class StepUsage(BaseModel):
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cost(self) -> float:
+        return (
+            self.prompt_tokens * PROMPT_PRICE_PER_1K_TOKENS
+            + self.completion_tokens * COMPLETION_PRICE_PER_1K_TOKENS
+        ) / 1000
+
+
+class UsageTracker(BaseModel):
+    """Token usage per step, for one turn or summed over many"""
+
+    turns: int = 0
+    steps: dict[str, StepUsage] = Field(default_factory=dict)
+
+    def add(self, step: str, prompt_tokens: int, completion_tokens: int):
+        usage = self.steps.setdefault(step, StepUsage())
+        usage.calls += 1
+        usage.prompt_tokens += prompt_tokens
+        usage.completion_tokens += completion_tokens
+
+    def merge(self, other: "UsageTracker"):
+        self.turns += other.turns
+        for step, other_usage in other.steps.items():
+            usage = self.steps.setdefault(step, StepUsage())
+            usage.calls += other_usage.calls
+            usage.prompt_tokens += other_usage.prompt_tokens
+            usage.completion_tokens += other_usage.completion_tokens
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(usage.total_tokens for usage in self.steps.values())
+
+    @property
+    def cost(self) -> float:
+        return sum(usage.cost for usage in self.steps.values())
+
+    def to_dict(self) -> dict:
+        return {
+            "turns": self.turns,
+            "steps": {step: usage.model_dump() for step, usage in self.steps.items()},
+            "total_tokens": self.total_tokens,
+            "cost": round(self.cost, 6),
+        }
+
+
+_current_usage: ContextVar[UsageTracker | None] = ContextVar("turn_usage", default=None)
+
+
+@contextmanager
+def track_usage(turn_usage: UsageTracker):
+    """Collect the usage of all chat completions of the enclosed turn"""
+    token = _current_usage.set(turn_usage)
+    try:
+        yield turn_usage
+    finally:
+        _current_usage.reset(token)
+        turn_usage.turns += 1
+
+
+def record_turn_usage(step: str, usage) -> None:
+    """Add the `CompletionUsage` of a chat completion to the current turn"""
+    turn_usage = _current_usage.get()
+    if turn_usage is None:
+        return
+    turn_usage.add(
+        step,
+        (usage.prompt_tokens or 0) if usage is not None else 0,
+        (usage.completion_tokens or 0) if usage is not None else 0,
+    )
+
+
+def compact_history(chat_history: ChatHistory, keep: int = COMPACT_KEEP_MESSAGES):
+    """Drop all but the system messages and the last `keep` messages"""
+    system_messages = [m for m in chat_history.messages if m.role == AuthorRole.SYSTEM]
+    other_messages = [m for m in chat_history.messages if m.role != AuthorRole.SYSTEM]
+    if len(other_messages) <= keep:
+        return
+    kept = other_messages[-keep:] if keep else []
+    chat_history.messages = system_messages + kept
+
+
+def print_usage_report(usage: UsageTracker, title: str = "Token Usage"):
+    table = Table(title=title, show_header=True, header_style="bold magenta")
+    table.add_column("Step", style="cyan")
+    table.add_column("Calls", justify="right")
+    table.add_column("Prompt", justify="right")
+    table.add_column("Completion", justify="right")
+    table.add_column("Total", justify="right", style="green")
+    table.add_column("Cost", justify="right")
+    for step, step_usage in usage.steps.items():
+        table.add_row(
+            step,
+            str(step_usage.calls),
+            str(step_usage.prompt_tokens),
+            str(step_usage.completion_tokens),
+            str(step_usage.total_tokens),
+            f"{step_usage.cost:.4f}",
+        )
+    table.add_row(
+        f"[bold]{usage.turns} turns[/bold]",
+        "",
+        "",
+        "",
+        f"[bold]{usage.total_tokens}[/bold]",
+        f"[bold]{usage.cost:.4f}[/bold]",
+    )
+    Console().print(table)
@@ -2,15 +2,51 @@
 Web scraping utilities - migrated from search_result_from_url.py
 """
 
-import requests
 import bs4
+import multiprocessing
+import os
+import threading
 import time
-import random
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from functools import partial
 
 from rich import print
 
+from .deadline_utils import HTTP_TIMEOUT_SECONDS
+from .http_utils import hedged_get
+from .metrics_utils import record_http
+
+# Shared by the per-URL fetch steps of all running chats
+FETCH_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("FETCH_MAX_WORKERS", "10")),
+    thread_name_prefix="wiki-fetch",
+)
+
+# HTML parsing is pure-Python CPU work, so under load it can run in worker
+# processes instead of contending for the GIL in the fetch threads
+PARSE_IN_PROCESSES = os.getenv("PARSE_IN_PROCESSES", "false").lower() == "true"
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", str(os.cpu_count() or 1)))
+_parse_pool: ProcessPoolExecutor | None = None
+_parse_pool_lock = threading.Lock()
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Lazily start the bounded pool of parser processes"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # Don't fork a process that already runs fetch and telemetry threads
+            start_method = (
+                "forkserver"
+                if "forkserver" in multiprocessing.get_all_start_methods()
+                else "spawn"
+            )
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=PARSE_PROCESSES,
+                mp_context=multiprocessing.get_context(start_method),
+            )
+        return _parse_pool
+
 
 def decode_str(string):
     return string.encode().decode("unicode-escape").encode("latin1").decode("utf-8")
@@ -29,35 +65,60 @@ def get_page_sentence(page, count: int = 10):
     return " ".join(sentences[:count])
 
 
-def fetch_text_content_from_url(url: str, count: int = 10):
-    """Fetch text content from a URL"""
-    session = requests.Session()
+def extract_page_text(html: bytes, encoding: str | None = None) -> str:
+    """Extract the text of the paragraphs and lists of a page"""
+    soup = bs4.BeautifulSoup(html, "html.parser", from_encoding=encoding)
+    page_content = [
+        p_ul.get_text().strip() for p_ul in soup.find_all("p") + soup.find_all("ul")
+    ]
+
+    page = ""
+    for content in page_content:
+        if len(content.split(" ")) > 2:
+            page += content + "\n"
+
+    return page
+
+
+def extract_text(html: bytes, count: int = 10, encoding: str | None = None) -> str:
+    """Extract the first count sentences from the paragraphs and lists of a page"""
+    return get_page_sentence(extract_page_text(html, encoding), count=count)
 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/113.0.0.0 Safari/537.36 Edg/113.0.1774.35"
-    }
 
-    delay = random.uniform(0, 0.5)
-    time.sleep(delay)
+def fetch_page_text(
+    url: str, timeout: float = HTTP_TIMEOUT_SECONDS
+) -> tuple[str, str | None]:
+    """Fetch the full text of a page, None if it is not available
 
-    response = session.get(url, headers=headers)
+    Retries and hedges slow or failed requests.
+    """
+    start = time.monotonic()
+    response = hedged_get(url, timeout=timeout)
+    record_http("fetch_page", time.monotonic() - start, len(response.content))
     if response.status_code == 200:
-        soup = bs4.BeautifulSoup(response.text, "html.parser")
-        page_content = [
-            p_ul.get_text().strip() for p_ul in soup.find_all("p") + soup.find_all("ul")
-        ]
-
-        page = ""
-        for content in page_content:
-            if len(content.split(" ")) > 2:
-                page += content + "\n"
-
-        text = get_page_sentence(page, count=count)
-        return (url, text)
+        if PARSE_IN_PROCESSES:
+            # Only the raw bytes go to the worker and only the extracted text comes back
+            page = (
+                get_parse_pool()
+                .submit(extract_page_text, response.content, response.encoding)
+                .result()
+            )
+        else:
+            page = extract_page_text(response.content, response.encoding)
+        return (url, page)
     else:
         print(f"Get url failed with status code {response.status_code} for URL: {url}")
+        return (url, None)
+
+
+def fetch_text_content_from_url(
+    url: str, count: int = 10, timeout: float = HTTP_TIMEOUT_SECONDS
+):
+    """Fetch the first count sentences of a page"""
+    url, page = fetch_page_text(url, timeout=timeout)
+    if page is None:
         return (url, "No available content")
+    return (url, get_page_sentence(page, count=count))
 
 
 def search_results_from_urls(url_list: list, count: int = 10):
@@ -71,3 +132,10 @@ def search_results_from_urls(url_list: list, count: int = 10):
             results.append(result)
 
     return results
+
+
+def format_search_results(search_result: list) -> str:
+    """Format `(url, content)` search results into the context string"""
+    return "\n\n".join(
+        f"Content: {content}\nSource: {url}" for url, content in search_result
+    )
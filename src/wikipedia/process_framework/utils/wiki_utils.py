@@ -2,11 +2,19 @@
 Wikipedia utilities - migrated from get_wiki_url.py
 """
 
-import requests
 import bs4
+import os
 import re
+import time
 from rich import print
 
+from .deadline_utils import HTTP_TIMEOUT_SECONDS
+from .http_utils import get_with_retries
+from .metrics_utils import record_http
+from .resilience_utils import negative_cache
+
+WIKIPEDIA_BASE_URL = os.getenv("WIKIPEDIA_BASE_URL", "https://en.wikipedia.org")
+
 
 def decode_str(string):
     return string.encode().decode("unicode-escape").encode("latin1").decode("utf-8")
@@ -19,22 +27,25 @@ def remove_nested_parentheses(string):
     return string
 
 
-def get_wiki_urls(entity: str, count=2):
+def get_wiki_urls(entity: str, count=2, timeout: float = HTTP_TIMEOUT_SECONDS):
     """Get Wikipedia URLs for a given entity"""
-    url = f"https://en.wikipedia.org/w/index.php?search={entity}"
+    url = f"{WIKIPEDIA_BASE_URL}/w/index.php?search={entity}"
     url_list = []
 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/113.0.0.0 Safari/537.36 Edg/113.0.1774.35"
-    }
+    if entity in negative_cache:
+        print(f"No Wikipedia results for [blue]{entity}[/blue] (cached)")
+        return url_list
 
-    response = requests.get(url, headers=headers)
+    start = time.monotonic()
+    response = get_with_retries(url, timeout=timeout)
+    record_http("lookup", time.monotonic() - start, len(response.content))
     if response.status_code == 200:
         soup = bs4.BeautifulSoup(response.text, "html.parser")
         mw_divs = soup.find_all("div", {"class": "mw-search-result-heading"})
 
-        if mw_divs:  # mismatch
+        if soup.find(class_="mw-search-nonefound"):
+            print(f"No Wikipedia results for [blue]{entity}[/blue]")
+        elif mw_divs:  # mismatch
             result_titles = [decode_str(div.get_text().strip()) for div in mw_divs]
             result_titles = [
                 remove_nested_parentheses(result_title)
@@ -45,7 +56,7 @@ def get_wiki_urls(entity: str, count=2):
             )
             url_list.extend(
                 [
-                    f"https://en.wikipedia.org/w/index.php?search={result_title}"
+                    f"{WIKIPEDIA_BASE_URL}/w/index.php?search={result_title}"
                     for result_title in result_titles
                 ]
             )
@@ -55,10 +66,13 @@ def get_wiki_urls(entity: str, count=2):
                 for p_ul in soup.find_all("p") + soup.find_all("ul")
             ]
             if any("may refer to:" in p for p in page_content):
-                url_list.extend(get_wiki_urls("[" + entity + "]"))
+                url_list.extend(get_wiki_urls("[" + entity + "]", timeout=timeout))
             else:
                 url_list.append(url)
     else:
         print(f"Get url failed with status code {response.status_code}")
 
+    if not url_list:
+        negative_cache.add(entity)
+
     return url_list[:count]
@@ -7,23 +7,38 @@ import logging
 import os
 
 from dotenv import load_dotenv
+from opentelemetry import trace
 from rich import print
 from semantic_kernel import Kernel
-from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.processes import ProcessBuilder
 from semantic_kernel.processes.kernel_process import KernelProcess, KernelProcessEvent
 from semantic_kernel.processes.local_runtime.local_kernel_process import start
 
 from .steps.augmented_chat_step import AugmentedChatStep
+from .steps.collect_search_results_step import CollectSearchResultsStep
 from .steps.extract_query_step import ExtractQueryStep
+from .steps.fetch_url_step import FetchUrlStep
 from .steps.get_wiki_url_step import GetWikiUrlStep
 from .steps.process_search_result_step import ProcessSearchResultStep
-from .steps.search_url_step import SearchUrlStep
+from .steps.search_url_step import SearchUrlStep, SearchUrlStepState
+from .utils.deadline_utils import make_deadline
+from .utils.fan_in_utils import FanInPolicy, release_gates_on_exit
+from .utils.llm_utils import create_kernel
+from .utils.metrics_utils import chats_in_flight
 from .utils.observability_utils import (
     set_up_logging,
     set_up_metrics,
     set_up_tracing,
 )
+from .utils.profiling_utils import profile_turn
+from .utils.usage_utils import (
+    SESSION_TOKEN_BUDGET,
+    TOKEN_BUDGET_ACTION,
+    UsageTracker,
+    compact_history,
+    print_usage_report,
+    track_usage,
+)
 
 from pathlib import Path
 
@@ -39,30 +54,31 @@ set_up_tracing()
 set_up_metrics()
 
 logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+BUDGET_EXCEEDED_ANSWER = (
+    "I'm sorry, this conversation has used up its token budget. Please start a new one."
+)
 
 
 class WikiChatProcess:
     """Main process for chat with Wikipedia"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        fan_in_policy: FanInPolicy | None = None,
+        token_budget: int | None = None,
+    ):
+        self.fan_in_policy = fan_in_policy or FanInPolicy.from_env()
+        # Tokens this session may use, see `SESSION_TOKEN_BUDGET`
+        self.token_budget = token_budget or SESSION_TOKEN_BUDGET or None
+        self.usage = UsageTracker()
         self.kernel = self._setup_kernel()
         self.process = self._build_process()
 
     def _setup_kernel(self) -> Kernel:
-        """Setup the kernel with Azure OpenAI service"""
-        kernel = Kernel()
-
-        # Add Azure OpenAI service
-        kernel.add_service(
-            AzureChatCompletion(
-                deployment_name=os.getenv("DEPLOYMENT_NAME"),
-                api_key=os.getenv("API_KEY"),
-                endpoint=os.getenv("ENDPOINT"),
-                service_id=os.getenv("DEPLOYMENT_NAME"),
-            )
-        )
-
-        return kernel
+        """Setup the kernel with an Azure OpenAI service per deployment"""
+        return create_kernel()
 
     def _build_process(self):
         """Build the process with all steps and connections"""
@@ -71,7 +87,12 @@ class WikiChatProcess:
         # Add the steps
         extract_query_step = process_builder.add_step(ExtractQueryStep)
         get_wiki_url_step = process_builder.add_step(GetWikiUrlStep)
-        search_url_step = process_builder.add_step(SearchUrlStep)
+        search_url_step = process_builder.add_step(
+            SearchUrlStep,
+            initial_state=SearchUrlStepState(fan_in_policy=self.fan_in_policy),
+        )
+        fetch_url_step = process_builder.add_step(FetchUrlStep)
+        collect_search_results_step = process_builder.add_step(CollectSearchResultsStep)
         process_search_result_step = process_builder.add_step(ProcessSearchResultStep)
         augmented_chat_step = process_builder.add_step(AugmentedChatStep)
 
@@ -96,8 +117,36 @@ class WikiChatProcess:
             parameter_name="data",
         )
 
-        # Search URLs -> Process Results
-        search_url_step.on_function_result("search_urls").send_event_to(
+        # Search URLs -> Fetch URL (fan-out, one event per URL)
+        search_url_step.on_event("url_fetch_requested").send_event_to(
+            target=fetch_url_step,
+            function_name="fetch_url",
+            parameter_name="data",
+        )
+
+        # Fetch URL -> Collect Results (fan-in)
+        fetch_url_step.on_event("url_fetched").send_event_to(
+            target=collect_search_results_step,
+            function_name="collect_result",
+            parameter_name="data",
+        )
+
+        # Collect Results -> Search URLs (remember the pages for follow-ups)
+        collect_search_results_step.on_event("documents_fetched").send_event_to(
+            target=search_url_step,
+            function_name="remember_documents",
+            parameter_name="data",
+        )
+
+        # Collect Results -> Process Results
+        collect_search_results_step.on_event("search_results_ready").send_event_to(
+            target=process_search_result_step,
+            function_name="process_results",
+            parameter_name="data",
+        )
+
+        # Search URLs -> Process Results (no URLs to fetch)
+        search_url_step.on_event("search_results_ready").send_event_to(
             target=process_search_result_step,
             function_name="process_results",
             parameter_name="data",
@@ -112,9 +161,11 @@ class WikiChatProcess:
 
         return process_builder.build()
 
-    async def _run_process(self, question: str) -> KernelProcess:
+    async def _run_process(
+        self, question: str, deadline: float | None = None
+    ) -> KernelProcess:
         """Helper to run the process and get the final state."""
-        data = {"question": question}
+        data = {"question": question, "deadline": deadline}
         async with await start(
             process=self.process,
             kernel=self.kernel,
@@ -122,23 +173,83 @@ class WikiChatProcess:
         ) as process_context:
             return await process_context.get_state()
 
-    async def chat(self, question: str) -> dict[str, str]:
-        """Run the chat process with a question"""
+    def _compact_histories(self):
+        """Trim the chat histories kept in the step states"""
+        for step in self.process.steps:
+            step_state = getattr(step.state, "state", None)
+            chat_history = getattr(step_state, "chat_history", None)
+            if chat_history is not None:
+                compact_history(chat_history)
+
+    def _over_token_budget(self) -> bool:
+        return (
+            self.token_budget is not None
+            and self.usage.total_tokens >= self.token_budget
+        )
+
+    async def chat(self, question: str, budget_seconds: float | None = None) -> dict:
+        """Run the chat process with a question
+
+        `budget_seconds` is the latency budget of the turn. Steps shorten or skip
+        retrieval to stay within it and the answer uses whatever context is ready.
+        Defaults to the `TURN_BUDGET_SECONDS` environment variable, or no budget.
+
+        Turns selected by `PROFILE_SAMPLE_RATE` or `PROFILE_EVERY_N` are profiled.
+
+        Once the session used up its token budget, the chat histories are compacted
+        before every turn, or the turn is refused if `TOKEN_BUDGET_ACTION=refuse`.
+        The token usage of the turn is returned under `usage`.
+        """
         print(f"Starting chat process with question: [green]{question}[/green]")
 
-        final_state = await self._run_process(question)
+        if self._over_token_budget():
+            print(
+                f"[yellow]Token budget of {self.token_budget} used up "
+                f"({self.usage.total_tokens} tokens), {TOKEN_BUDGET_ACTION}[/yellow]"
+            )
+            if TOKEN_BUDGET_ACTION == "refuse":
+                return {
+                    "response": BUDGET_EXCEEDED_ANSWER,
+                    "context": "",
+                    "usage": UsageTracker().to_dict(),
+                }
+            self._compact_histories()
+
+        if budget_seconds is None and os.getenv("TURN_BUDGET_SECONDS"):
+            budget_seconds = float(os.environ["TURN_BUDGET_SECONDS"])
+
+        chats_in_flight.add(1)
+        try:
+            # One root span per turn, so the turn is sampled as a whole
+            with (
+                tracer.start_as_current_span("wiki_chat.turn"),
+                profile_turn(),
+                track_usage(UsageTracker()) as turn_usage,
+                release_gates_on_exit(),
+            ):
+                final_state = await self._run_process(
+                    question, make_deadline(budget_seconds)
+                )
+        finally:
+            chats_in_flight.add(-1)
+        self.usage.merge(turn_usage)
         final_answer = final_state.steps[-1].state.state.answer  # type: ignore
         context = final_state.steps[-1].state.state.context  # type: ignore
 
         return {
             "response": final_answer,
             "context": context,
+            "usage": turn_usage.to_dict(),
         }
 
 
 def get_answer(question: str):
     result = asyncio.run(WikiChatProcess().chat(question))
-    return {"response": result["response"], "context": result["context"]}
+    return {
+        "response": result["response"],
+        "context": result["context"],
+        "usage": result["usage"],
+    }
 
 
 async def main():
@@ -149,6 +260,7 @@ async def main():
     question = "What is artificial intelligence?"
     result = await wiki_chat.chat(question)
     print(f"Final result: {result['response']}")
+    print_usage_report(wiki_chat.usage, title="Session Token Usage")
 
 
 if __name__ == "__main__":